@@ -7,7 +7,9 @@ const backend_url = import.meta.env.VITE_BACKEND_URL || "";
 const Leads = () => {
   const [expandedRows, setExpandedRows] = useState({});
   const [leads, setLeads] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
 
   const userProfile = useSelector((state) => ({
@@ -26,23 +28,34 @@ const Leads = () => {
     answers.domain
   }`;
 
-  // Fetch leads from API
+  // Fetch one page of leads; the API returns next_cursor while more remain
+  const fetchLeadsPage = async (cursor) => {
+    const params = new URLSearchParams({ include_conversation: "true" });
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
+    const response = await fetch(
+      `${backend_url}/leads/${encodeURIComponent(businessId)}?${params}`
+    );
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+  };
+
+  // Fetch the first page of leads from API
   useEffect(() => {
     const fetchLeads = async () => {
       try {
         setLoading(true);
-        const response = await fetch(
-          `${backend_url}/leads/${encodeURIComponent(businessId)}`
-        );
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        const data = await response.json();
+        const data = await fetchLeadsPage(null);
         setLeads(data.leads || []);
+        setNextCursor(data.next_cursor || null);
         setError(null);
       } catch (err) {
         setError(err.message);
         setLeads([]);
+        setNextCursor(null);
       } finally {
         setLoading(false);
       }
@@ -51,6 +64,20 @@ const Leads = () => {
     fetchLeads();
   }, [businessId]);
 
+  // Append the next page
+  const loadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const data = await fetchLeadsPage(nextCursor);
+      setLeads((prev) => [...prev, ...(data.leads || [])]);
+      setNextCursor(data.next_cursor || null);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Toggle conversation visibility
   const toggleRow = (leadId) => {
     setExpandedRows((prev) => ({
@@ -180,6 +207,17 @@ const Leads = () => {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="flex justify-center mt-4">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="px-6 py-3 bg-[#292928] text-white rounded-full hover:bg-[#191919] text-sm disabled:opacity-50"
+                >
+                  {loadingMore ? "Loading..." : "Load more leads"}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
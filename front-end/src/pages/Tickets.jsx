@@ -7,7 +7,9 @@ const backend_url = import.meta.env.VITE_BACKEND_URL || "";
 const Tickets = () => {
   const [expandedRows, setExpandedRows] = useState({});
   const [tickets, setTickets] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
 
   const userProfile = useSelector((state) => ({
@@ -26,25 +28,34 @@ const Tickets = () => {
     answers.domain
   }`;
 
-  // Fetch tickets from API
+  // Fetch one page of tickets; the API returns next_cursor while more remain
+  const fetchTicketsPage = async (cursor) => {
+    const params = new URLSearchParams({ include_conversation: "true" });
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
+    const response = await fetch(
+      `${backend_url}/tickets/${encodeURIComponent(businessId)}?${params}`
+    );
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+  };
+
+  // Fetch the first page of tickets from API
   useEffect(() => {
     const fetchTickets = async () => {
       try {
         setLoading(true);
-        const response = await fetch(
-          `${backend_url}/tickets/${encodeURIComponent(
-            businessId
-          )}`
-        );
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        const data = await response.json();
+        const data = await fetchTicketsPage(null);
         setTickets(data.tickets || []);
+        setNextCursor(data.next_cursor || null);
         setError(null);
       } catch (err) {
         setError(err.message);
         setTickets([]);
+        setNextCursor(null);
       } finally {
         setLoading(false);
       }
@@ -53,6 +64,20 @@ const Tickets = () => {
     fetchTickets();
   }, [businessId]);
 
+  // Append the next page
+  const loadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const data = await fetchTicketsPage(nextCursor);
+      setTickets((prev) => [...prev, ...(data.tickets || [])]);
+      setNextCursor(data.next_cursor || null);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Toggle conversation visibility
   const toggleRow = (ticketId) => {
     setExpandedRows((prev) => ({
@@ -185,6 +210,17 @@ const Tickets = () => {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="flex justify-center mt-4">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="px-6 py-3 bg-[#292928] text-white rounded-full hover:bg-[#191919] text-sm disabled:opacity-50"
+                >
+                  {loadingMore ? "Loading..." : "Load more tickets"}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
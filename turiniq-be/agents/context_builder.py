@@ -1,10 +1,14 @@
 from enum import Enum
+from functools import lru_cache
 from typing import List, Optional
 
 import google.generativeai as genai
 from pydantic import BaseModel
 from pydantic.networks import HttpUrl  # Import HttpUrl
 
+from agents.llm import generate
+from agents.retrieval import BM25Index, chunk_text
+
 
 class BusinessType(str, Enum):
     TECH = "tech"
@@ -82,24 +86,48 @@ class BusinessInput(BaseModel):
     custom_opening_message: str
     custom_instructions: Optional[str] = None
 
-async def build_context(input_data: BusinessInput, knowledge_base: str, model: genai.GenerativeModel) -> str:
+def _settings_key(input_data: BaseModel) -> tuple:
+    """The configuration's fields as a hashable key, without validating them again."""
+    return tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in ((name, getattr(input_data, name)) for name in type(input_data).model_fields)
+    )
+
+@lru_cache(maxsize=256)
+def _settings_header(settings: tuple) -> str:
+    """The settings part of the context builder prompt, joined once per distinct configuration."""
+    s = dict(settings)
+    return f"""
+    Business Type: {s['business_type']}
+    Domain: {s['domain']}
+    Agent Goal: {s['agent_goal']}{' - ' + s['agent_goal_other'] if s['agent_goal_other'] else ''}
+    Tonality: {s['tonality']}
+    Communication Style: {', '.join(s['communication_style'])}{' - ' + s['communication_style_custom'] if s['communication_style_custom'] else ''}
+    Context & Clarity: {', '.join(s['context_clarity'])}{' - ' + s['context_clarity_custom'] if s['context_clarity_custom'] else ''}
+    Handover & Escalation: {', '.join(s['handover_escalation'])}{' - ' + s['handover_escalation_custom'] if s['handover_escalation_custom'] else ''}
+    Data to Capture: {', '.join(s['data_to_capture'])}{' - ' + s['data_to_capture_other'] if s['data_to_capture_other'] else ''}
+    Custom Opening Message: {s['custom_opening_message']}
+    Custom Instructions: {s['custom_instructions'] or 'None'}"""
+
+async def build_context(
+    input_data: BusinessInput,
+    knowledge_base: str,
+    model: genai.GenerativeModel,
+    chunks: Optional[List[str]] = None
+) -> str:
     """Builds a context prompt for the customer agent."""
+    # Summarize the chunks most relevant to the agent's purpose rather than the KB's first 1000 chars
+    index = BM25Index(chunks if chunks is not None else chunk_text(knowledge_base))
+    focus = " ".join(filter(None, [
+        input_data.business_type, input_data.agent_goal, input_data.agent_goal_other, input_data.custom_instructions
+    ]))
+    excerpt = "\n---\n".join(index.chunks[doc_id] for doc_id in index.search(focus, k=6)) or knowledge_base[:1000]
     prompt = f"""
     You are a context builder agent for TurinIQ. Create a context prompt for a customer service agent based on the following:
-
-    Business Type: {input_data.business_type}
-    Domain: {input_data.domain}
-    Agent Goal: {input_data.agent_goal}{' - ' + input_data.agent_goal_other if input_data.agent_goal_other else ''}
-    Tonality: {input_data.tonality}
-    Communication Style: {', '.join(input_data.communication_style)}{' - ' + input_data.communication_style_custom if input_data.communication_style_custom else ''}
-    Context & Clarity: {', '.join(input_data.context_clarity)}{' - ' + input_data.context_clarity_custom if input_data.context_clarity_custom else ''}
-    Handover & Escalation: {', '.join(input_data.handover_escalation)}{' - ' + input_data.handover_escalation_custom if input_data.handover_escalation_custom else ''}
-    Data to Capture: {', '.join(input_data.data_to_capture)}{' - ' + input_data.data_to_capture_other if input_data.data_to_capture_other else ''}
-    Custom Opening Message: {input_data.custom_opening_message}
-    Custom Instructions: {input_data.custom_instructions or 'None'}
-    Knowledge Base: {knowledge_base[:1000]}... (truncated for brevity)
+{_settings_header(_settings_key(input_data))}
+    Knowledge Base (most relevant excerpts): {excerpt}
 
     The prompt should enable the agent to serve customers effectively, following the specified tonality, style, and instructions. Return a plain text string.
     """
-    response = model.generate_content(prompt)
-    return response.text
\ No newline at end of file
+    response = await generate(prompt, model=model, call_site="context_build")
+    return response.text
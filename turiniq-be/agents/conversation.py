@@ -0,0 +1,97 @@
+import os
+import time
+from datetime import datetime
+from enum import IntEnum
+from typing import Iterable, Iterator, List, Optional
+
+# Messages kept in memory per session. Older ones are dropped once they are in
+# the session store, folded into the history summary and, for sales, on the lead
+CONVERSATION_WINDOW_MESSAGES = int(os.getenv("CONVERSATION_WINDOW_MESSAGES", "50"))
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+class Role(IntEnum):
+    USER = 0
+    AGENT = 1
+
+
+_ROLE_KEYS = {Role.USER: "user", Role.AGENT: "agent"}
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+class Message:
+    __slots__ = ("role", "text", "ts_ms")
+
+    def __init__(self, role: Role, text: Optional[str], ts_ms: Optional[int] = None):
+        self.role = role
+        self.text = text
+        self.ts_ms = now_ms() if ts_ms is None else ts_ms
+
+    def to_dict(self) -> dict:
+        """The stored shape: {"user" or "agent": text, "timestamp": ISO string}."""
+        entry = {_ROLE_KEYS[self.role]: self.text}
+        if self.ts_ms:
+            entry["timestamp"] = datetime.utcfromtimestamp(self.ts_ms / 1000).strftime(TIMESTAMP_FORMAT)
+        return entry
+
+    @classmethod
+    def from_dict(cls, entry: dict) -> "Message":
+        role = Role.USER if "user" in entry else Role.AGENT
+        timestamp = entry.get("timestamp")
+        ts_ms = 0
+        if timestamp:
+            ts_ms = round((datetime.strptime(timestamp, TIMESTAMP_FORMAT) - datetime(1970, 1, 1)).total_seconds() * 1000)
+        return cls(role, entry.get(_ROLE_KEYS[role]), ts_ms)
+
+
+class ConversationLog:
+    """A session's messages, with only the recent ones held in memory.
+
+    Indexes are absolute: `offset` messages have been dropped from memory
+    (they live in the session store), and len() counts them too. Messages
+    are converted to the stored dict shape only when written.
+    """
+
+    def __init__(self, messages: Iterable[Message] = (), offset: int = 0, window: int = CONVERSATION_WINDOW_MESSAGES):
+        self._messages: List[Message] = list(messages)
+        self.offset = offset
+        self.window = window
+
+    @classmethod
+    def from_dicts(cls, entries: Iterable[dict], **kwargs) -> "ConversationLog":
+        return cls((Message.from_dict(entry) for entry in entries), **kwargs)
+
+    def __len__(self) -> int:
+        return self.offset + len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        """The messages still in memory."""
+        return iter(self._messages)
+
+    def add_user(self, text: str):
+        self._messages.append(Message(Role.USER, text))
+
+    def add_agent(self, text: Optional[str]):
+        self._messages.append(Message(Role.AGENT, text))
+
+    def since(self, start: int, end: Optional[int] = None) -> List[Message]:
+        """Messages [start:end] by absolute index; `start` must still be in memory."""
+        if start < self.offset:
+            raise IndexError(f"message {start} was dropped from memory (first kept: {self.offset})")
+        end = len(self) if end is None else end if end >= 0 else len(self) + end
+        end = max(start, end)
+        return self._messages[start - self.offset:end - self.offset]
+
+    def to_dicts(self, start: Optional[int] = None) -> List[dict]:
+        """Stored shape of the messages from `start` (default: all still in memory)."""
+        return [message.to_dict() for message in self.since(self.offset if start is None else start)]
+
+    def trim(self, keep_from: int):
+        """Drop messages before `keep_from`, always keeping the last `window`."""
+        cut = min(keep_from, len(self) - self.window) - self.offset
+        if cut > 0:
+            del self._messages[:cut]
+            self.offset += cut
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional, Set
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "30"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+CRAWL_TIMEOUT_SECONDS = float(os.getenv("CRAWL_TIMEOUT_SECONDS", "10"))
+CRAWL_CACHE_DIR = os.getenv("CRAWL_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "turiniq-http-cache")
+USER_AGENT = os.getenv("CRAWL_USER_AGENT", "TurinIQBot/1.0")
+
+# Elements that never hold the page's own content
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form"]
+SKIPPED_EXTENSIONS = re.compile(r"\.(jpe?g|png|gif|svg|webp|ico|pdf|zip|gz|mp[34]|mov|css|js|woff2?|ttf)$", re.IGNORECASE)
+_LOC_RE = re.compile(r"<loc>\s*([^<]+?)\s*</loc>", re.IGNORECASE)
+
+
+class CrawledPage:
+    __slots__ = ("url", "title", "text", "depth")
+
+    def __init__(self, url: str, title: str, text: str, depth: int):
+        self.url = url
+        self.title = title
+        self.text = text
+        self.depth = depth
+
+
+class HttpCache:
+    """On-disk cache of GET responses, revalidated with ETag / Last-Modified.
+
+    One JSON file per URL, named by the URL's sha256.
+    """
+
+    def __init__(self, directory: str = CRAWL_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def _read(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, url: str, entry: dict):
+        path = self._path(url)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    async def get(self, url: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._read, url)
+
+    async def put(self, url: str, entry: dict):
+        await asyncio.to_thread(self._write, url, entry)
+
+
+def parse_page(html: str, base_url: str) -> tuple[str, str, List[str]]:
+    """Return (title, main text, links) of an HTML page.
+
+    Links are collected before navigation is stripped; the text prefers
+    <main> or <article> and leaves out scripts, menus and footers.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    links = [urljoin(base_url, link["href"]) for link in soup.find_all("a", href=True)]
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    return title, " ".join(root.get_text(" ").split()), links
+
+
+class Crawler:
+    """Bounded-concurrency, same-domain breadth-first crawler.
+
+    Follows links up to `max_depth` hops from the start page and stops after
+    `max_pages` pages. URLs listed in sitemap.xml are queued at depth 1, and
+    robots.txt is honored for USER_AGENT.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = CRAWL_MAX_PAGES,
+        max_depth: int = CRAWL_MAX_DEPTH,
+        concurrency: int = CRAWL_CONCURRENCY,
+        cache: Optional[HttpCache] = None
+    ):
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.cache = cache if cache is not None else HttpCache()
+        self.stats = {"fetched": 0, "not_modified": 0, "errors": 0, "disallowed": 0}
+
+    @staticmethod
+    def normalize(url: str) -> str:
+        url, _ = urldefrag(url)
+        parsed = urlparse(url)
+        path = parsed.path or "/"
+        return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), path=path).geturl()
+
+    async def fetch(self, client: httpx.AsyncClient, url: str) -> Optional[tuple[str, str, str]]:
+        """GET a URL through the cache; returns (content type, body, URL after redirects) or None."""
+        cached = await self.cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            logger.warning("Crawler failed to fetch %s: %s", url, e)
+            self.stats["errors"] += 1
+            return None
+
+        if response.status_code == 304 and cached:
+            self.stats["not_modified"] += 1
+            return cached["content_type"], cached["body"], cached.get("final_url") or url
+        if response.status_code != 200:
+            self.stats["errors"] += 1
+            return None
+        self.stats["fetched"] += 1
+        content_type = response.headers.get("content-type", "")
+        if response.headers.get("etag") or response.headers.get("last-modified"):
+            await self.cache.put(url, {
+                "url": url,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "content_type": content_type,
+                "body": response.text,
+                "final_url": str(response.url),
+            })
+        return content_type, response.text, str(response.url)
+
+    async def _robots(self, client: httpx.AsyncClient, origin: str) -> RobotFileParser:
+        robots = RobotFileParser()
+        fetched = await self.fetch(client, f"{origin}/robots.txt")
+        robots.parse(fetched[1].splitlines() if fetched else [])
+        return robots
+
+    async def _sitemap_urls(self, client: httpx.AsyncClient, origin: str, robots: RobotFileParser) -> List[str]:
+        urls = []
+        for sitemap in robots.site_maps() or [f"{origin}/sitemap.xml"]:
+            fetched = await self.fetch(client, sitemap)
+            if fetched:
+                urls.extend(_LOC_RE.findall(fetched[1]))
+        return urls
+
+    async def crawl(self, start_url: str) -> List[CrawledPage]:
+        """Crawl one depth level at a time so a site always yields the same pages.
+
+        If the start page redirects to another host (example.com to
+        www.example.com), that host is the site from then on and links to
+        the original host are rewritten to it.
+        """
+        start_url = self.normalize(start_url)
+        aliases = {urlparse(start_url).netloc}
+        pages: List[CrawledPage] = []
+        seen: Set[str] = set()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with httpx.AsyncClient(
+            timeout=CRAWL_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.concurrency),
+        ) as client:
+            start_page = await self.fetch(client, start_url)
+            if start_page:
+                start_url = self.normalize(start_page[2])
+            parsed = urlparse(start_url)
+            origin = f"{parsed.scheme}://{parsed.netloc}"
+            robots = await self._robots(client, origin)
+            levels: Dict[int, List[str]] = {0: [], 1: []}
+            # Final URLs of the pages visited, so pages reached through a redirect are kept once
+            landed: Set[str] = set()
+
+            def enqueue(url: str, depth: int):
+                url = self.normalize(url)
+                if urlparse(url).netloc in aliases:
+                    url = urlparse(url)._replace(scheme=parsed.scheme, netloc=parsed.netloc).geturl()
+                if (
+                    url in seen
+                    or sum(map(len, levels.values())) >= self.max_pages
+                    or depth > self.max_depth
+                    or urlparse(url).netloc != parsed.netloc
+                    or SKIPPED_EXTENSIONS.search(urlparse(url).path)
+                ):
+                    return
+                seen.add(url)
+                if not robots.can_fetch(USER_AGENT, url):
+                    self.stats["disallowed"] += 1
+                    return
+                levels.setdefault(depth, []).append(url)
+
+            async def visit(url: str, depth: int) -> Optional[tuple[CrawledPage, List[str]]]:
+                async with semaphore:
+                    try:
+                        fetched = start_page if url == start_url and start_page else await self.fetch(client, url)
+                        if not fetched or "html" not in fetched[0]:
+                            return None
+                        final_url = self.normalize(fetched[2])
+                        if final_url in landed or urlparse(final_url).netloc != parsed.netloc:
+                            return None
+                        landed.add(final_url)
+                        # Relative links resolve against where the page was actually served from
+                        title, text, links = await asyncio.to_thread(parse_page, fetched[1], final_url)
+                        return CrawledPage(final_url, title, text, depth), links
+                    except Exception as e:
+                        logger.error("Crawler failed on %s: %s", url, e)
+                        self.stats["errors"] += 1
+                        return None
+
+            enqueue(start_url, 0)
+            for url in await self._sitemap_urls(client, origin, robots):
+                enqueue(url, 1)
+
+            depth = 0
+            while levels.get(depth):
+                results = await asyncio.gather(*(visit(url, depth) for url in levels[depth]))
+                # Queue the next level in page order, so the page budget always cuts at the same place
+                for result in results:
+                    if result is None:
+                        continue
+                    pages.append(result[0])
+                    for link in result[1]:
+                        enqueue(link, depth + 1)
+                depth += 1
+
+        return pages
+
+
+async def crawl_site(start_url: str, **options) -> tuple[List[CrawledPage], Dict[str, int]]:
+    crawler = Crawler(**options)
+    pages = await crawler.crawl(start_url)
+    return pages, crawler.stats
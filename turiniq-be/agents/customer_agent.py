@@ -1,26 +1,44 @@
-import asyncio
 import json
 import logging
 import os
 import re
+import time
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
 import google.generativeai as genai
-from dotenv import load_dotenv
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 
-from db.mongodb import get_business_data, get_mongo_client
+from agents.conversation import ConversationLog, Role
+from agents.customer_classifier import classify_customer, identify_stats
+from agents.customer_details import (REQUIRED_FIELDS, ask_for, detail_stats,
+                                     extract_details, merge_details,
+                                     validate_llm_details)
+from agents.llm import (generate, generate_stream, get_model,
+                        model_with_instructions, uses_context_cache)
+from agents.prompt_builder import (ConversationMemory, estimate_tokens,
+                                   fit_sections)
+from agents.prompt_templates import instructions_for, template_stats
+from agents.resilience import DEGRADED_REPLY, ProviderUnavailable, start_turn
+from agents.response_cache import response_cache
+from agents.retrieval import retrieve_snippets
+from agents.session_store import Session, open_session
+from agents.streaming import stream_reply, ttfb
+from agents.turn_pipeline import escalation_rules, turn_input, turn_stats
+from db.mongodb import get_business_data
+from db.write_behind import write_behind
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Sales turns buffered in memory before their messages are appended to the lead
+LEAD_FLUSH_EVERY_TURNS = int(os.getenv("LEAD_FLUSH_EVERY_TURNS", "1"))
+ESCALATE_FLAG_RE = re.compile(r'"escalate"\s*:\s*(true|false)')
+# Sent when the support model's reply has no text
+SUPPORT_FALLBACK_REPLY = "Sorry, I encountered an issue. Please try again."
 
 class CustomerType(str, Enum):
     EXISTING = "existing"
@@ -39,9 +57,10 @@ class Ticket(BaseModel):
 
 class Lead(BaseModel):
     business_id: str
-    customer_name: str
-    customer_email: str
-    customer_phone: str
+    session_id: str
+    customer_name: Optional[str] = None
+    customer_email: Optional[str] = None
+    customer_phone: Optional[str] = None
     conversation: list[dict]
     reason: str
     status: str = "open"
@@ -57,11 +76,30 @@ def clean_json_response(response_text: str) -> str:
         json.loads(cleaned)
         return cleaned
     except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON after cleaning: {cleaned}, Error: {str(e)}")
+        logger.error("Invalid JSON after cleaning: %s, Error: %s", cleaned, e)
         return "{}"
 
 async def identify_customer(model: genai.GenerativeModel, message: str, business_id: str) -> tuple[CustomerType, Dict[str, Any]]:
-    """Identify customer type and collect details."""
+    """Identify customer type and collect details.
+
+    Clear messages are classified locally (rules, then the business's trained
+    model); only ambiguous ones go to the model.
+    """
+    start = time.perf_counter()
+    customer_type, local_info, source = await classify_customer(business_id, message)
+    if customer_type:
+        identify_stats.record(source, (time.perf_counter() - start) * 1000)
+        logger.debug("Customer identified as %s by %s", customer_type, source)
+        return CustomerType(customer_type), local_info
+
+    customer_type, customer_info = await _identify_with_llm(model, message, business_id)
+    for field, value in local_info.items():
+        if value and not customer_info.get(field):
+            customer_info[field] = value
+    identify_stats.record("llm", (time.perf_counter() - start) * 1000)
+    return customer_type, customer_info
+
+async def _identify_with_llm(model: genai.GenerativeModel, message: str, business_id: str) -> tuple[CustomerType, Dict[str, Any]]:
     prompt = f"""
     You are a TurinIQ customer identification agent. Based on the user's message, determine if they are an existing customer (mentions account, order, support issues, or refunds) or a new customer (general inquiries, product interest). Extract any provided customer info (name, email, phone, customer_id).
 
@@ -69,255 +107,405 @@ async def identify_customer(model: genai.GenerativeModel, message: str, business
     User Message: {message}
     Format: {{"customer_type": "existing|new", "customer_info": {{"customer_id": str|null, "name": str|null, "email": str|null, "phone": str|null}}}}
     """
-    for attempt in range(3):
-        try:
-            response = model.generate_content(prompt)
-            logger.debug(f"Gemini API raw response (identify_customer): {response.text}")
-            cleaned_response = clean_json_response(response.text)
-            logger.debug(f"Cleaned customer identification response: {cleaned_response}")
-            result = json.loads(cleaned_response)
-            customer_type = CustomerType.EXISTING if result.get("customer_type") == "existing" else CustomerType.NEW
-            return customer_type, result.get("customer_info", {})
-        except (json.JSONDecodeError, genai.exceptions.APIError) as e:
-            logger.error(f"Error on attempt {attempt + 1}: {str(e)}")
-            if attempt < 2:
-                await asyncio.sleep(2 ** attempt)
-                continue
-            return CustomerType.NEW, {}
-    logger.error("Failed to identify customer after 3 retries")
-    return CustomerType.NEW, {}
+    try:
+        response = await generate(prompt, business_id, model, call_site="identify")
+    except ProviderUnavailable as e:
+        # Route to sales, which still works with the canned reply
+        logger.error("Customer identification unavailable: %s", e)
+        return CustomerType.NEW, {}
+    logger.debug("Gemini API raw response (identify_customer): %s", response.text)
+    cleaned_response = clean_json_response(response.text)
+    logger.debug("Cleaned customer identification response: %s", cleaned_response)
+    result = json.loads(cleaned_response)
+    customer_type = CustomerType.EXISTING if result.get("customer_type") == "existing" else CustomerType.NEW
+    return customer_type, result.get("customer_info") or {}
 
 async def collect_customer_details(
     websocket: WebSocket,
     customer_info: Dict[str, Any],
-    conversation: list[dict],
+    conversation: ConversationLog,
     model: genai.GenerativeModel
 ) -> Dict[str, Any]:
-    """Prompt for missing customer details."""
-    required_fields = ["name", "email", "phone"]
-    missing_fields = [field for field in required_fields if not customer_info.get(field)]
+    """Prompt once for all missing customer details.
+
+    Details already given in the messages still in memory are parsed locally
+    first; the model is only asked for fields the parser could not find.
+    Fields the customer never gives stay None.
+    """
+    missing_fields = [field for field in REQUIRED_FIELDS if not customer_info.get(field)]
     if not missing_fields:
         return customer_info
 
-    for field in missing_fields:
-        prompt_message = f"Please provide your {field} to proceed."
+    filled_locally = filled_by_llm = llm_calls = 0
+    for entry in conversation:
+        if entry.role == Role.USER:
+            filled_locally += merge_details(customer_info, extract_details(entry.text))
+    asked = [field for field in missing_fields if not customer_info.get(field)]
+    if asked:
+        prompt_message = ask_for(asked)
         await websocket.send_text(prompt_message)
-        conversation.append({"agent": prompt_message, "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
+        conversation.add_agent(prompt_message)
         message = await websocket.receive_text()
-        conversation.append({"user": message, "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
-        logger.info(f"Received {field}: {message}")
-
-        prompt = f"""
-        Extract the {field} from the user's message.
-        Message: {message}
-        Return JSON: {{"{field}": str|null}}
-        """
-        try:
-            response = model.generate_content(prompt)
-            cleaned_response = clean_json_response(response.text)
-            data = json.loads(cleaned_response)
-            customer_info[field] = data.get(field) or customer_info.get(field)
-        except Exception as e:
-            logger.error(f"Error extracting {field}: {str(e)}")
-            customer_info[field] = None
-
-    # Ensure all fields are filled for leads
-    for field in required_fields:
-        if not customer_info.get(field):
-            customer_info[field] = "Unknown"
+        start_turn()
+        conversation.add_user(message)
+        logger.debug("Received details: %s", message)
+        filled_locally += merge_details(customer_info, extract_details(message, expect_name="name" in asked))
+
+        leftover = [field for field in asked if not customer_info.get(field)]
+        if leftover:
+            fields_json = ", ".join(f'"{field}": str|null' for field in leftover)
+            prompt = f"""
+            Extract the following customer details from the user's message: {", ".join(leftover)}.
+            Message: {message}
+            Return JSON: {{{fields_json}}}
+            """
+            llm_calls = 1
+            try:
+                response = await generate(prompt, model=model, call_site="field_extraction")
+                data = json.loads(clean_json_response(response.text))
+                found = validate_llm_details({field: data.get(field) for field in leftover})
+                filled_by_llm = merge_details(customer_info, found)
+            except Exception as e:
+                logger.error("Error extracting %s: %s", ", ".join(leftover), e)
+
+    for field in REQUIRED_FIELDS:
+        customer_info.setdefault(field, None)
+    detail_stats.record(len(missing_fields), bool(asked), llm_calls, filled_locally, filled_by_llm)
     return customer_info
 
+def _support_decision(raw: str) -> dict:
+    """The support model's JSON decision; for malformed output, the escalate flag alone decides."""
+    data = json.loads(clean_json_response(raw))
+    if not isinstance(data, dict):
+        data = {}
+    if "escalate" not in data:
+        match = ESCALATE_FLAG_RE.search(raw)
+        data["escalate"] = bool(match) and match.group(1) == "true"
+    return data
+
+async def _hold_if_escalating(chunks: AsyncIterator[str], raw: list[str]) -> AsyncIterator[str]:
+    """Forward reply chunks only once the model has decided not to escalate.
+
+    Every chunk is collected in `raw` so the caller can parse the full JSON.
+    """
+    pending, escalate = [], None
+    async for chunk in chunks:
+        raw.append(chunk)
+        if escalate is None:
+            pending.append(chunk)
+            match = ESCALATE_FLAG_RE.search("".join(pending))
+            if not match:
+                continue
+            escalate = match.group(1) == "true"
+            chunk = "".join(pending)
+        if not escalate:
+            yield chunk
+
 async def handle_support_agent(
     websocket: WebSocket,
-    business_id: str,
-    customer_info: Dict[str, Any],
-    conversation: list[dict],
-    model: genai.GenerativeModel
+    session: Session,
+    model: genai.GenerativeModel,
+    stream: bool = False
 ):
-    business_data = get_business_data(business_id)
-    context_prompt = business_data.get("context_prompt", "You are a TurinIQ support agent. Be friendly and concise.")
-    knowledge_base = business_data.get("knowledge_base", "")
+    business_id = session.business_id
+    customer_info = session.customer_info
+    conversation = session.conversation
+    business_data = await get_business_data(business_id)
+    instructions = instructions_for(business_data, "support", "You are a TurinIQ support agent. Be friendly and concise.")
+    kb_version = business_data.get("version")
+    rules = escalation_rules(business_data.get("settings"))
+    cacheable = response_cache.enabled_for(business_data.get("settings"))
+    memory = ConversationMemory(session, model)
+    frame_tokens = estimate_tokens(instructions + turn_input("", ""))
 
     while True:
         try:
+            # Save the last turn before waiting, so a reconnect can pick up from here
+            await session.checkpoint()
+            memory.maybe_summarize()
             message = await websocket.receive_text()
-            conversation.append({"user": message, "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
-            logger.info(f"Received message: {message}")
-
-            # Escalation check
-            escalation_prompt = f"""
-            Check if the message requires escalation.
-            Context: {context_prompt}
-            Message: {message}
-            Return JSON: {{"escalate": bool, "reason": str}}
-            Note: Escalate immediately if the message mentions refunds with reason "Refund request escalation".
-            """
-            escalation_data = {"escalate": False, "reason": ""}
-            for attempt in range(3):
-                try:
-                    escalation_response = model.generate_content(escalation_prompt)
-                    logger.debug(f"Escalation raw response: {escalation_response.text}")
-                    cleaned_escalation = clean_json_response(escalation_response.text)
-                    logger.debug(f"Escalation cleaned response: {cleaned_escalation}")
-                    escalation_data = json.loads(cleaned_escalation)
-                    break
-                except (json.JSONDecodeError, genai.exceptions.APIError) as e:
-                    logger.error(f"Escalation error on attempt {attempt + 1}: {str(e)}")
-                    if attempt < 2:
-                        await asyncio.sleep(2 ** attempt)
+            received_at = time.perf_counter()
+            start_turn()
+            conversation.add_user(message)
+            logger.debug("Received message: %s", message)
+
+            # Obvious escalations are caught locally without a model call
+            local_reason = rules.match(message)
+            # Replies depend on the conversation so far, so they are shared only between identical histories
+            history_key = memory.digest() if cacheable else ""
+            cached = response_cache.get(business_id, kb_version, "support", message, history_key) if cacheable and not local_reason else None
+            if local_reason:
+                turn_stats.record("prefilter", 0)
+                escalation_data = {"escalate": True, "reason": local_reason}
+            elif cached:
+                turn_stats.record("cached", 0)
+                await websocket.send_text(cached["response"])
+                ttfb["full"].record((time.perf_counter() - received_at) * 1000)
+                conversation.add_agent(cached["response"])
+                continue
+            else:
+                # One call decides on escalation and writes the reply
+                snippets = await retrieve_snippets(business_id, kb_version, message)
+                _, knowledge, history = fit_sections(frame_tokens, "", snippets, memory, message)
+                turn_prompt = turn_input(knowledge, message, history)
+                # The business's instructions travel as the system instruction
+                turn_model = await model_with_instructions(instructions, model)
+                template_stats.record(instructions, turn_prompt, uses_context_cache(turn_model))
+                escalation_data = {"escalate": False, "reason": "", "response": ""}
+                if stream:
+                    raw = []
+                    reply, _ = await stream_reply(
+                        websocket, _hold_if_escalating(generate_stream(turn_prompt, business_id, turn_model, call_site="support"), raw), received_at, field="response",
+                        # A reply with no text gets the fallback in its frames, unless the turn escalates
+                        fallback=lambda: None if _support_decision("".join(raw))["escalate"] else SUPPORT_FALLBACK_REPLY
+                    )
+                    turn_stats.record("combined", 1)
+                    escalation_data = _support_decision("".join(raw))
+                    if not escalation_data["escalate"]:
+                        if cacheable and reply and reply != SUPPORT_FALLBACK_REPLY:
+                            response_cache.put(business_id, kb_version, "support", message, {"response": reply}, (time.perf_counter() - received_at) * 1000, history_key)
+                        conversation.add_agent(reply)
                         continue
-
-            if escalation_data.get("escalate", False):
-                # Collect customer details if missing
-                customer_info = await collect_customer_details(websocket, customer_info, conversation, model)
-                ticket = Ticket(
-                    business_id=business_id,
-                    customer_id=customer_info.get("customer_id"),
-                    customer_name=customer_info.get("name"),
-                    customer_email=customer_info.get("email"),
-                    customer_phone=customer_info.get("phone"),
-                    conversation=conversation,
-                    reason=escalation_data.get("reason", "Escalation requested"),
-                    status="open",
-                    created_at=datetime.utcnow()
-                )
-                save_ticket(ticket)
-                logger.info(f"Ticket created: {ticket.dict()}")
-                await websocket.send_text("Your request has been escalated. A support ticket has been created.")
-                return
-
-            # Support response
-            support_prompt = f"""
-            You are a TurinIQ support agent. Respond to the customer's message.
-            Context: {context_prompt}
-            Knowledge Base: {knowledge_base[:1000]}...
-            Message: {message}
-            """
-            for attempt in range(3):
-                try:
-                    response = model.generate_content(support_prompt)
-                    cleaned_response = clean_json_response(response.text) if response.text.startswith("```json") else response.text
-                    await websocket.send_text(cleaned_response)
-                    conversation.append({"agent": cleaned_response, "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
-                    break
-                except genai.exceptions.APIError as e:
-                    logger.error(f"Support response error on attempt {attempt + 1}: {str(e)}")
-                    if attempt < 2:
-                        await asyncio.sleep(2 ** attempt)
+                else:
+                    response = await generate(turn_prompt, business_id, turn_model, call_site="support")
+                    logger.debug("Turn raw response: %s", response.text)
+                    escalation_data = _support_decision(response.text)
+                    turn_stats.record("combined", 1)
+                    if not escalation_data["escalate"]:
+                        reply = escalation_data.get("response")
+                        if cacheable and reply:
+                            response_cache.put(business_id, kb_version, "support", message, {"response": reply}, (time.perf_counter() - received_at) * 1000, history_key)
+                        reply = reply or SUPPORT_FALLBACK_REPLY
+                        await websocket.send_text(reply)
+                        ttfb["full"].record((time.perf_counter() - received_at) * 1000)
+                        conversation.add_agent(reply)
                         continue
-                    await websocket.send_text("Sorry, I encountered an issue. Please try again.")
-                    break
+
+            # Collect customer details if missing
+            customer_info = session.customer_info = await collect_customer_details(websocket, customer_info, conversation, model)
+            ticket = Ticket(
+                business_id=business_id,
+                customer_id=customer_info.get("customer_id"),
+                customer_name=customer_info.get("name"),
+                customer_email=customer_info.get("email"),
+                customer_phone=customer_info.get("phone"),
+                conversation=await session.transcript(),
+                reason=escalation_data.get("reason") or "Escalation requested",
+                status="open",
+                created_at=datetime.utcnow()
+            )
+            await save_ticket(ticket)
+            logger.info("Ticket created for %s: %s", business_id, ticket.reason)
+            await websocket.send_text("Your request has been escalated. A support ticket has been created.")
+            await session.close()
+            return
+        except WebSocketDisconnect:
+            break
+        except ProviderUnavailable as e:
+            logger.warning("Support turn degraded: %s", e)
+            await websocket.send_text(DEGRADED_REPLY)
+            conversation.add_agent(DEGRADED_REPLY)
         except Exception as e:
-            logger.error(f"Support agent error: {str(e)}")
+            logger.error("Support agent error: %s", e)
             await websocket.send_text("Sorry, an error occurred. Please try again later.")
             break
 
 async def handle_sales_agent(
     websocket: WebSocket,
-    business_id: str,
-    customer_info: Dict[str, Any],
-    conversation: list[dict],
-    model: genai.GenerativeModel
+    session: Session,
+    model: genai.GenerativeModel,
+    stream: bool = False
 ):
-    business_data = get_business_data(business_id)
-    context_prompt = business_data.get("context_prompt", "You are a TurinIQ sales agent. Be friendly and engaging to assist potential customers.")
-    knowledge_base = business_data.get("knowledge_base", "")
+    business_id = session.business_id
+    conversation = session.conversation
+    business_data = await get_business_data(business_id)
+    instructions = instructions_for(business_data, "sales", "You are a TurinIQ sales agent. Be friendly and engaging to assist potential customers.")
+    kb_version = business_data.get("version")
+    cacheable = response_cache.enabled_for(business_data.get("settings"))
 
     # Collect customer details upfront
-    customer_info = await collect_customer_details(websocket, customer_info, conversation, model)
-
-    while True:
-        try:
-            message = await websocket.receive_text()
-            conversation.append({"user": message, "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
-            logger.info(f"Received message: {message}")
-
-            # Sales response
-            sales_prompt = f"""
-            You are a TurinIQ sales agent. Respond to the potential customer's message to answer their queries and encourage engagement.
-            Context: {context_prompt}
-            Knowledge Base: {knowledge_base[:1000]}...
-            Message: {message}
-            Return JSON: {{"response": str, "reason": str}}
-            """
-            response_data = {"response": "Sorry, I couldn't process your request.", "reason": "General inquiry"}
-            for attempt in range(3):
-                try:
-                    response = model.generate_content(sales_prompt)
-                    cleaned_response = clean_json_response(response.text)
-                    response_data = json.loads(cleaned_response)
-                    break
-                except (json.JSONDecodeError, genai.exceptions.APIError) as e:
-                    logger.error(f"Sales response error on attempt {attempt + 1}: {str(e)}")
-                    if attempt < 2:
-                        await asyncio.sleep(2 ** attempt)
-                        continue
-                    break
-
-            await websocket.send_text(response_data.get("response"))
-            conversation.append({"agent": response_data.get("response"), "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
-
-            # Save lead after each interaction
-            lead = Lead(
-                business_id=business_id,
-                customer_name=customer_info["name"],
-                customer_email=customer_info["email"],
-                customer_phone=customer_info["phone"],
-                conversation=conversation,
-                reason=response_data.get("reason", "General inquiry"),
-                status="open",
-                created_at=datetime.utcnow()
-            )
-            save_lead(lead)
-            logger.info(f"Lead saved: {lead.dict()}")
+    customer_info = session.customer_info = await collect_customer_details(websocket, session.customer_info, conversation, model)
 
-        except Exception as e:
-            logger.error(f"Sales agent error: {str(e)}")
-            await websocket.send_text("Sorry, an error occurred. Please try again later.")
-            break
+    memory = ConversationMemory(session, model)
+    frame_tokens = estimate_tokens(instructions + turn_input("", ""))
 
-def save_ticket(ticket: Ticket):
+    # One lead document per session; each flush appends only the new messages
+    session_id = session.session_id
+    persisted = session.lead_persisted
+    pending_turns, reason = int(len(conversation) > persisted), "General inquiry"
+    try:
+        while True:
+            try:
+                await session.checkpoint()
+                memory.maybe_summarize()
+                message = await websocket.receive_text()
+                received_at = time.perf_counter()
+                start_turn()
+                conversation.add_user(message)
+                logger.debug("Received message: %s", message)
+                # Details mentioned mid-chat fill gaps on the lead's next flush
+                merge_details(customer_info, extract_details(message))
+
+                # Sales response
+                response_data = {"response": "Sorry, I couldn't process your request.", "reason": "General inquiry"}
+                generated = False
+                history_key = memory.digest() if cacheable else ""
+                cached = response_cache.get(business_id, kb_version, "sales", message, history_key) if cacheable else None
+                if cached:
+                    response_data = cached
+                    await websocket.send_text(response_data["response"])
+                    ttfb["full"].record((time.perf_counter() - received_at) * 1000)
+                else:
+                    snippets = await retrieve_snippets(business_id, kb_version, message)
+                    _, knowledge, history = fit_sections(frame_tokens, "", snippets, memory, message)
+                    sales_prompt = turn_input(knowledge, message, history)
+                    turn_model = await model_with_instructions(instructions, model)
+                    template_stats.record(instructions, sales_prompt, uses_context_cache(turn_model))
+                    if stream:
+                        # Forward the "response" field while the JSON object is still arriving
+                        streamed, raw = await stream_reply(websocket, generate_stream(sales_prompt, business_id, turn_model, call_site="sales"), received_at, field="response")
+                        parsed = json.loads(clean_json_response(raw))
+                        if streamed:
+                            response_data = {"response": streamed, "reason": parsed.get("reason", "General inquiry")}
+                            generated = True
+                        else:
+                            await websocket.send_text(response_data["response"])
+                    else:
+                        response = await generate(sales_prompt, business_id, turn_model, call_site="sales")
+                        response_data = json.loads(clean_json_response(response.text))
+                        generated = bool(response_data.get("response"))
+                        await websocket.send_text(response_data.get("response"))
+                        ttfb["full"].record((time.perf_counter() - received_at) * 1000)
+                if cacheable and generated:
+                    response_cache.put(business_id, kb_version, "sales", message, response_data, (time.perf_counter() - received_at) * 1000, history_key)
+                conversation.add_agent(response_data.get("response"))
+
+                reason = response_data.get("reason", "General inquiry")
+                pending_turns += 1
+                if pending_turns >= LEAD_FLUSH_EVERY_TURNS:
+                    persisted = session.lead_persisted = await _flush_lead(business_id, session_id, customer_info, conversation, persisted, reason)
+                    pending_turns = 0
+
+            except WebSocketDisconnect:
+                break
+            except ProviderUnavailable as e:
+                logger.warning("Sales turn degraded: %s", e)
+                await websocket.send_text(DEGRADED_REPLY)
+                conversation.add_agent(DEGRADED_REPLY)
+                pending_turns += 1
+            except Exception as e:
+                logger.error("Sales agent error: %s", e)
+                await websocket.send_text("Sorry, an error occurred. Please try again later.")
+                break
+    finally:
+        # Write whatever is still buffered when the customer disconnects
+        if pending_turns:
+            session.lead_persisted = await _flush_lead(business_id, session_id, customer_info, conversation, persisted, reason)
+            await session.checkpoint()
+
+async def _flush_lead(
+    business_id: str,
+    session_id: str,
+    customer_info: Dict[str, Any],
+    conversation: ConversationLog,
+    persisted: int,
+    reason: str
+) -> int:
+    """Append the messages after `persisted` to the session's lead; returns the new count."""
+    lead = Lead(
+        business_id=business_id,
+        session_id=session_id,
+        customer_name=customer_info.get("name"),
+        customer_email=customer_info.get("email"),
+        customer_phone=customer_info.get("phone"),
+        # Positions in the session make a lead write safe to apply twice
+        conversation=[{**entry, "seq": persisted + i} for i, entry in enumerate(conversation.to_dicts(persisted))],
+        reason=reason,
+        status="open",
+        created_at=datetime.utcnow()
+    )
+    await save_lead(lead)
+    return len(conversation)
+
+async def save_ticket(ticket: Ticket):
+    """Queue the ticket for the next write-behind flush."""
     try:
-        client = get_mongo_client()
-        db = client["turiniq"]
-        collection = db["tickets"]
-        result = collection.insert_one(ticket.dict())
-        logger.info(f"Ticket saved to MongoDB: {result.inserted_id}")
+        await write_behind.insert("tickets", ticket.dict())
+        logger.debug("Ticket queued for %s", ticket.business_id)
     except Exception as e:
-        logger.error(f"Failed to save ticket: {str(e)}")
+        logger.error("Failed to save ticket: %s", e)
         raise
 
-def save_lead(lead: Lead):
+async def save_lead(lead: Lead):
+    """Upsert the session's lead document and append `lead.conversation` to it.
+
+    `lead.conversation` holds only the messages not yet written for this
+    session, each with its `seq` position. The writes are queued, and may be
+    retried or replayed from a spill file after newer ones have landed, so
+    each is guarded: a batch whose first message is already on the lead is
+    skipped, messages are kept sorted by `seq`, and the lead's fields are
+    only set by a batch at least as recent as the last one applied.
+    """
     try:
-        client = get_mongo_client()
-        db = client["turiniq"]
-        collection = db["leads"]
-        result = collection.insert_one(lead.dict())
-        logger.info(f"Lead saved to MongoDB: {result.inserted_id}")
+        fields = lead.dict(exclude={"conversation", "created_at"})
+        fields["updated_at"] = datetime.utcnow()
+        count = lead.conversation[-1]["seq"] + 1 if lead.conversation else None
+        await write_behind.update(
+            "leads",
+            {"session_id": lead.session_id},
+            {"$setOnInsert": {"created_at": lead.created_at, "message_count": 0}},
+            upsert=True
+        )
+        if lead.conversation:
+            await write_behind.update(
+                "leads",
+                {"session_id": lead.session_id, "conversation.seq": {"$ne": lead.conversation[0]["seq"]}},
+                {
+                    "$push": {"conversation": {"$each": lead.conversation, "$sort": {"seq": 1}}},
+                    "$max": {"message_count": count},
+                }
+            )
+        current = {"session_id": lead.session_id}
+        if count is not None:
+            current["message_count"] = {"$lte": count}
+        await write_behind.update("leads", current, {"$set": fields})
+        logger.debug("Lead queued: session %s, %d new messages", lead.session_id, len(lead.conversation))
     except Exception as e:
-        logger.error(f"Failed to save lead: {str(e)}")
+        logger.error("Failed to save lead: %s", e)
         raise
 
-async def customer_agent(websocket: WebSocket, business_id: str):
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    conversation = []
+async def customer_agent(websocket: WebSocket, business_id: str, stream: bool = False, session_id: Optional[str] = None):
+    model = get_model()
 
     try:
-        business_data = get_business_data(business_id)
-        context_prompt = business_data.get("context_prompt", "Hello! Welcome to our support! How can I assist you today?")
-        await websocket.send_text(context_prompt.split("\n")[0])
-        logger.info(f"Sent initial message for business_id: {business_id}")
+        session = await open_session(business_id, session_id)
+        if stream:
+            # Framed clients keep the id and pass it back as ?session_id= when reconnecting
+            await websocket.send_text(json.dumps({"type": "session", "session_id": session.session_id, "resumed": session.resumed}))
 
-        message = await websocket.receive_text()
-        conversation.append({"user": message, "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
-        customer_type, customer_info = await identify_customer(model, message, business_id)
-        logger.info(f"Customer type: {customer_type}, Info: {customer_info}")
+        if session.resumed and session.agent:
+            logger.info("Resumed session %s with the %s agent", session.session_id, session.agent)
+        else:
+            business_data = await get_business_data(business_id)
+            context_prompt = business_data.get("context_prompt", "Hello! Welcome to our support! How can I assist you today?")
+            await websocket.send_text(context_prompt.split("\n")[0])
+            logger.debug("Sent initial message for business_id: %s", business_id)
 
-        if customer_type == CustomerType.EXISTING:
-            await handle_support_agent(websocket, business_id, customer_info, conversation, model)
+            message = await websocket.receive_text()
+            start_turn()
+            session.conversation.add_user(message)
+            customer_type, customer_info = await identify_customer(model, message, business_id)
+            logger.debug("Customer type: %s, Info: %s", customer_type, customer_info)
+            session.customer_info = customer_info
+            session.agent = "support" if customer_type == CustomerType.EXISTING else "sales"
+
+        if session.agent == "support":
+            await handle_support_agent(websocket, session, model, stream)
         else:
-            await handle_sales_agent(websocket, business_id, customer_info, conversation, model)
+            await handle_sales_agent(websocket, session, model, stream)
+    except WebSocketDisconnect:
+        logger.debug("Customer disconnected from %s", business_id)
     except Exception as e:
-        logger.error(f"Customer agent error: {str(e)}")
+        logger.error("Customer agent error: %s", e)
         await websocket.send_text("Sorry, an error occurred. Please try again later.")
-        await websocket.close()
\ No newline at end of file
+        await websocket.close()
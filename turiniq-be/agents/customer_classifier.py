@@ -0,0 +1,197 @@
+import logging
+import math
+import os
+import random
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from agents.customer_details import extract_details
+from agents.streaming import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# Rule score needed to decide without the model; each matched signal adds its weight
+RULE_THRESHOLD = float(os.getenv("IDENTIFY_RULE_THRESHOLD", "2"))
+# A trained model decides when its probability is this far from undecided
+MODEL_CONFIDENCE = float(os.getenv("IDENTIFY_MODEL_CONFIDENCE", "0.85"))
+MODEL_CACHE_SECONDS = float(os.getenv("IDENTIFY_MODEL_CACHE_SECONDS", "300"))
+MODEL_CACHE_SIZE = int(os.getenv("IDENTIFY_MODEL_CACHE_SIZE", "256"))
+HASH_BUCKETS = 2 ** 18
+
+# (pattern, weight): positive weights mean an existing customer, negative a new one
+SIGNALS = [
+    (r"\b(order|ticket|case|invoice|tracking|booking|reservation)\s*(no\.?|number|#|id)?\s*[:#]?\s*[a-z]{0,4}-?\d{3,}\b", 3.0),
+    (r"#\s?\d{4,}\b", 2.0),
+    (r"\b(customer|account|client|member(ship)?)\s*(id|number|no\.?|#)\b", 3.0),
+    (r"\bmy (order|account|subscription|package|parcel|delivery|booking|invoice|bill|plan|purchase|refund)s?\b", 2.0),
+    (r"\b(refund\w*|money back|charge ?back|return(ed|ing)? (it|the|my)|exchange (it|the|my))\b", 2.0),
+    (r"\b(i (ordered|bought|purchased|paid|booked|subscribed)|was charged|double charged|billed twice)\b", 2.0),
+    (r"\b(hasn'?t|has not|never|didn'?t|did not|not yet) (arrived|shipped|been delivered|come|received)|still waiting\b", 2.0),
+    (r"\b(broken|damaged|defective|faulty|wrong (item|size|product)|missing (item|part)s?|not working|stopped working)\b", 2.0),
+    (r"\b(cancel|change|update) my\b", 1.5),
+    (r"\b(log ?in|sign ?in|password|locked out|reset)\b", 1.5),
+    (r"\b(interested in|pricing|price list|how much (is|are|does|do)|quote|demo|free trial|trial)\b", -2.0),
+    (r"\b(do you (offer|sell|have|provide|ship|deliver)|are you open|opening hours|where are you located)\b", -2.0),
+    (r"\b(looking for|thinking (of|about) (buying|getting)|want to (buy|order|purchase|sign up|know more)|sign(ing)? up)\b", -2.0),
+    (r"\b(what (products|services|plans|options)|tell me (more )?about|more info(rmation)?|learn more)\b", -1.5),
+    (r"\b(new customer|first time|never (ordered|bought|used))\b", -3.0),
+]
+_SIGNALS = [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in SIGNALS]
+_CUSTOMER_ID_RE = re.compile(r"\b(?:customer|account|client|member)\s*(?:id|number|no\.?|#)\s*(?:is\s+)?[:#]?\s*([A-Za-z-]*\d[A-Za-z0-9-]{2,})\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9']+|#\d+")
+_DIGITS_RE = re.compile(r"\d")
+
+
+def rule_score(message: str) -> tuple[float, bool]:
+    """Summed signal weights, and whether signals for both answers matched."""
+    score, existing, new = 0.0, False, False
+    for pattern, weight in _SIGNALS:
+        if pattern.search(message):
+            score += weight
+            existing = existing or weight > 0
+            new = new or weight < 0
+    return score, existing and new
+
+def extract_info(message: str) -> Dict[str, Optional[str]]:
+    """customer_id, name, email and phone found in the message, same shape as the model's answer."""
+    details = extract_details(message)
+    customer_id = _CUSTOMER_ID_RE.search(message)
+    return {
+        "customer_id": customer_id.group(1) if customer_id else None,
+        "name": details.get("name"),
+        "email": details.get("email"),
+        "phone": details.get("phone"),
+    }
+
+
+def ngram_buckets(text: str) -> List[int]:
+    """Hashed word unigrams and bigrams. crc32 keeps buckets stable across processes."""
+    words = [_DIGITS_RE.sub("0", word) for word in _WORD_RE.findall(text.lower())]
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return sorted({zlib.crc32(gram.encode()) % HASH_BUCKETS for gram in grams})
+
+
+class HashedNgramModel:
+    """Logistic regression over hashed n-grams; predicts P(existing customer)."""
+
+    def __init__(self, weights: Optional[Dict[int, float]] = None, bias: float = 0.0):
+        self.weights = weights or {}
+        self.bias = bias
+
+    def predict(self, text: str) -> float:
+        z = self.bias + sum(self.weights.get(bucket, 0.0) for bucket in ngram_buckets(text))
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, z))))
+
+    @classmethod
+    def train(
+        cls,
+        examples: List[tuple[str, int]],
+        epochs: int = 10,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        max_weights: int = 20000,
+        seed: int = 0
+    ) -> "HashedNgramModel":
+        """Fit with SGD on (text, 1 for existing / 0 for new) pairs.
+
+        Only the `max_weights` largest weights are kept, bounding the stored size.
+        """
+        model = cls()
+        rows = [(ngram_buckets(text), label) for text, label in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(rows)
+            rate = learning_rate / (1 + epoch)
+            for buckets, label in rows:
+                z = model.bias + sum(model.weights.get(bucket, 0.0) for bucket in buckets)
+                error = label - 1 / (1 + math.exp(-max(-30.0, min(30.0, z))))
+                model.bias += rate * error
+                for bucket in buckets:
+                    weight = model.weights.get(bucket, 0.0)
+                    model.weights[bucket] = weight + rate * (error - l2 * weight)
+        if len(model.weights) > max_weights:
+            kept = sorted(model.weights.items(), key=lambda item: abs(item[1]), reverse=True)[:max_weights]
+            model.weights = dict(kept)
+        return model
+
+    def to_document(self) -> dict:
+        buckets = sorted(self.weights)
+        return {"buckets": buckets, "weights": [round(self.weights[b], 6) for b in buckets], "bias": self.bias}
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "HashedNgramModel":
+        return cls(dict(zip(doc["buckets"], doc["weights"])), doc.get("bias", 0.0))
+
+
+# business_id -> (loaded at, model or None); most recently used last
+_models: "OrderedDict[str, tuple[float, Optional[HashedNgramModel]]]" = OrderedDict()
+
+async def get_business_model(business_id: str) -> Optional[HashedNgramModel]:
+    """The business's trained model, if scripts.train_classifier has made one."""
+    cached = _models.get(business_id)
+    if cached and time.monotonic() - cached[0] < MODEL_CACHE_SECONDS:
+        _models.move_to_end(business_id)
+        return cached[1]
+    from db.mongodb import get_classifier_model
+    try:
+        doc = await get_classifier_model(business_id)
+    except Exception as e:
+        # Rules and the LLM still work; try again after the cache period
+        logger.warning("Could not load classifier model for %s: %s", business_id, e)
+        doc = None
+    model = HashedNgramModel.from_document(doc) if doc else None
+    _models[business_id] = (time.monotonic(), model)
+    while len(_models) > MODEL_CACHE_SIZE:
+        _models.popitem(last=False)
+    return model
+
+
+class IdentifyStats:
+    """How first messages were classified, and how long the first decision took."""
+
+    def __init__(self):
+        self.decisions = {"rules": 0, "model": 0, "llm": 0}
+        self.latency = {source: LatencyTracker() for source in self.decisions}
+
+    def record(self, source: str, elapsed_ms: float):
+        self.decisions[source] += 1
+        self.latency[source].record(elapsed_ms)
+
+    def summary(self) -> dict:
+        total = sum(self.decisions.values())
+        fast = self.decisions["rules"] + self.decisions["model"]
+        return {
+            "decisions": dict(self.decisions),
+            "fast_path_hit_rate": round(fast / total, 3) if total else 0.0,
+            "latency": {source: tracker.summary() for source, tracker in self.latency.items()},
+        }
+
+
+identify_stats = IdentifyStats()
+
+
+async def classify_customer(business_id: str, message: str) -> tuple[Optional[str], Dict[str, Any], Optional[str]]:
+    """Decide "existing" or "new" locally when the message is clear enough.
+
+    Returns (customer_type or None, customer_info, source), where source is
+    "rules" or "model"; a None type means the message is ambiguous and the
+    caller should ask the LLM.
+    """
+    info = extract_info(message)
+    score, conflicting = rule_score(message)
+    if info["customer_id"]:
+        score += RULE_THRESHOLD
+    if not conflicting and abs(score) >= RULE_THRESHOLD:
+        return ("existing" if score > 0 else "new"), info, "rules"
+
+    model = await get_business_model(business_id)
+    if model is not None:
+        probability = model.predict(message)
+        if probability >= MODEL_CONFIDENCE:
+            return "existing", info, "model"
+        if probability <= 1 - MODEL_CONFIDENCE:
+            return "new", info, "model"
+    return None, info, None
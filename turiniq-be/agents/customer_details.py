@@ -0,0 +1,147 @@
+import re
+from typing import Any, Dict, Iterable, Optional
+
+REQUIRED_FIELDS = ["name", "email", "phone"]
+FIELD_LABELS = {"name": "name", "email": "email", "phone": "phone number"}
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Digit groups joined by single spaces, dots or dashes, optionally in
+# parentheses: "+1 555 010 0199", "(020) 7946 0958", "5550104444"
+_PHONE_GROUP = r"(?:\(\d{1,5}\)|\d{1,5})"
+PHONE_RE = re.compile(rf"(?<![\w@.+/-])\+?{_PHONE_GROUP}(?:[ .-]?{_PHONE_GROUP}){{1,5}}(?![\w/-]|[.:]\d)")
+# Dates look like phone numbers once the separators are gone
+DATE_RE = re.compile(
+    r"\d{4}([-.\s])\d{1,2}\1\d{1,2}|\d{1,2}([-.\s])\d{1,2}\2\d{2,4}"
+    r"|(?:19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])"
+)
+_NAME_WORDS = r"([a-z][a-z'-]*(?:\s+[a-z][a-z'-]*){0,2})"
+# Intros that always introduce a name
+NAME_INTRO_RE = re.compile(rf"\b(?:my name is\s+|name:\s*|call me\s+){_NAME_WORDS}", re.IGNORECASE)
+# Intros that only do so in a reply to the name prompt; elsewhere "I'm having
+# trouble" or "its too expensive" would become names
+LOOSE_NAME_INTRO_RE = re.compile(rf"\b(?:name is|i am|i'm|im|this is|it's|its)\s+{_NAME_WORDS}", re.IGNORECASE)
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'-]*")
+# Words that end or rule out a name in free text
+NAME_STOPWORDS = {
+    "and", "my", "email", "mail", "phone", "number", "is", "here", "it", "the", "a", "an", "yes", "no",
+    "sure", "ok", "okay", "hi", "hello", "hey", "thanks", "thank", "you", "please", "i", "im", "me",
+    "interested", "looking", "not", "just", "from", "at", "on", "with", "mobile", "cell", "contact",
+}
+
+
+def normalize_phone(raw: str) -> Optional[str]:
+    """Digits only, keeping a leading +; None unless 7-15 digits (E.164 length)."""
+    digits = re.sub(r"\D", "", raw)
+    if not 7 <= len(digits) <= 15:
+        return None
+    return f"+{digits}" if raw.strip().startswith("+") else digits
+
+def valid_email(value: Optional[str]) -> bool:
+    return bool(value and EMAIL_RE.fullmatch(value.strip()))
+
+def _clean_name(words: Iterable[str]) -> Optional[str]:
+    kept = []
+    for word in words:
+        if word.lower() in NAME_STOPWORDS:
+            break
+        kept.append(word)
+    return " ".join(word[:1].upper() + word[1:] for word in kept) or None
+
+def extract_details(message: str, expect_name: bool = False) -> Dict[str, str]:
+    """Pull email, phone and name out of one message without a model call.
+
+    Names need an explicit intro ("my name is", "name:", "call me"). Looser
+    intros ("I'm", "this is") and a bare one-to-three word reply only count
+    when `expect_name` is set, i.e. the customer was just asked for it.
+    """
+    found = {}
+    email = EMAIL_RE.search(message)
+    if email:
+        found["email"] = email.group(0).lower()
+    rest = EMAIL_RE.sub(" ", message)
+    for match in PHONE_RE.finditer(rest):
+        if DATE_RE.fullmatch(match.group(0)):
+            continue
+        phone = normalize_phone(match.group(0))
+        if phone:
+            found["phone"] = phone
+            rest = rest.replace(match.group(0), " ")
+            break
+
+    intros = [NAME_INTRO_RE, LOOSE_NAME_INTRO_RE] if expect_name else [NAME_INTRO_RE]
+    for intro in (match for pattern in intros for match in pattern.finditer(rest)):
+        name = _clean_name(intro.group(1).split())
+        if name:
+            found["name"] = name
+            break
+    if "name" not in found and expect_name:
+        words = _WORD_RE.findall(rest)
+        leftover = re.sub(r"[\s,;.:!]+", "", _WORD_RE.sub("", rest))
+        if 1 <= len(words) <= 3 and not leftover and not any(word.lower() in NAME_STOPWORDS for word in words):
+            found["name"] = _clean_name(words)
+    return found
+
+def merge_details(customer_info: Dict[str, Any], found: Dict[str, Any]) -> int:
+    """Fill fields of customer_info that are still empty; returns how many were filled."""
+    filled = 0
+    for field, value in found.items():
+        if value and not customer_info.get(field):
+            customer_info[field] = value
+            filled += 1
+    return filled
+
+def validate_llm_details(data: Dict[str, Any]) -> Dict[str, str]:
+    """Keep only model-extracted values that pass the local validators."""
+    valid = {}
+    if isinstance(data.get("name"), str) and data["name"].strip():
+        valid["name"] = data["name"].strip()
+    if isinstance(data.get("email"), str) and valid_email(data["email"]):
+        valid["email"] = data["email"].strip().lower()
+    if isinstance(data.get("phone"), str):
+        phone = normalize_phone(data["phone"])
+        if phone:
+            valid["phone"] = phone
+    return valid
+
+def ask_for(fields: list[str]) -> str:
+    labels = [FIELD_LABELS[field] for field in fields]
+    listed = labels[0] if len(labels) == 1 else ", ".join(labels[:-1]) + f" and {labels[-1]}"
+    return f"Please provide your {listed} to proceed."
+
+
+class DetailStats:
+    """Model calls and customer round trips saved by batched, local-first extraction.
+
+    The previous flow asked for each missing field separately and made one
+    extraction call per answer.
+    """
+
+    def __init__(self):
+        self.sessions = 0
+        self.llm_calls = 0
+        self.llm_calls_avoided = 0
+        self.round_trips_avoided = 0
+        self.filled_locally = 0
+        self.filled_by_llm = 0
+
+    def record(self, missing: int, asked: bool, llm_calls: int, filled_locally: int, filled_by_llm: int):
+        self.sessions += 1
+        self.llm_calls += llm_calls
+        self.llm_calls_avoided += missing - llm_calls
+        self.round_trips_avoided += missing - (1 if asked else 0)
+        self.filled_locally += filled_locally
+        self.filled_by_llm += filled_by_llm
+
+    def summary(self) -> dict:
+        return {
+            "sessions": self.sessions,
+            "llm_calls": self.llm_calls,
+            "llm_calls_avoided": self.llm_calls_avoided,
+            "llm_calls_avoided_per_session": round(self.llm_calls_avoided / self.sessions, 3) if self.sessions else 0.0,
+            "round_trips_avoided": self.round_trips_avoided,
+            "fields_filled_locally": self.filled_locally,
+            "fields_filled_by_llm": self.filled_by_llm,
+        }
+
+
+detail_stats = DetailStats()
@@ -1,25 +1,249 @@
-from typing import List
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 
 import google.generativeai as genai
 import PyPDF2
+from fastapi import UploadFile
 
+from agents.llm import generate
 
-async def process_files(file_contents: List[str], model: genai.GenerativeModel, prompt: str) -> str:
-    """Processes uploaded files using Gemini API to create a knowledge base."""
-    knowledge_base = ""
-    for content in file_contents:
+logger = logging.getLogger(__name__)
+
+# Files summarized at once for a single /configure-agent request
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+# Each model call sees at most this many tokens of file text (~4 chars per token)
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "8000"))
+PDF_PAGES_PER_BATCH = int(os.getenv("INGEST_PDF_PAGES_PER_BATCH", "10"))
+# "thread" or "process"; a process pool keeps PDF parsing from contending for the GIL
+EXTRACT_EXECUTOR = os.getenv("INGEST_EXTRACT_EXECUTOR", "thread")
+EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", "2"))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or tempfile.gettempdir()
+UPLOAD_READ_SIZE = 1024 * 1024
+
+_executor: Optional[Executor] = None
+# In extraction worker processes: path -> ((inode, mtime), open reader), most recently used last
+_pdf_readers: "OrderedDict[str, tuple[tuple[int, int], PyPDF2.PdfReader]]" = OrderedDict()
+
+
+def _extract_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        pool = ProcessPoolExecutor if EXTRACT_EXECUTOR == "process" else ThreadPoolExecutor
+        _executor = pool(max_workers=EXTRACT_WORKERS)
+    return _executor
+
+async def spool_upload(upload: UploadFile) -> str:
+    """Copy an upload to a temporary file in fixed-size blocks and return its path."""
+    fd, path = tempfile.mkstemp(prefix="turiniq-upload-", dir=UPLOAD_SPOOL_DIR)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            block = await upload.read(UPLOAD_READ_SIZE)
+            if not block:
+                break
+            await asyncio.to_thread(out.write, block)
+    return path
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def file_fingerprint(path: str) -> str:
+    """sha256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _is_pdf(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+def _open_pdf(path: str) -> PyPDF2.PdfReader:
+    """A reader on a file handle, so objects are read from disk as pages need them.
+
+    PdfReader(path) would copy the whole file into memory first.
+    """
+    f = open(path, "rb")
+    try:
+        return PyPDF2.PdfReader(f)
+    except BaseException:
+        f.close()
+        raise
+
+def _pooled_pdf_reader(path: str) -> PyPDF2.PdfReader:
+    """This worker process's reader for a file, opened on its first batch."""
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns)
+    cached = _pdf_readers.pop(path, None)
+    if cached is not None and cached[0] != version:
+        cached[1].stream.close()
+        cached = None
+    if cached is None:
+        cached = (version, _open_pdf(path))
+    _pdf_readers[path] = cached
+    while len(_pdf_readers) > INGEST_CONCURRENCY:
+        _pdf_readers.popitem(last=False)[1][1].stream.close()
+    return cached[1]
+
+def _pdf_page_count(path: str) -> int:
+    return len(_pooled_pdf_reader(path).pages)
+
+def _extract_pdf_pages(path: str, start: int, end: int, reader: Optional[PyPDF2.PdfReader] = None) -> str:
+    reader = reader or _pooled_pdf_reader(path)
+    return "\n".join(reader.pages[i].extract_text() or "" for i in range(start, end)) + "\n"
+
+def _pdf_batches(path: str) -> Iterator[str]:
+    reader = _open_pdf(path)
+    try:
+        for start in range(0, len(reader.pages), PDF_PAGES_PER_BATCH):
+            yield _extract_pdf_pages(path, start, min(start + PDF_PAGES_PER_BATCH, len(reader.pages)), reader)
+    finally:
+        reader.stream.close()
+
+async def _iter_pdf_text(path: str) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    executor = _extract_executor()
+    if EXTRACT_EXECUTOR == "process":
+        # Readers can't cross processes; each worker keeps its own open for the file's later batches
+        page_count = await loop.run_in_executor(executor, _pdf_page_count, path)
+        for start in range(0, page_count, PDF_PAGES_PER_BATCH):
+            end = min(start + PDF_PAGES_PER_BATCH, page_count)
+            yield await loop.run_in_executor(executor, _extract_pdf_pages, path, start, end)
+        return
+    batches = _pdf_batches(path)
+    while True:
+        batch = await loop.run_in_executor(executor, next, batches, None)
+        if batch is None:
+            return
+        yield batch
+
+async def iter_file_chunks(path: str, max_chars: int) -> AsyncIterator[str]:
+    """Yield a file's text in pieces of at most max_chars, reading it incrementally.
+
+    PDFs are extracted a batch of pages at a time in the extraction pool;
+    anything else is read as UTF-8 text.
+    """
+    if await asyncio.to_thread(_is_pdf, path):
+        buffer = ""
+        async for text in _iter_pdf_text(path):
+            buffer += text
+            while len(buffer) >= max_chars:
+                yield buffer[:max_chars]
+                buffer = buffer[max_chars:]
+        if buffer.strip():
+            yield buffer
+        return
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            text = await asyncio.to_thread(f.read, max_chars)
+            if not text:
+                break
+            yield text
+
+async def _summarize(text: str, model: genai.GenerativeModel, prompt: str) -> str:
+    response = await generate(f"{prompt}\n\nFile Content:\n{text}", model=model, call_site="file_summary")
+    return response.text
+
+async def _summarize_chunk(text: str, model: genai.GenerativeModel, prompt: str, semaphore: asyncio.Semaphore) -> str:
+    try:
+        return await _summarize(text, model, prompt)
+    finally:
+        semaphore.release()
+
+async def _reduce(summaries: List[str], model: genai.GenerativeModel, prompt: str, semaphore: asyncio.Semaphore, max_chars: int) -> tuple[str, int]:
+    """Merge chunk summaries, in rounds, until one summary is left.
+
+    Returns the summary and the number of model calls it took.
+    """
+    calls = 0
+    while len(summaries) > 1:
+        groups, current = [], []
+        for summary in summaries:
+            if len(current) >= 2 and sum(map(len, current)) + len(summary) > max_chars:
+                groups.append(current)
+                current = []
+            current.append(summary)
+        groups.append(current)
+
+        async def merge(group: List[str]) -> str:
+            if len(group) == 1:
+                return group[0]
+            async with semaphore:
+                return await _summarize("\n\n".join(group), model, prompt)
+
+        calls += sum(1 for group in groups if len(group) > 1)
+        summaries = await asyncio.gather(*(merge(group) for group in groups))
+    return (summaries[0] if summaries else ""), calls
+
+async def _summarize_file(path: str, model: genai.GenerativeModel, prompt: str, semaphore: asyncio.Semaphore) -> tuple[str, int]:
+    max_chars = INGEST_CHUNK_TOKENS * 4
+    tasks = []
+    try:
+        async for chunk in iter_file_chunks(path, max_chars):
+            # Take the slot before reading on, so extraction waits for the model
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(_summarize_chunk(chunk, model, prompt, semaphore)))
+    except BaseException:
+        # Let started chunks finish, so their slots are released, before giving up on the file
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    summaries = await asyncio.gather(*tasks)
+    summary, merge_calls = await _reduce(list(summaries), model, prompt, semaphore, max_chars)
+    return summary, len(tasks) + merge_calls
+
+async def summarize_files(
+    file_paths: List[str],
+    model: genai.GenerativeModel,
+    prompt: str,
+    known: Optional[Dict[str, dict]] = None,
+    concurrency: Optional[int] = None
+) -> Dict[str, dict]:
+    """Summarize each distinct file, keyed by the sha256 of its content.
+
+    Values are {"summary": str, "llm_calls": int}, in upload order. Files whose
+    fingerprint is already in `known` (an earlier result) are not summarized again.
+    A corrupt or encrypted PDF is logged and left out; the other files still count.
+    """
+    semaphore = asyncio.Semaphore(concurrency or INGEST_CONCURRENCY)
+    known = known or {}
+    fingerprints = await asyncio.gather(*(asyncio.to_thread(file_fingerprint, path) for path in file_paths))
+    paths = dict(zip(fingerprints, file_paths))
+
+    async def summarize(fingerprint: str, path: str) -> dict:
+        if fingerprint in known:
+            return known[fingerprint]
         try:
-            # Try to process as PDF
-            reader = PyPDF2.PdfReader(content.encode())
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        except:
-            # Treat as plain text
-            text = content
-        
-        # Use Gemini to summarize
-        response = model.generate_content(f"{prompt}\n\nFile Content:\n{text}")
-        knowledge_base += response.text + "\n"
-    
-    return knowledge_base.strip()
\ No newline at end of file
+            summary, calls = await _summarize_file(path, model, prompt, semaphore)
+        except (PyPDF2.errors.PdfReadError, OSError) as e:
+            logger.error("Skipping unreadable file %s: %s", path, e)
+            return None
+        return {"summary": summary, "llm_calls": calls}
+
+    results = await asyncio.gather(*(summarize(fingerprint, path) for fingerprint, path in paths.items()))
+    return {fingerprint: result for fingerprint, result in zip(paths, results) if result is not None}
+
+async def process_files(
+    file_paths: List[str],
+    model: genai.GenerativeModel,
+    prompt: str,
+    concurrency: Optional[int] = None
+) -> str:
+    """Processes uploaded files using Gemini API to create a knowledge base.
+
+    Large files are split into token-bounded chunks that are summarized
+    separately and then merged (map-reduce). At most `concurrency` model
+    calls run at once; the summaries keep the upload order.
+    """
+    summaries = await summarize_files(file_paths, model, prompt, concurrency=concurrency)
+    return "\n".join(entry["summary"] for entry in summaries.values()).strip()
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from agents.context_builder import BusinessInput
+from agents.file_processor import remove_files
+
+logger = logging.getLogger(__name__)
+
+CONFIGURE_WORKERS = int(os.getenv("CONFIGURE_WORKERS", "2"))
+# How often idle workers look for jobs submitted to other processes
+JOB_POLL_SECONDS = float(os.getenv("CONFIGURE_JOB_POLL_SECONDS", "2"))
+# A running job not updated for this long was left behind by a worker that stopped
+JOB_LEASE_SECONDS = float(os.getenv("CONFIGURE_JOB_LEASE_SECONDS", "300"))
+JOB_STOPPED_ERROR = "worker stopped before the job finished"
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class ConfigureJob:
+    def __init__(self, business_id: str, input_data: BusinessInput, file_paths: List[str]):
+        self.job_id = uuid.uuid4().hex
+        self.business_id = business_id
+        self.input_data = input_data
+        self.file_paths = file_paths
+        self.status = JobStatus.QUEUED
+        self.stage: Optional[str] = None
+        self.submissions = 1
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.updated_at = self.created_at
+
+    @classmethod
+    def from_dict(cls, doc: dict) -> "ConfigureJob":
+        # /configure-agent submits the API's model, which takes a domain without a scheme
+        from api.endpoints import BusinessInput as SubmittedInput
+        job = cls(doc["business_id"], SubmittedInput(**doc["input"]), doc["file_paths"])
+        job.job_id = doc["job_id"]
+        job.status = JobStatus(doc["status"])
+        job.stage = doc.get("stage")
+        job.submissions = doc.get("submissions", 1)
+        job.created_at = doc["created_at"]
+        job.updated_at = doc["updated_at"]
+        return job
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "business_id": self.business_id,
+            "status": self.status.value,
+            "stage": self.stage,
+            "submissions": self.submissions,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            # Queued and running jobs are unique per (business_id, status)
+            "active": self.status in (JobStatus.QUEUED, JobStatus.RUNNING),
+        }
+
+
+class ConfigureJobQueue:
+    """Worker pool that runs main_agent_process outside the request.
+
+    Jobs live in the `agent_jobs` collection and are claimed from it, so the
+    queue is shared by every worker process. A unique index on
+    (business_id, status) over active jobs keeps one queued and one running
+    job per business: repeated submissions before a job starts upsert into
+    it, replacing its input and returning the same job id, and a queued job
+    is only claimed once the business's previous job has finished, so an
+    older config can't finish last. Uploads are read by whichever process
+    claims the job, so every process must share UPLOAD_SPOOL_DIR.
+    """
+
+    def __init__(self, workers: int = CONFIGURE_WORKERS):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        # Set on submit so this process's idle workers don't wait for the next poll
+        self._wake: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @staticmethod
+    def _collection():
+        from db.mongodb import get_async_db
+        return get_async_db()["agent_jobs"]
+
+    async def submit(self, business_id: str, input_data: BusinessInput, file_paths: List[str]) -> tuple[ConfigureJob, bool]:
+        """Queue a configuration run; returns (job, coalesced)."""
+        job = ConfigureJob(business_id, input_data, file_paths)
+        fields = job.to_dict()
+        while True:
+            try:
+                queued = await self._collection().find_one_and_update(
+                    {"business_id": business_id, "status": JobStatus.QUEUED.value, "active": True},
+                    {
+                        "$set": {"input": input_data.model_dump(mode="json"), "file_paths": file_paths, "updated_at": job.updated_at},
+                        "$inc": {"submissions": 1},
+                        "$setOnInsert": {name: fields[name] for name in ("job_id", "stage", "result", "error", "created_at")},
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.BEFORE,
+                )
+                break
+            except DuplicateKeyError:
+                # Another process inserted the queued job first; coalesce into it
+                continue
+        if self._wake is not None:
+            self._wake.set()
+        if queued is None:
+            return job, False
+        remove_files(queued["file_paths"])
+        job.job_id = queued["job_id"]
+        job.submissions = queued["submissions"] + 1
+        job.created_at = queued["created_at"]
+        return job, True
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self._collection().find_one({"job_id": job_id}, {"_id": 0, "input": 0, "file_paths": 0, "active": 0})
+
+    async def _expire_stale(self, collection):
+        """Fail running jobs whose worker stopped, and remove the uploads they left behind."""
+        while True:
+            # One job at a time, so only the process that expires a job removes its files
+            stale = await collection.find_one_and_update(
+                {"status": JobStatus.RUNNING.value, "active": True, "updated_at": {"$lt": datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)}},
+                {"$set": {"status": JobStatus.FAILED.value, "active": False, "error": JOB_STOPPED_ERROR, "file_paths": []}},
+            )
+            if stale is None:
+                return
+            logger.warning("Configure job %s for %s expired: %s", stale["job_id"], stale["business_id"], JOB_STOPPED_ERROR)
+            remove_files(stale.get("file_paths") or [])
+
+    async def _claim(self) -> Optional[ConfigureJob]:
+        """Take the oldest queued job whose business has no job running."""
+        collection = self._collection()
+        await self._expire_stale(collection)
+        busy: List[str] = []
+        while True:
+            candidate = await collection.find_one(
+                {"status": JobStatus.QUEUED.value, "active": True, "business_id": {"$nin": busy}},
+                {"job_id": 1, "business_id": 1},
+                sort=[("created_at", 1)],
+            )
+            if candidate is None:
+                return None
+            try:
+                doc = await collection.find_one_and_update(
+                    {"job_id": candidate["job_id"], "status": JobStatus.QUEUED.value},
+                    {"$set": {"status": JobStatus.RUNNING.value, "updated_at": datetime.utcnow()}},
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # The business's previous job is still running somewhere
+                busy.append(candidate["business_id"])
+                continue
+            if doc is not None:
+                return ConfigureJob.from_dict(doc)
+
+    async def _worker(self):
+        while True:
+            self._wake.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error("Failed to claim a configure job: %s", e)
+                job = None
+            if job is not None:
+                await self._run(job)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _heartbeat(self, job: ConfigureJob):
+        """Keep a long running job's lease from expiring between stages."""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await self._update(job)
+
+    async def _run(self, job: ConfigureJob):
+        from agents.main_agent import main_agent_process
+
+        async def progress(stage: str):
+            job.stage = stage
+            await self._update(job)
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            job.result = await main_agent_process(job.input_data, job.file_paths, progress)
+            job.status = JobStatus.SUCCEEDED
+            job.stage = "done"
+        except asyncio.CancelledError:
+            job.status = JobStatus.FAILED
+            job.error = JOB_STOPPED_ERROR
+            await self._update(job)
+            raise
+        except Exception as e:
+            logger.error("Configure job %s for %s failed: %s", job.job_id, job.business_id, e)
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        finally:
+            heartbeat.cancel()
+            remove_files(job.file_paths)
+            job.file_paths = []
+        await self._update(job)
+
+    async def _update(self, job: ConfigureJob):
+        job.updated_at = datetime.utcnow()
+        try:
+            await self._collection().update_one({"job_id": job.job_id}, {"$set": job.to_dict()})
+        except Exception as e:
+            logger.error("Failed to persist configure job %s: %s", job.job_id, e)
+
+
+configure_jobs = ConfigureJobQueue()
@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, Optional
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from agents.metrics import llm_calls, llm_queue_wait, record_llm_call
+from agents.resilience import (ProviderUnavailable, call_with_policy,
+                               stream_with_policy)
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+MAX_CONCURRENCY_PER_BUSINESS = int(os.getenv("LLM_MAX_CONCURRENCY_PER_BUSINESS", "8"))
+# Models bound to a business's instructions, kept for reuse across turns
+INSTRUCTION_MODELS_MAX = int(os.getenv("LLM_INSTRUCTION_MODELS_MAX", "256"))
+# Instructions at least this large are registered as Gemini cached content, so
+# turns stop resending them; Gemini rejects smaller caches (32k tokens on 1.5 models)
+CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "1") == "1"
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("LLM_CONTEXT_CACHE_MIN_TOKENS", "32768"))
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("LLM_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+
+_model: Optional[genai.GenerativeModel] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+# business_id -> its limit, while any call holds or waits for it
+_business_limits: Dict[str, "_BusinessLimit"] = {}
+# (model name, instructions digest) -> (expires at, bound model)
+_instruction_models: "OrderedDict[tuple[str, str], tuple[float, Any]]" = OrderedDict()
+
+
+def get_model() -> genai.GenerativeModel:
+    """Return the process-wide model instance shared by every agent."""
+    global _model
+    if _model is None:
+        _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+def set_model(model: Any):
+    """Replace the shared model, e.g. with a local stub for load tests."""
+    global _model
+    _model = model
+
+class _PrefixedModel:
+    """Stand-in for models without system instructions (local stubs): prepends them to each prompt."""
+
+    def __init__(self, model: Any, instructions: str):
+        self.model = model
+        self.instructions = instructions
+
+    def generate_content(self, prompt: str):
+        return self.model.generate_content(self.instructions + prompt)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        return await self.model.generate_content_async(self.instructions + prompt, stream=stream)
+
+async def _bind_instructions(model: genai.GenerativeModel, instructions: str) -> tuple[float, Any]:
+    if CONTEXT_CACHE and len(instructions) // 4 >= CONTEXT_CACHE_MIN_TOKENS:
+        try:
+            cached = await asyncio.to_thread(
+                genai.caching.CachedContent.create,
+                model=model.model_name,
+                system_instruction=instructions,
+                ttl=timedelta(seconds=CONTEXT_CACHE_TTL_SECONDS),
+            )
+            # Rebind a little before the provider drops the cache
+            return time.monotonic() + CONTEXT_CACHE_TTL_SECONDS * 0.9, genai.GenerativeModel.from_cached_content(cached)
+        except Exception as e:
+            logger.warning("Could not cache instructions, sending them with each call: %s", e)
+    return float("inf"), genai.GenerativeModel(model.model_name, system_instruction=instructions)
+
+async def model_with_instructions(instructions: str, model: Optional[Any] = None) -> Any:
+    """Return `model` with `instructions` as its system instruction.
+
+    Bound models are kept per instruction text, so a business's turns reuse
+    one instance and each call only sends the per-turn prompt. Large
+    instructions are held in a Gemini context cache instead.
+    """
+    model = model or get_model()
+    if not isinstance(model, genai.GenerativeModel):
+        return _PrefixedModel(model, instructions)
+    key = (model.model_name, hashlib.sha256(instructions.encode()).hexdigest())
+    entry = _instruction_models.get(key)
+    if entry is None or entry[0] <= time.monotonic():
+        entry = _instruction_models[key] = await _bind_instructions(model, instructions)
+    _instruction_models.move_to_end(key)
+    while len(_instruction_models) > INSTRUCTION_MODELS_MAX:
+        _instruction_models.popitem(last=False)
+    return entry[1]
+
+def uses_context_cache(model: Any) -> bool:
+    return bool(getattr(model, "cached_content", None))
+
+def _global_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphore
+
+class _BusinessLimit:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY_PER_BUSINESS)
+        # Calls holding or waiting for the semaphore; it is dropped when none are
+        self.users = 0
+
+async def _call_model(model: Any, prompt: str):
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(prompt)
+    # Fall back to a worker thread for models that only expose the sync API
+    return await asyncio.to_thread(model.generate_content, prompt)
+
+@asynccontextmanager
+async def _slots(business_id: Optional[str]):
+    if not business_id:
+        async with _global_semaphore():
+            yield
+        return
+    limit = _business_limits.get(business_id)
+    if limit is None:
+        limit = _business_limits[business_id] = _BusinessLimit()
+    limit.users += 1
+    try:
+        # Wait on the tenant limit first so queued calls don't hold global slots
+        async with limit.semaphore:
+            async with _global_semaphore():
+                yield
+    finally:
+        limit.users -= 1
+        if not limit.users:
+            del _business_limits[business_id]
+
+def _response_text(response: Any) -> str:
+    try:
+        return response.text or ""
+    except ValueError:
+        # Blocked or empty candidates have no text
+        return ""
+
+async def _generate_once(prompt: str, business_id: Optional[str], model: Any, call_site: str):
+    queued = time.perf_counter()
+    async with _slots(business_id):
+        llm_queue_wait.labels(call_site).observe(time.perf_counter() - queued)
+        started = time.perf_counter()
+        try:
+            response = await _call_model(model, prompt)
+        except asyncio.CancelledError:
+            # Timed out, or lost a hedged race
+            record_llm_call(call_site, business_id, started, len(prompt), 0, outcome="cancelled")
+            raise
+        except Exception:
+            record_llm_call(call_site, business_id, started, len(prompt), 0, outcome="error")
+            raise
+        usage = getattr(response, "usage_metadata", None)
+        record_llm_call(call_site, business_id, started, len(prompt), len(_response_text(response)), usage)
+        return response
+
+async def generate(prompt: str, business_id: Optional[str] = None, model: Optional[Any] = None, call_site: str = "other"):
+    """Await a model call without blocking the event loop.
+
+    Calls are bounded by a per-process limit and, when a business_id is given,
+    a per-business limit so one tenant cannot take every slot. Failures are
+    retried under the shared policy in agents.resilience, which raises
+    ProviderUnavailable when no answer can be had in time. Latency, queue
+    wait and tokens are recorded under `call_site`.
+    """
+    model = model or get_model()
+    try:
+        return await call_with_policy(lambda: _generate_once(prompt, business_id, model, call_site), call_site)
+    except ProviderUnavailable:
+        llm_calls.labels(call_site, "unavailable").inc()
+        raise
+
+async def _stream_model(model: Any, prompt: str) -> AsyncIterator[str]:
+    if not hasattr(model, "generate_content_async"):
+        # Models without an async streaming API deliver the reply as one chunk
+        response = await asyncio.to_thread(model.generate_content, prompt)
+        yield response.text
+        return
+    response = await model.generate_content_async(prompt, stream=True)
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+async def _stream_once(prompt: str, business_id: Optional[str], model: Any, call_site: str) -> AsyncIterator[str]:
+    queued = time.perf_counter()
+    async with _slots(business_id):
+        llm_queue_wait.labels(call_site).observe(time.perf_counter() - queued)
+        started = time.perf_counter()
+        reply_chars, outcome = 0, "ok"
+        try:
+            async for text in _stream_model(model, prompt):
+                reply_chars += len(text)
+                yield text
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            record_llm_call(call_site, business_id, started, len(prompt), reply_chars, outcome=outcome)
+
+async def generate_stream(
+    prompt: str,
+    business_id: Optional[str] = None,
+    model: Optional[Any] = None,
+    call_site: str = "other"
+) -> AsyncIterator[str]:
+    """Yield the reply text chunk by chunk as the model produces it.
+
+    Holds the same concurrency slots as `generate` for the life of the stream.
+    Failures before the first chunk are retried like `generate`.
+    """
+    model = model or get_model()
+    try:
+        async for text in stream_with_policy(lambda: _stream_once(prompt, business_id, model, call_site), call_site):
+            yield text
+    except ProviderUnavailable:
+        llm_calls.labels(call_site, "unavailable").inc()
+        raise
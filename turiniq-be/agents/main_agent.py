@@ -1,41 +1,137 @@
 import asyncio
-import os
-
-import google.generativeai as genai
-from dotenv import load_dotenv
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Optional
 
 from agents.context_builder import BusinessInput, build_context
-from agents.file_processor import process_files
-from agents.web_scraper import scrape_website
+from agents.file_processor import summarize_files
+from agents.llm import get_model
+from agents.prompt_templates import compile_templates
+from agents.retrieval import USE_EMBEDDINGS, chunk_text, embed_texts
+from agents.web_scraper import scrape_site
+
+async def _timed(timings: dict, stage: str, coro):
+    """Await `coro`, recording its wall time in milliseconds under `stage`."""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+def business_id_for(input_data: BusinessInput) -> str:
+    return f"{input_data.business_type}_{input_data.domain}"
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+def _context_inputs_hash(settings: dict, knowledge_base: str) -> str:
+    payload = json.dumps({"settings": settings, "knowledge_base": knowledge_base}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def main_agent_process(
+    input_data: BusinessInput,
+    file_paths: list[str],
+    progress: Optional[Callable[[str], Awaitable[None]]] = None
+) -> dict:
+    """Orchestrates file processing, web scraping, and context building.
+
+    Sources are fingerprinted: files and a site whose content is unchanged
+    since the last configuration reuse their stored summaries, and the
+    context is rebuilt only when the settings or knowledge base changed.
+    `progress` is awaited with the name of each stage as it starts.
+    """
+    from db.mongodb import get_business_sources
 
-async def main_agent_process(input_data: BusinessInput, file_contents: list[str]) -> dict:
-    """Orchestrates file processing, web scraping, and context building."""
-    model = genai.GenerativeModel("gemini-1.5-flash")
+    async def report(stage: str):
+        if progress:
+            await progress(stage)
+
+    model = get_model()
+    timings = {}
+    started = time.perf_counter()
+    business_id = business_id_for(input_data)
+    previous = await get_business_sources(business_id)
+    known_files = (previous.get("sources") or {}).get("files") or {}
+    known_site = (previous.get("sources") or {}).get("site")
     
-    # Step 1: Process files
+    # Steps 1 and 2: Process files and scrape the website concurrently
     file_prompt = """
     You are a file processing agent for TurinIQ. Extract key information from the provided text files to create a concise knowledge base summarizing the business details, products, services, or other relevant information. Return the knowledge base as a plain text string.
     """
-    file_knowledge_base = await process_files(file_contents, model, file_prompt)
-    
-    # Step 2: Scrape website
-    web_knowledge_base = await scrape_website(str(input_data.domain), model)
+    await report("processing_sources")
+    files, site = await asyncio.gather(
+        _timed(timings, "process_files_ms", summarize_files(file_paths, model, file_prompt, known=known_files)),
+        _timed(timings, "scrape_website_ms", scrape_site(str(input_data.domain), model, known=known_site)),
+    )
+    file_knowledge_base = "\n".join(entry["summary"] for entry in files.values()).strip()
     
     # Combine knowledge bases
-    combined_knowledge_base = f"{file_knowledge_base}\n\nWeb Data:\n{web_knowledge_base}"
-    
-    # Step 3: Build context prompt
-    context_prompt = await build_context(input_data, combined_knowledge_base, model)
+    combined_knowledge_base = f"{file_knowledge_base}\n\nWeb Data:\n{site['summary']}"
+    settings = input_data.model_dump(mode="json")
+    inputs_hash = _context_inputs_hash(settings, combined_knowledge_base)
+    reused_files = [fingerprint for fingerprint in files if fingerprint in known_files]
+    site_reused = bool(site["fingerprint"]) and site["llm_calls"] == 0
+    context_reused = inputs_hash == previous.get("context_inputs_hash") and bool(previous.get("context_prompt"))
     
-    # Step 4: Save to MongoDB
-    from db.mongodb import save_business_data
-    business_id = f"{input_data.business_type}_{input_data.domain}"
-    save_business_data(business_id, combined_knowledge_base, context_prompt)
+    if context_reused:
+        # Nothing the context depends on changed; keep the stored record as is
+        context_prompt = previous["context_prompt"]
+    else:
+        # Chunk once at ingest so each turn only retrieves the relevant pieces
+        chunks = chunk_text(combined_knowledge_base)
+        
+        # Step 3: Build context prompt
+        await report("building_context")
+        context_prompt = await _timed(timings, "build_context_ms", build_context(input_data, combined_knowledge_base, model, chunks))
+        
+        # Step 4: Save to MongoDB
+        await report("saving")
+        embeddings = await _timed(timings, "embed_ms", embed_texts(chunks)) if USE_EMBEDDINGS and chunks else None
+        sources = {
+            "files": files,
+            "site": {key: site[key] for key in ("fingerprint", "summary", "pages")} if site["fingerprint"] else None,
+        }
+        # Turn instructions are compiled once here rather than on every turn
+        templates = compile_templates(context_prompt, settings)
+        await _timed(timings, "save_ms", _save(business_id, chunks, embeddings, combined_knowledge_base, context_prompt, settings, sources, inputs_hash, templates))
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    known_pages = {page["url"]: page["hash"] for page in (known_site or {}).get("pages", [])}
+    refresh = {
+        "files": len(files),
+        "files_reused": len(reused_files),
+        "pages": len(site["pages"]),
+        "pages_changed": sum(1 for page in site["pages"] if known_pages.get(page["url"]) != page["hash"]),
+        "site_summary_reused": site_reused,
+        "context_reused": context_reused,
+        "llm_calls": (
+            sum(entry["llm_calls"] for fingerprint, entry in files.items() if fingerprint not in known_files)
+            + site["llm_calls"]
+            + (0 if context_reused else 1)
+        ),
+        "llm_calls_saved": (
+            sum(files[fingerprint]["llm_calls"] for fingerprint in reused_files)
+            + (1 if site_reused else 0)
+            + (1 if context_reused else 0)
+        ),
+    }
     
     return {
         "business_id": business_id,
-        "context_prompt": context_prompt
-    }
\ No newline at end of file
+        "context_prompt": context_prompt,
+        "timings": timings,
+        "refresh": refresh
+    }
+
+async def _save(
+    business_id: str,
+    chunks: list[str],
+    embeddings: Optional[list[list[float]]],
+    knowledge_base: str,
+    context_prompt: str,
+    settings: dict,
+    sources: dict,
+    context_inputs_hash: str,
+    prompt_templates: dict
+):
+    from db.mongodb import save_business_data, save_knowledge_chunks
+    await save_knowledge_chunks(business_id, chunks, embeddings)
+    await save_business_data(business_id, knowledge_base, context_prompt, settings, sources, context_inputs_hash, prompt_templates)
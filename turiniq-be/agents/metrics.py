@@ -0,0 +1,151 @@
+import os
+import time
+from typing import Any, Optional
+
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+# Set PROMETHEUS_MULTIPROC_DIR when running several workers so /metrics
+# aggregates all of them
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+MONGO_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+QUEUE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+
+llm_latency = Histogram(
+    "turiniq_llm_call_seconds", "Gemini call latency by call site, excluding queueing",
+    ["call_site"], buckets=LATENCY_BUCKETS,
+)
+llm_queue_wait = Histogram(
+    "turiniq_llm_queue_wait_seconds", "Time spent waiting for an LLM concurrency slot",
+    ["call_site"], buckets=QUEUE_BUCKETS,
+)
+llm_calls = Counter("turiniq_llm_calls_total", "Gemini calls by call site and outcome", ["call_site", "outcome"])
+llm_tokens = Counter(
+    "turiniq_llm_tokens_total", "Gemini tokens by business and direction (in = prompt, out = reply, cached = prompt tokens served from a context cache)",
+    ["business_id", "direction"],
+)
+mongo_latency = Histogram(
+    "turiniq_mongo_command_seconds", "MongoDB command latency", ["command"], buckets=MONGO_BUCKETS,
+)
+mongo_failures = Counter("turiniq_mongo_command_failures_total", "Failed MongoDB commands", ["command"])
+active_sessions = Gauge("turiniq_active_sessions", "Open customer websocket sessions", multiprocess_mode="livesum")
+sessions_total = Counter("turiniq_sessions_total", "Customer websocket sessions opened")
+
+
+def record_llm_call(
+    call_site: str,
+    business_id: Optional[str],
+    started: float,
+    prompt_chars: int,
+    reply_chars: int,
+    usage: Any = None,
+    outcome: str = "ok"
+):
+    """Record latency, outcome and token counts of one model call.
+
+    Uses the response's usage metadata when present and ~4 characters per
+    token otherwise.
+    """
+    llm_latency.labels(call_site).observe(time.perf_counter() - started)
+    llm_calls.labels(call_site, outcome).inc()
+    tokens_in = getattr(usage, "prompt_token_count", None) or prompt_chars // 4
+    tokens_out = getattr(usage, "candidates_token_count", None) or reply_chars // 4
+    business = business_id or "none"
+    llm_tokens.labels(business, "in").inc(tokens_in)
+    llm_tokens.labels(business, "out").inc(tokens_out)
+    cached = getattr(usage, "cached_content_token_count", None)
+    if cached:
+        llm_tokens.labels(business, "cached").inc(cached)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding the Mongo latency histogram."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_latency.labels(event.command_name).observe(event.duration_micros / 1e6)
+        mongo_failures.labels(event.command_name).inc()
+
+
+class StatsCollector:
+    """Exposes the in-process /stats trackers (turn paths, caches) as metrics."""
+
+    def describe(self):
+        # Lets the registry learn the names without importing the agents yet
+        yield CounterMetricFamily("turiniq_support_turns", "Support turns by path", labels=["path"])
+        yield CounterMetricFamily("turiniq_cache_lookups", "Cache lookups by cache and result", labels=["cache", "result"])
+        yield GaugeMetricFamily("turiniq_business_cache_bytes", "Estimated size of the business cache")
+        yield CounterMetricFamily("turiniq_detail_llm_calls_avoided", "Field extraction model calls saved by local parsing")
+        yield CounterMetricFamily("turiniq_llm_resilience_events", "Model call retries, hedges and rejections", labels=["event"])
+        yield GaugeMetricFamily("turiniq_llm_breaker_open", "1 while the model circuit breaker rejects calls")
+        yield CounterMetricFamily("turiniq_identify_decisions", "First-message customer identifications by source", labels=["source"])
+        yield CounterMetricFamily("turiniq_ws_session_events", "Websocket sessions refused or closed by limits, and messages skipped or delayed", labels=["event"])
+
+    def collect(self):
+        from agents.customer_classifier import identify_stats
+        from agents.customer_details import detail_stats
+        from agents.resilience import breaker, resilience_stats
+        from agents.response_cache import response_cache
+        from agents.session_guard import session_stats
+        from agents.turn_pipeline import turn_stats
+        from db.mongodb import business_cache
+
+        turns = CounterMetricFamily("turiniq_support_turns", "Support turns by path", labels=["path"])
+        for path, count in turn_stats.turns.items():
+            turns.add_metric([path], count)
+        yield turns
+
+        cache = CounterMetricFamily("turiniq_cache_lookups", "Cache lookups by cache and result", labels=["cache", "result"])
+        for name, stats in (("response", response_cache.stats()), ("business", business_cache.stats())):
+            cache.add_metric([name, "hit"], stats["hits"])
+            cache.add_metric([name, "miss"], stats["misses"])
+        yield cache
+
+        size = GaugeMetricFamily("turiniq_business_cache_bytes", "Estimated size of the business cache")
+        size.add_metric([], business_cache.stats()["bytes"])
+        yield size
+
+        yield CounterMetricFamily(
+            "turiniq_detail_llm_calls_avoided", "Field extraction model calls saved by local parsing",
+            value=detail_stats.llm_calls_avoided,
+        )
+
+        events = CounterMetricFamily("turiniq_llm_resilience_events", "Model call retries, hedges and rejections", labels=["event"])
+        for event in ("retries", "retries_rejected", "hedges", "hedge_wins", "short_circuited", "deadline_exceeded"):
+            events.add_metric([event], getattr(resilience_stats, event))
+        yield events
+        yield GaugeMetricFamily(
+            "turiniq_llm_breaker_open", "1 while the model circuit breaker rejects calls", value=int(breaker.state == "open")
+        )
+
+        identify = CounterMetricFamily("turiniq_identify_decisions", "First-message customer identifications by source", labels=["source"])
+        for source, count in identify_stats.decisions.items():
+            identify.add_metric([source], count)
+        yield identify
+
+        sessions = CounterMetricFamily("turiniq_ws_session_events", "Websocket sessions refused or closed by limits, and messages skipped or delayed", labels=["event"])
+        for event, count in session_stats.events.items():
+            sessions.add_metric([event], count)
+        yield sessions
+
+
+if not MULTIPROCESS:
+    REGISTRY.register(StatsCollector())
+
+
+def render_metrics() -> bytes:
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Any, List, Optional
+
+from agents.conversation import Message, Role
+from agents.llm import generate
+from agents.session_store import Session
+
+logger = logging.getLogger(__name__)
+
+# Token budget for a whole turn prompt, estimated at ~4 characters per token
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_CONTEXT_MAX_TOKENS = int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "2500"))
+PROMPT_KNOWLEDGE_MAX_TOKENS = int(os.getenv("PROMPT_KNOWLEDGE_MAX_TOKENS", "1500"))
+# Recent messages kept verbatim; older ones are folded into the running summary
+# once HISTORY_SUMMARY_BATCH of them have fallen out of the window
+HISTORY_WINDOW_MESSAGES = int(os.getenv("HISTORY_WINDOW_MESSAGES", "12"))
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "8"))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "1200"))
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    max_chars = max(0, tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 3)].rstrip() + "..."
+
+def format_message(message: Message) -> str:
+    if message.role == Role.USER:
+        return f"Customer: {message.text}"
+    return f"Agent: {message.text or ''}"
+
+
+class ConversationMemory:
+    """Rolling window over a session's conversation plus a summary of older turns.
+
+    The summary and how far it reaches live on the session, so they are
+    checkpointed and survive a reconnect. Summaries are refreshed in the
+    background and never hold up a reply.
+    """
+
+    def __init__(self, session: Session, model: Any = None):
+        self.session = session
+        self.model = model
+        self._task: Optional[asyncio.Task] = None
+
+    def render(self, max_tokens: int) -> str:
+        """Summary and the newest messages that fit in `max_tokens`.
+
+        The last message is the one being answered and is left out, since
+        prompts carry it separately.
+        """
+        session = self.session
+        summary = f"Summary of earlier conversation: {session.history_summary}" if session.history_summary else ""
+        if estimate_tokens(summary) > max_tokens:
+            summary = ""
+        budget = max_tokens - estimate_tokens(summary)
+        lines = []
+        recent = session.conversation.since(session.summarized_upto, -1)
+        for entry in reversed(recent[-HISTORY_WINDOW_MESSAGES:]):
+            line = format_message(entry)
+            cost = estimate_tokens(line) + 1
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        return "\n".join(filter(None, [summary, *reversed(lines)]))
+
+    def digest(self) -> str:
+        """Identifies the history render() draws on; "" when there is none yet."""
+        session = self.session
+        recent = session.conversation.since(session.summarized_upto, -1)[-HISTORY_WINDOW_MESSAGES:]
+        if not recent and not session.history_summary:
+            return ""
+        text = "\n".join([session.history_summary, *map(format_message, recent)])
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def maybe_summarize(self):
+        """Start folding messages that left the window into the summary, if enough have."""
+        session = self.session
+        overflow = len(session.conversation) - session.summarized_upto - HISTORY_WINDOW_MESSAGES
+        if overflow < HISTORY_SUMMARY_BATCH or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._summarize(session.summarized_upto + overflow))
+
+    async def _summarize(self, upto: int):
+        session = self.session
+        evicted = "\n".join(format_message(entry) for entry in session.conversation.since(session.summarized_upto, upto))
+        prompt = f"""
+        You maintain a running summary of a customer conversation for a TurinIQ agent. Update the summary with the new messages. Keep facts the agent will need later: the customer's questions, order or account details, promises made and open issues. Return plain text under {HISTORY_SUMMARY_MAX_CHARS} characters.
+        Current summary: {session.history_summary or "(none)"}
+        New messages:
+        {evicted}
+        """
+        try:
+            response = await generate(prompt, session.business_id, self.model, call_site="history_summary")
+        except Exception as e:
+            # The window still bounds the prompt; the next batch retries
+            logger.warning("History summary failed for session %s: %s", session.session_id, e)
+            return
+        session.history_summary = response.text.strip()[:HISTORY_SUMMARY_MAX_CHARS]
+        session.summarized_upto = upto
+
+
+def fit_sections(
+    frame_tokens: int,
+    context: str,
+    snippets: List[str],
+    memory: Optional[ConversationMemory],
+    message: str,
+    budget: int = PROMPT_TOKEN_BUDGET
+) -> tuple[str, str, str]:
+    """Trim the variable parts of a turn prompt to the token budget.
+
+    `frame_tokens` is the size of the prompt's fixed wording. The message is
+    always kept; then, in priority order, the business context (capped at
+    PROMPT_CONTEXT_MAX_TOKENS), knowledge snippets best first (capped at
+    PROMPT_KNOWLEDGE_MAX_TOKENS) and the conversation history get what is
+    left. Returns (context, knowledge, history).
+    """
+    remaining = budget - frame_tokens - estimate_tokens(message)
+    context = truncate_tokens(context, min(PROMPT_CONTEXT_MAX_TOKENS, remaining))
+    remaining -= estimate_tokens(context)
+
+    kept, knowledge_budget = [], min(PROMPT_KNOWLEDGE_MAX_TOKENS, remaining)
+    for snippet in snippets:
+        cost = estimate_tokens(snippet) + 2
+        if cost > knowledge_budget:
+            break
+        kept.append(snippet)
+        knowledge_budget -= cost
+    knowledge = "\n---\n".join(kept)
+    remaining -= estimate_tokens(knowledge)
+
+    history = memory.render(remaining) if memory and remaining > 0 else ""
+    return context, knowledge, history
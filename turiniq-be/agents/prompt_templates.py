@@ -0,0 +1,70 @@
+import hashlib
+import json
+from functools import lru_cache
+from typing import Optional
+
+from agents.prompt_builder import PROMPT_CONTEXT_MAX_TOKENS, truncate_tokens
+from agents.turn_pipeline import (escalation_rules, sales_instructions,
+                                  support_instructions)
+
+# Bump when the instruction wording changes, so stored templates are rebuilt
+TEMPLATE_FORMAT = 1
+
+
+def compile_templates(context_prompt: str, settings: Optional[dict]) -> dict:
+    """Static instructions of the support and sales prompts for one business.
+
+    Built at /configure-agent and stored with the business record; turns
+    send them as the model's system instruction and only the knowledge,
+    history and message per call.
+    """
+    context = truncate_tokens(context_prompt, PROMPT_CONTEXT_MAX_TOKENS)
+    templates = {
+        "support": support_instructions(context, escalation_rules(settings)),
+        "sales": sales_instructions(context),
+    }
+    digest = hashlib.sha256(json.dumps([TEMPLATE_FORMAT, templates]).encode()).hexdigest()[:16]
+    return {"format": TEMPLATE_FORMAT, "version": digest, **templates}
+
+@lru_cache(maxsize=256)
+def _compile_cached(context_prompt: str, settings_json: str) -> dict:
+    return compile_templates(context_prompt, json.loads(settings_json))
+
+def instructions_for(business_data: dict, kind: str, default_context: str) -> str:
+    """The stored `kind` ("support" or "sales") instructions, compiled on the spot for
+    records configured before templates or with an older wording."""
+    stored = business_data.get("prompt_templates") or {}
+    if stored.get("format") == TEMPLATE_FORMAT and stored.get(kind):
+        return stored[kind]
+    settings_json = json.dumps(business_data.get("settings"), sort_keys=True)
+    return _compile_cached(business_data.get("context_prompt", default_context), settings_json)[kind]
+
+
+class TemplateStats:
+    """Prompt characters sent per turn, against resending the instructions in every prompt."""
+
+    def __init__(self):
+        self.turns = 0
+        self.turn_chars = 0
+        self.instruction_chars = 0
+        self.cached_turns = 0
+
+    def record(self, instructions: str, prompt: str, cached: bool):
+        self.turns += 1
+        self.turn_chars += len(prompt)
+        self.instruction_chars += len(instructions)
+        self.cached_turns += cached
+
+    def summary(self) -> dict:
+        if not self.turns:
+            return {"turns": 0}
+        return {
+            "turns": self.turns,
+            "prompt_chars_per_turn": round(self.turn_chars / self.turns),
+            "instruction_chars_per_turn": round(self.instruction_chars / self.turns),
+            "prompt_share_of_full": round(self.turn_chars / (self.turn_chars + self.instruction_chars), 3),
+            "context_cached_turns": self.cached_turns,
+        }
+
+
+template_stats = TemplateStats()
@@ -0,0 +1,306 @@
+import asyncio
+import contextvars
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+# Retries and hedges in flight across the process; beyond this calls fail instead
+MAX_CONCURRENT_RETRIES = int(os.getenv("LLM_MAX_CONCURRENT_RETRIES", "16"))
+CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "60"))
+# Time budget for all model calls made while answering one customer message
+TURN_DEADLINE_SECONDS = float(os.getenv("LLM_TURN_DEADLINE_SECONDS", "25"))
+# The breaker opens when, among the last BREAKER_WINDOW calls, at least
+# BREAKER_FAILURES failed and they make up BREAKER_FAILURE_RATIO of the window
+BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_FAILURE_RATIO = float(os.getenv("LLM_BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# Send a second identical request when the first is slower than this; 0 disables
+HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+HEDGE_CALL_SITES = set(filter(None, os.getenv("LLM_HEDGE_CALL_SITES", "identify,support,sales").split(",")))
+DEGRADED_REPLY = os.getenv(
+    "LLM_DEGRADED_REPLY", "Sorry, we're having trouble answering right now. Please try again in a few minutes."
+)
+
+# Provider errors worth retrying; anything else is raised straight away
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+)
+
+_turn_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_turn_deadline", default=None)
+
+
+class ProviderUnavailable(Exception):
+    """The model is failing or the turn ran out of time; answer with DEGRADED_REPLY."""
+
+
+class CircuitBreaker:
+    """Fails fast once most recent calls end in retryable errors.
+
+    Opens when at least `failures` of the last `window` outcomes are failures
+    and they make up `ratio` of the window. While open, calls are rejected
+    without reaching the provider. After `reset_seconds` one trial call is
+    let through; its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float, window: int = BREAKER_WINDOW, ratio: float = BREAKER_FAILURE_RATIO):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.ratio = ratio
+        self._outcomes = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self):
+        self._outcomes.append(False)
+        if self._trial:
+            self._outcomes.clear()
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self._outcomes.append(True)
+        failed = sum(self._outcomes)
+        if self._trial or (failed >= self.failures and failed >= self.ratio * len(self._outcomes)):
+            if self._opened_at is None:
+                self.times_opened += 1
+            self._opened_at = time.monotonic()
+        self._trial = False
+
+    def release(self):
+        """Forget an unfinished trial call, e.g. one cancelled by its caller."""
+        self._trial = False
+
+
+class ResilienceStats:
+    def __init__(self):
+        self.retries = 0
+        self.retries_rejected = 0
+        self.retries_in_flight = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.short_circuited = 0
+        self.deadline_exceeded = 0
+
+    def summary(self) -> dict:
+        return {
+            "breaker_state": breaker.state,
+            "breaker_opened": breaker.times_opened,
+            "retries": self.retries,
+            "retries_rejected": self.retries_rejected,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "short_circuited": self.short_circuited,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
+
+
+breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+resilience_stats = ResilienceStats()
+
+
+def start_turn(seconds: float = TURN_DEADLINE_SECONDS):
+    """Start the deadline shared by the model calls that answer one customer message.
+
+    The deadline lives in a context variable, so it applies to the calling
+    task (one websocket session) only. Calls outside a turn, such as
+    configuration jobs, are bounded per attempt only.
+    """
+    _turn_deadline.set(time.monotonic() + seconds)
+
+def _attempt_timeout() -> float:
+    deadline = _turn_deadline.get()
+    if deadline is None:
+        return CALL_TIMEOUT_SECONDS
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        resilience_stats.deadline_exceeded += 1
+        raise ProviderUnavailable("turn deadline exceeded")
+    return min(CALL_TIMEOUT_SECONDS, remaining)
+
+def _check_breaker():
+    if not breaker.allow():
+        resilience_stats.short_circuited += 1
+        raise ProviderUnavailable("circuit breaker open")
+
+def _take_retry_slot() -> bool:
+    if resilience_stats.retries_in_flight >= MAX_CONCURRENT_RETRIES:
+        resilience_stats.retries_rejected += 1
+        return False
+    resilience_stats.retries_in_flight += 1
+    return True
+
+def _release_retry_slot():
+    resilience_stats.retries_in_flight -= 1
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+
+async def _back_off(attempt: int, error: Exception):
+    """Wait before retry number `attempt` and take a retry slot for it.
+
+    Raises ProviderUnavailable instead when the attempts, the turn deadline
+    or the retry slots are used up.
+    """
+    if attempt >= RETRY_ATTEMPTS:
+        raise ProviderUnavailable(f"gave up after {attempt} attempts: {error!r}") from error
+    delay = backoff_delay(attempt)
+    deadline = _turn_deadline.get()
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        resilience_stats.deadline_exceeded += 1
+        raise ProviderUnavailable(f"no time left to retry: {error!r}") from error
+    if not _take_retry_slot():
+        raise ProviderUnavailable(f"too many retries in flight: {error!r}") from error
+    resilience_stats.retries += 1
+    try:
+        await asyncio.sleep(delay)
+    except BaseException:
+        _release_retry_slot()
+        raise
+
+async def _hedged(attempt: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+    """Start a second request if the first hasn't answered within HEDGE_AFTER_SECONDS."""
+    give_up_at = time.monotonic() + timeout
+    first = asyncio.ensure_future(attempt())
+    done, _ = await asyncio.wait({first}, timeout=min(HEDGE_AFTER_SECONDS, timeout))
+    if done or not _take_retry_slot():
+        return await asyncio.wait_for(first, max(0.0, give_up_at - time.monotonic()))
+    resilience_stats.hedges += 1
+    second = asyncio.ensure_future(attempt())
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, give_up_at - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        resilience_stats.hedge_wins += 1
+                    return task.result()
+            error = done.pop().exception()
+        raise error
+    finally:
+        _release_retry_slot()
+        for task in (first, second):
+            task.cancel()
+
+async def _attempt_once(attempt: Callable[[], Awaitable[Any]], hedge: bool) -> Any:
+    _check_breaker()
+    timeout = _attempt_timeout()
+    try:
+        result = await (_hedged(attempt, timeout) if hedge else asyncio.wait_for(attempt(), timeout))
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except RETRYABLE_ERRORS:
+        breaker.record_failure()
+        raise
+    except Exception:
+        # The provider answered; the request itself was bad
+        breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
+
+async def call_with_policy(attempt: Callable[[], Awaitable[Any]], call_site: str = "other") -> Any:
+    """Run one model request under the shared retry, deadline, breaker and hedging policy.
+
+    `attempt` makes a single request and is called again for each retry or
+    hedge. Raises ProviderUnavailable when no answer can be had in time.
+    """
+    hedge = HEDGE_AFTER_SECONDS > 0 and call_site in HEDGE_CALL_SITES
+    number = 0
+    while True:
+        if number:
+            await _back_off(number, error)
+        try:
+            return await _attempt_once(attempt, hedge)
+        except RETRYABLE_ERRORS as e:
+            error = e
+        finally:
+            if number:
+                _release_retry_slot()
+        number += 1
+
+async def stream_with_policy(open_stream: Callable[[], AsyncIterator[str]], call_site: str = "other") -> AsyncIterator[str]:
+    """Streaming counterpart of `call_with_policy`.
+
+    Only failures before the first chunk are retried; once text has reached
+    the customer an error is raised as is. The whole stream, not just its
+    first chunk, must finish within the attempt's time; a stream that stalls
+    after that counts as a failure and raises ProviderUnavailable.
+    """
+    number = 0
+    while True:
+        if number:
+            await _back_off(number, error)
+        try:
+            _check_breaker()
+            give_up_at = time.monotonic() + _attempt_timeout()
+            chunks = open_stream()
+            started = False
+            try:
+                while True:
+                    text = await asyncio.wait_for(chunks.__anext__(), max(0.0, give_up_at - time.monotonic()))
+                    started = True
+                    yield text
+            except StopAsyncIteration:
+                breaker.record_success()
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.release()
+                raise
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure()
+                if started and isinstance(e, asyncio.TimeoutError):
+                    resilience_stats.deadline_exceeded += 1
+                    raise ProviderUnavailable("stream stalled past its deadline") from e
+                if started:
+                    raise
+                error = e
+            except Exception:
+                breaker.record_success()
+                raise
+            finally:
+                await chunks.aclose()
+        finally:
+            if number:
+                _release_retry_slot()
+        number += 1
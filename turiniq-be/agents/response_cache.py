@@ -0,0 +1,130 @@
+import os
+import re
+from collections import OrderedDict
+from typing import Optional
+
+from agents.context_builder import CommunicationStyle
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(_PUNCTUATION_RE.sub(" ", message.lower()).split())
+
+
+class _Entry:
+    __slots__ = ("payload", "latency_ms", "tokens")
+
+    def __init__(self, payload: dict, latency_ms: float, tokens: frozenset):
+        self.payload = payload
+        self.latency_ms = latency_ms
+        self.tokens = tokens
+
+
+class ResponseCache:
+    """Per-business LRU cache of agent replies to repeated customer questions.
+
+    Holds up to `max_entries` replies for each of the `max_businesses` most
+    recently used businesses.
+
+    Entries are tied to the business record's version, which changes on every
+    /configure-agent, so answers from an old context or knowledge base are
+    never served. Turn prompts carry the conversation so far, so a reply is
+    only reused for the same `history` key (ConversationMemory.digest());
+    "yes" after one exchange is not "yes" after another.
+    """
+
+    def __init__(self, max_entries: int, similarity_threshold: float, enabled: bool = True, max_businesses: int = 1024):
+        self.max_entries = max_entries
+        self.max_businesses = max_businesses
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled
+        # business_id -> (version, entries keyed by (agent, history digest, normalized message)); most recently used last
+        self._businesses: "OrderedDict[str, tuple[Optional[int], OrderedDict[tuple[str, str, str], _Entry]]]" = OrderedDict()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    def enabled_for(self, settings: Optional[dict]) -> bool:
+        """Personalized replies depend on who is asking, so they are never shared."""
+        styles = (settings or {}).get("communication_style") or []
+        return self.enabled and CommunicationStyle.PERSONALIZE.value not in styles
+
+    def _entries(self, business_id: str, version: Optional[int], create: bool) -> "OrderedDict[tuple[str, str, str], _Entry]":
+        current = self._businesses.get(business_id)
+        if current is None or current[0] != version:
+            if not create:
+                # Lookups don't make room for a business that has nothing cached
+                return OrderedDict()
+            current = self._businesses[business_id] = (version, OrderedDict())
+        self._businesses.move_to_end(business_id)
+        while len(self._businesses) > self.max_businesses:
+            self._businesses.popitem(last=False)
+        return current[1]
+
+    def get(self, business_id: str, version: Optional[int], agent: str, message: str, history: str = "") -> Optional[dict]:
+        entries = self._entries(business_id, version, create=False)
+        key = (agent, history, normalize_message(message))
+        entry = entries.get(key)
+        if entry is None and self.similarity_threshold:
+            entry = self._most_similar(entries, key)
+            if entry is not None:
+                self.similar_hits += 1
+        if entry is None:
+            self.misses += 1
+            return None
+        if key in entries:
+            entries.move_to_end(key)
+        self.hits += 1
+        self.latency_saved_ms += entry.latency_ms
+        return entry.payload
+
+    def _most_similar(self, entries: "OrderedDict[tuple[str, str, str], _Entry]", key: tuple[str, str, str]) -> Optional[_Entry]:
+        tokens = frozenset(key[2].split())
+        best, best_score = None, self.similarity_threshold
+        for (agent, history, _), entry in entries.items():
+            if (agent, history) != key[:2] or not tokens or not entry.tokens:
+                continue
+            score = len(tokens & entry.tokens) / len(tokens | entry.tokens)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def put(
+        self,
+        business_id: str,
+        version: Optional[int],
+        agent: str,
+        message: str,
+        payload: dict,
+        latency_ms: float,
+        history: str = ""
+    ):
+        entries = self._entries(business_id, version, create=True)
+        key = (agent, history, normalize_message(message))
+        entries[key] = _Entry(payload, latency_ms, frozenset(key[2].split()))
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "businesses": len(self._businesses),
+            "entries": sum(len(entries) for _, entries in self._businesses.values()),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 2),
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256")),
+    # Jaccard similarity of normalized words; 0 means exact matches only
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0")),
+    enabled=os.getenv("RESPONSE_CACHE", "1") == "1",
+    max_businesses=int(os.getenv("RESPONSE_CACHE_MAX_BUSINESSES", "1024")),
+)
@@ -0,0 +1,166 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CHARS = int(os.getenv("KB_CHUNK_CHARS", "800"))
+CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "100"))
+TOP_K = int(os.getenv("KB_TOP_K", "4"))
+INDEX_CACHE_SIZE = int(os.getenv("KB_INDEX_CACHE_SIZE", "128"))
+# Indexes with more chunks than this are searched in a thread, off the event loop
+INLINE_SEARCH_MAX_CHUNKS = int(os.getenv("KB_INLINE_SEARCH_MAX_CHUNKS", "200"))
+# Optional dense retrieval; adds an embedding call per turn
+USE_EMBEDDINGS = os.getenv("KB_EMBEDDINGS") == "1"
+EMBEDDING_MODEL = os.getenv("KB_EMBEDDING_MODEL", "models/text-embedding-004")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its me my "
+    "of on or our so that the their them there these this to us was we what when where which "
+    "who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into paragraph-aligned chunks of at most max_chars characters."""
+    if not 0 <= overlap < max_chars:
+        raise ValueError(f"chunk overlap must be at least 0 and less than {max_chars} characters, got {overlap}")
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+        while len(current) > max_chars:
+            chunks.append(current[:max_chars])
+            current = current[max_chars - overlap:] if overlap else current[max_chars:]
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of the chunks."""
+
+    def __init__(self, chunks: List[str], embeddings: Optional[List[List[float]]] = None, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query: str, k: int = TOP_K) -> List[int]:
+        """Return the ids of the k best matching chunks, best first."""
+        scores: Dict[int, float] = {}
+        n = len(self.chunks)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores, key=scores.get)
+
+    def search_dense(self, query_embedding: List[float], k: int = TOP_K) -> List[int]:
+        if not self.embeddings:
+            return []
+        query_norm = math.sqrt(sum(x * x for x in query_embedding)) or 1.0
+
+        def cosine(doc_id: int) -> float:
+            vector = self.embeddings[doc_id]
+            dot = sum(a * b for a, b in zip(query_embedding, vector))
+            return dot / (query_norm * (math.sqrt(sum(x * x for x in vector)) or 1.0))
+
+        return heapq.nlargest(k, range(len(self.embeddings)), key=cosine)
+
+
+def fuse_rankings(rankings: List[List[int]], k: int, constant: int = 60) -> List[int]:
+    """Reciprocal rank fusion of several best-first id lists."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (constant + rank + 1)
+    return heapq.nlargest(k, scores, key=scores.get)
+
+async def embed_texts(texts: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
+    embeddings = []
+    for start in range(0, len(texts), 100):  # API batch limit
+        result = await asyncio.to_thread(
+            genai.embed_content, model=EMBEDDING_MODEL, content=texts[start:start + 100], task_type=task_type
+        )
+        embeddings.extend(result["embedding"])
+    return embeddings
+
+
+# business_id -> (knowledge version, index); most recently used last
+_indexes: "OrderedDict[str, tuple[Optional[int], BM25Index]]" = OrderedDict()
+
+async def get_index(business_id: str, version: Optional[int]) -> BM25Index:
+    """Return the business's index, loading chunks from Mongo when the version changes.
+
+    Businesses configured before knowledge bases were chunked have no chunks;
+    their stored knowledge base is chunked and saved on first use.
+    """
+    cached = _indexes.get(business_id)
+    if cached and cached[0] == version:
+        _indexes.move_to_end(business_id)
+        return cached[1]
+    from db.mongodb import backfill_knowledge_chunks, get_knowledge_base, get_knowledge_chunks
+    docs = await get_knowledge_chunks(business_id)
+    if not docs:
+        chunks = chunk_text(await get_knowledge_base(business_id))
+        if chunks:
+            await backfill_knowledge_chunks(business_id, chunks)
+            logger.info("Backfilled %d knowledge chunks for %s", len(chunks), business_id)
+        docs = [{"text": chunk} for chunk in chunks]
+    chunks = [doc["text"] for doc in docs]
+    embeddings = [doc["embedding"] for doc in docs] if docs and all(doc.get("embedding") for doc in docs) else None
+    index = await asyncio.to_thread(BM25Index, chunks, embeddings)
+    _indexes[business_id] = (version, index)
+    while len(_indexes) > INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index
+
+async def _run_search(index: BM25Index, search, *args) -> List[int]:
+    if len(index.chunks) > INLINE_SEARCH_MAX_CHUNKS:
+        return await asyncio.to_thread(search, *args)
+    return search(*args)
+
+async def search_index(index: BM25Index, query: str, k: int = TOP_K) -> List[str]:
+    ranking = await _run_search(index, index.search, query, k * 4 if index.embeddings else k)
+    if index.embeddings and USE_EMBEDDINGS:
+        query_embedding = (await embed_texts([query], task_type="retrieval_query"))[0]
+        ranking = fuse_rankings([ranking, await _run_search(index, index.search_dense, query_embedding, k * 4)], k)
+    return [index.chunks[doc_id] for doc_id in ranking[:k]]
+
+async def retrieve_snippets(business_id: str, version: Optional[int], query: str, k: int = TOP_K) -> List[str]:
+    """Top-k knowledge base chunks relevant to the query, best first."""
+    index = await get_index(business_id, version)
+    return await search_index(index, query, k)
+
+async def retrieve_context(business_id: str, version: Optional[int], query: str, k: int = TOP_K) -> str:
+    """Top-k knowledge base chunks relevant to the query, joined for a prompt."""
+    return "\n---\n".join(await retrieve_snippets(business_id, version, query, k))
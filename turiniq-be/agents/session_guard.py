@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+# A session is closed after this long without a customer message, and in any
+# case after WS_MAX_SESSION_SECONDS; the conversation is checkpointed, so the
+# customer can resume it by reconnecting with ?session_id=
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "600"))
+WS_MAX_SESSION_SECONDS = float(os.getenv("WS_MAX_SESSION_SECONDS", "7200"))
+WS_MAX_MESSAGE_CHARS = int(os.getenv("WS_MAX_MESSAGE_CHARS", "4000"))
+# Concurrent sessions per worker process, overall and per business
+WS_MAX_SESSIONS = int(os.getenv("WS_MAX_SESSIONS", "2000"))
+WS_MAX_SESSIONS_PER_BUSINESS = int(os.getenv("WS_MAX_SESSIONS_PER_BUSINESS", "500"))
+# Token bucket on incoming messages: sustained rate and burst. A message over
+# the limit is held back if a token frees up within WS_RATE_MAX_DELAY_SECONDS,
+# otherwise dropped (keep it under 1 / rate, or nothing is ever dropped)
+WS_RATE_PER_SECOND = float(os.getenv("WS_RATE_PER_SECOND", "1"))
+WS_RATE_BURST = int(os.getenv("WS_RATE_BURST", "5"))
+WS_RATE_MAX_DELAY_SECONDS = float(os.getenv("WS_RATE_MAX_DELAY_SECONDS", "0.5"))
+# Protocol-level heartbeat and frame limit, applied by the server (main.py, uvicorn_worker.py)
+WS_PING_INTERVAL_SECONDS = float(os.getenv("WS_PING_INTERVAL_SECONDS", "20"))
+WS_PING_TIMEOUT_SECONDS = float(os.getenv("WS_PING_TIMEOUT_SECONDS", "20"))
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", str(64 * 1024)))
+
+# Close codes the chat client acts on: 1013 means retry later, 4000/4001 mean
+# wait until the customer writes again
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_IDLE = 4000
+CLOSE_SESSION_EXPIRED = 4001
+
+BUSY_REPLY = "We're helping a lot of customers right now. Please try again in a minute."
+TOO_LONG_REPLY = f"That message is too long. Please keep it under {WS_MAX_MESSAGE_CHARS} characters."
+TOO_FAST_REPLY = "You're sending messages faster than we can answer. Please wait a moment."
+
+
+class TokenBucket:
+    def __init__(self, rate: float = WS_RATE_PER_SECOND, burst: int = WS_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token; returns how long to wait for it, or None if that exceeds `max_wait`."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+class SessionStats:
+    def __init__(self):
+        self.events = Counter()
+
+    def summary(self, limits: "SessionLimits") -> dict:
+        return {
+            "active": limits.active,
+            "active_by_business": dict(limits.by_business.most_common(10)),
+            "events": dict(self.events),
+        }
+
+
+session_stats = SessionStats()
+
+
+class SessionLimits:
+    """Concurrent websocket sessions in this process, overall and per business."""
+
+    def __init__(self, max_sessions: int = WS_MAX_SESSIONS, max_per_business: int = WS_MAX_SESSIONS_PER_BUSINESS):
+        self.max_sessions = max_sessions
+        self.max_per_business = max_per_business
+        self.active = 0
+        self.by_business = Counter()
+
+    def acquire(self, business_id: str) -> Optional[str]:
+        """Claim a slot; returns the reason for refusing, or None."""
+        if self.active >= self.max_sessions:
+            return "rejected_global"
+        if self.by_business[business_id] >= self.max_per_business:
+            return "rejected_business"
+        self.active += 1
+        self.by_business[business_id] += 1
+        return None
+
+    def release(self, business_id: str):
+        self.active -= 1
+        self.by_business[business_id] -= 1
+        if self.by_business[business_id] <= 0:
+            del self.by_business[business_id]
+
+
+session_limits = SessionLimits()
+
+
+class GuardedWebSocket:
+    """The customer websocket with session limits applied to every receive_text().
+
+    Waiting for a message is bounded by the idle timeout and the remaining
+    session time; when either runs out the socket is closed and the agent
+    sees a WebSocketDisconnect, as if the customer had left. Oversized
+    messages are answered with a notice and skipped. Messages over the rate
+    limit are held back briefly, which also stops reading the socket and so
+    pushes back on the client, or skipped with one notice per flood, so
+    spam never reaches the model. Everything else is delegated to the
+    wrapped WebSocket.
+    """
+
+    def __init__(self, websocket: WebSocket, business_id: str):
+        self.websocket = websocket
+        self.business_id = business_id
+        self.expires_at = time.monotonic() + WS_MAX_SESSION_SECONDS
+        self.bucket = TokenBucket()
+        self.throttled = False
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
+
+    async def _close(self, code: int, event: str):
+        session_stats.events[event] += 1
+        logger.info("Closing session for %s: %s", self.business_id, event)
+        try:
+            await self.websocket.close(code=code, reason=event)
+        except Exception:
+            pass  # already gone
+        raise WebSocketDisconnect(code)
+
+    async def receive_text(self) -> str:
+        while True:
+            remaining = self.expires_at - time.monotonic()
+            if remaining <= 0:
+                await self._close(CLOSE_SESSION_EXPIRED, "expired")
+            try:
+                message = await asyncio.wait_for(self.websocket.receive_text(), min(WS_IDLE_TIMEOUT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                if self.expires_at <= time.monotonic():
+                    await self._close(CLOSE_SESSION_EXPIRED, "expired")
+                await self._close(CLOSE_IDLE, "idle_closed")
+
+            if len(message) > WS_MAX_MESSAGE_CHARS:
+                session_stats.events["oversized"] += 1
+                await self.websocket.send_text(TOO_LONG_REPLY)
+                continue
+            wait = self.bucket.reserve(WS_RATE_MAX_DELAY_SECONDS)
+            if wait is None:
+                session_stats.events["rate_limited"] += 1
+                if not self.throttled:
+                    self.throttled = True
+                    await self.websocket.send_text(TOO_FAST_REPLY)
+                continue
+            self.throttled = False
+            if wait:
+                session_stats.events["rate_delayed"] += 1
+                await asyncio.sleep(wait)
+            return message
+
+
+async def reject(websocket: WebSocket, reason: str):
+    """Turn away a connection over the session limits with a notice the chat can show."""
+    session_stats.events[reason] += 1
+    await websocket.send_text(BUSY_REPLY)
+    await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=reason)
@@ -0,0 +1,231 @@
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from agents.conversation import ConversationLog, Message
+
+# "memory" keeps sessions in this process; "mongo" lets any worker resume them
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+SESSION_MAX_IN_MEMORY = int(os.getenv("SESSION_MAX_IN_MEMORY", "10000"))
+# Messages the in-memory store keeps per session; older ones are forgotten once
+# the session no longer needs them, so tickets from long chats start later
+SESSION_MAX_STORED_MESSAGES = int(os.getenv("SESSION_MAX_STORED_MESSAGES", "200"))
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def valid_session_id(session_id: Optional[str]) -> bool:
+    return bool(session_id and _SESSION_ID_RE.match(session_id))
+
+def droppable(fields: Dict[str, Any], saved: int) -> int:
+    """Messages before this index are saved, summarized and, for sales, on the lead."""
+    upto = min(saved, fields.get("summarized_upto", 0))
+    return min(upto, fields.get("lead_persisted", 0)) if fields.get("agent") == "sales" else upto
+
+
+class InMemorySessionStore:
+    """Sessions held in this process, dropped after SESSION_TTL_SECONDS idle.
+
+    Only usable for resuming when every reconnect reaches the same worker.
+    Messages are kept as the session's own Message records, not copies, and
+    at most `max_messages` of them per session beyond what the session still
+    needs; `conversation_offset` counts the ones forgotten.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = SESSION_MAX_IN_MEMORY,
+        ttl_seconds: int = SESSION_TTL_SECONDS,
+        max_messages: int = SESSION_MAX_STORED_MESSAGES
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        entry = self._sessions.get(session_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            self._sessions.pop(session_id, None)
+            return None
+        data = entry[1]
+        return {**data, "customer_info": dict(data["customer_info"]), "conversation": list(data["conversation"])}
+
+    async def create(self, data: dict):
+        data = {**data, "customer_info": dict(data["customer_info"]), "conversation": list(data["conversation"])}
+        self._sessions[data["session_id"]] = (time.monotonic(), data)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def append(self, session_id: str, messages: List[Message], fields: Dict[str, Any], end: int):
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return
+        data = entry[1]
+        data.update(fields, customer_info=dict(fields.get("customer_info") or data["customer_info"]))
+        conversation, offset = data["conversation"], data.get("conversation_offset", 0)
+        conversation.extend(messages)
+        cut = min(droppable(data, end), end - self.max_messages) - offset
+        if cut > 0:
+            del conversation[:cut]
+            data["conversation_offset"] = offset + cut
+        self._sessions[session_id] = (time.monotonic(), data)
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def ensure_indexes(self):
+        pass
+
+
+class MongoSessionStore:
+    """Sessions in the `sessions` collection, expired by a TTL index on updated_at.
+
+    Like the in-memory store, a document keeps at most `max_messages`
+    messages beyond what the session still needs, so long chats stay far
+    below the BSON document limit; `conversation_offset` counts the ones
+    dropped.
+    """
+
+    collection_name = "sessions"
+
+    def __init__(self, max_messages: int = SESSION_MAX_STORED_MESSAGES):
+        self.max_messages = max_messages
+
+    def _collection(self):
+        from db.mongodb import get_async_db
+        return get_async_db()[self.collection_name]
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        data = await self._collection().find_one({"session_id": session_id}, {"_id": 0})
+        if data is not None:
+            data["conversation"] = [Message.from_dict(entry) for entry in data.get("conversation") or []]
+        return data
+
+    async def create(self, data: dict):
+        data = {**data, "conversation": [message.to_dict() for message in data["conversation"]]}
+        await self._collection().update_one(
+            {"session_id": data["session_id"]},
+            {"$set": {**data, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def append(self, session_id: str, messages: List[Message], fields: Dict[str, Any], end: int):
+        keep = end - max(0, min(droppable(fields, end), end - self.max_messages))
+        await self._collection().update_one(
+            {"session_id": session_id},
+            {
+                "$set": {**fields, "updated_at": datetime.utcnow()},
+                "$push": {"conversation": {"$each": [message.to_dict() for message in messages], "$slice": -keep}},
+                "$max": {"conversation_offset": end - keep},
+            }
+        )
+
+    async def delete(self, session_id: str):
+        await self._collection().delete_one({"session_id": session_id})
+
+    async def ensure_indexes(self):
+        collection = self._collection()
+        await collection.create_index("session_id", unique=True)
+        await collection.create_index("updated_at", expireAfterSeconds=SESSION_TTL_SECONDS)
+
+
+class Session:
+    """Conversation state of one chat, checkpointed to a session store.
+
+    `conversation` and `customer_info` are mutated in place by the agents;
+    checkpoint() hands the store the messages added since the last
+    checkpoint; they are converted to dicts only by a store that writes
+    them out. Once written, messages that are also summarized and, for
+    sales, on the lead are dropped from memory beyond the conversation's
+    window; transcript() reads them back from the store.
+    """
+
+    def __init__(self, store, data: dict, resumed: bool = False):
+        self.store = store
+        self.session_id: str = data["session_id"]
+        self.business_id: str = data["business_id"]
+        self.agent: Optional[str] = data.get("agent")
+        self.customer_info: Dict[str, Any] = data.get("customer_info") or {}
+        self.conversation = ConversationLog(data.get("conversation") or [], offset=data.get("conversation_offset", 0))
+        self.lead_persisted: int = data.get("lead_persisted", 0)
+        # Running summary of conversation[:summarized_upto], kept for the prompt
+        self.history_summary: str = data.get("history_summary") or ""
+        self.summarized_upto: int = data.get("summarized_upto", 0)
+        self.resumed = resumed
+        self._saved = len(self.conversation)
+        self.conversation.trim(self._droppable())
+
+    def _fields(self) -> dict:
+        return {
+            "agent": self.agent,
+            "customer_info": self.customer_info,
+            "lead_persisted": self.lead_persisted,
+            "history_summary": self.history_summary,
+            "summarized_upto": self.summarized_upto,
+        }
+
+    def _droppable(self) -> int:
+        return droppable(self._fields(), self._saved)
+
+    async def checkpoint(self):
+        messages = self.conversation.since(self._saved)
+        await self.store.append(self.session_id, messages, self._fields(), self._saved + len(messages))
+        self._saved += len(messages)
+        self.conversation.trim(self._droppable())
+
+    async def transcript(self) -> List[dict]:
+        """The conversation in its stored shape, back to the oldest message the store kept."""
+        earlier = []
+        if self.conversation.offset:
+            data = await self.store.load(self.session_id) or {}
+            stored_from = data.get("conversation_offset", 0)
+            stored = (data.get("conversation") or [])[:max(0, self.conversation.offset - stored_from)]
+            earlier = [message.to_dict() for message in stored]
+        return earlier + self.conversation.to_dicts()
+
+    async def close(self):
+        await self.store.delete(self.session_id)
+
+
+_store = None
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        _store = MongoSessionStore() if SESSION_STORE == "mongo" else InMemorySessionStore()
+    return _store
+
+def set_session_store(store):
+    """Replace the process-wide store, e.g. in load tests."""
+    global _store
+    _store = store
+
+async def open_session(business_id: str, session_id: Optional[str] = None) -> Session:
+    """Resume `session_id` for this business if it exists, otherwise start a new session.
+
+    Clients may pick their own id; an unknown or malformed one starts a new session.
+    """
+    store = get_session_store()
+    data = await store.load(session_id) if valid_session_id(session_id) else None
+    if data is not None and data.get("business_id") == business_id:
+        return Session(store, data, resumed=True)
+    if data is not None or not valid_session_id(session_id):
+        session_id = uuid.uuid4().hex
+    data = {
+        "session_id": session_id,
+        "business_id": business_id,
+        "agent": None,
+        "customer_info": {},
+        "conversation": [],
+        "lead_persisted": 0,
+        "history_summary": "",
+        "summarized_upto": 0,
+    }
+    await store.create(data)
+    return Session(store, data)
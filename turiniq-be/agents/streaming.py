@@ -0,0 +1,143 @@
+import itertools
+import json
+import re
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import WebSocket
+
+# Framed messages sent while a reply streams in:
+#   {"type": "start", "id": n}
+#   {"type": "chunk", "id": n, "text": "..."}
+#   {"type": "end", "id": n, "text": "<full reply>", "ttfb_ms": float}
+_frame_ids = itertools.count(1)
+
+
+class LatencyTracker:
+    """Keeps the most recent samples (in ms) and reports percentiles."""
+
+    def __init__(self, size: int = 1000):
+        self._samples = deque(maxlen=size)
+
+    def record(self, value_ms: float):
+        self._samples.append(value_ms)
+
+    def summary(self) -> dict:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+        pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 2)
+        return {"count": len(samples), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": round(samples[-1], 2)}
+
+
+# Time from receiving the user's message to the first byte of the reply
+ttfb = {"stream": LatencyTracker(), "full": LatencyTracker()}
+
+
+_HIGH_SURROGATE_RE = re.compile(r"\\u[dD][89abAB][0-9a-fA-F]{2}")
+_LOW_SURROGATE_RE = re.compile(r"\\u[dD][c-fC-F][0-9a-fA-F]{2}")
+_LOW_SURROGATE_PREFIX_RE = re.compile(r"(\\(u([dD]([c-fC-F][0-9a-fA-F]{0,2})?)?)?)?")
+_LONE_SURROGATE_RE = re.compile("[\ud800-\udfff]")
+
+
+class JsonFieldStream:
+    """Incrementally decodes one string field of a JSON object as it streams in.
+
+    Used for the sales agent, whose model output is `{"response": ..., "reason": ...}`,
+    so the `response` text can be forwarded before the object is complete.
+    """
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._pos: Optional[int] = None
+        self.text = ""
+        self.value = ""
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """Add raw model output and return the newly decoded part of the field."""
+        self.text += chunk
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = self._key.search(self.text)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buf, i, decoded = self.text, self._pos, []
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch == "\\":
+                width = 6 if buf[i + 1:i + 2] == "u" else 2
+                if i + width > len(buf):
+                    break  # escape split across chunks; wait for the rest
+                if _HIGH_SURROGATE_RE.fullmatch(buf, i, i + 6):
+                    # Non-BMP characters are escaped as a surrogate pair; decode both halves together
+                    low = buf[i + 6:i + 12]
+                    if len(low) < 6 and _LOW_SURROGATE_PREFIX_RE.fullmatch(low):
+                        break  # the low half hasn't arrived yet
+                    if _LOW_SURROGATE_RE.fullmatch(low):
+                        width = 12
+                try:
+                    text = json.loads(f'"{buf[i:i + width]}"')
+                except json.JSONDecodeError:
+                    text = buf[i + 1:i + width]
+                # A half pair can't be sent or stored as UTF-8
+                decoded.append(_LONE_SURROGATE_RE.sub("\ufffd", text))
+                i += width
+                continue
+            decoded.append(ch)
+            i += 1
+        self._pos = i
+        new_text = "".join(decoded)
+        self.value += new_text
+        return new_text
+
+
+async def stream_reply(
+    websocket: WebSocket,
+    chunks: AsyncIterator[str],
+    received_at: float,
+    field: Optional[str] = None,
+    fallback: Optional[Callable[[], Optional[str]]] = None
+) -> tuple[str, str]:
+    """Forward model chunks to the websocket as framed messages.
+
+    When `field` is given the model output is JSON and only that field is
+    forwarded. If nothing was forwarded once the model is done, the text
+    `fallback()` returns, if any, is sent as the reply's only chunk.
+    Returns (forwarded text, raw model output).
+    """
+    frame_id = next(_frame_ids)
+    extractor = JsonFieldStream(field) if field else None
+    raw, forwarded, first_byte_ms = [], [], None
+    await websocket.send_text(json.dumps({"type": "start", "id": frame_id}))
+    try:
+        async for chunk in chunks:
+            raw.append(chunk)
+            text = extractor.feed(chunk) if extractor else chunk
+            if not text:
+                continue
+            if first_byte_ms is None:
+                first_byte_ms = (time.perf_counter() - received_at) * 1000
+                ttfb["stream"].record(first_byte_ms)
+            forwarded.append(text)
+            await websocket.send_text(json.dumps({"type": "chunk", "id": frame_id, "text": text}))
+        text = fallback() if fallback and not "".join(forwarded).strip() else None
+        if text:
+            forwarded = [text]
+            await websocket.send_text(json.dumps({"type": "chunk", "id": frame_id, "text": text}))
+    finally:
+        await websocket.send_text(json.dumps({
+            "type": "end",
+            "id": frame_id,
+            "text": "".join(forwarded),
+            "ttfb_ms": round(first_byte_ms, 2) if first_byte_ms is not None else None,
+        }))
+    return "".join(forwarded), "".join(raw)
@@ -0,0 +1,113 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+from agents.context_builder import HandoverEscalation
+
+# Local rules for the escalation choices a business can pick at /configure-agent.
+# A match escalates the turn without asking the model.
+ESCALATION_RULES = {
+    HandoverEscalation.ESCALATE_REFUNDS.value: (
+        r"\b(refund\w*|money back|charge ?back|reimburs\w*)\b",
+        "Refund request escalation",
+    ),
+    HandoverEscalation.ESCALATE_FRUSTRATED.value: (
+        r"\b(urgent\w*|asap|emergency|furious|unacceptable|ridiculous|(speak|talk) to (a |an )?(human|person|manager|agent)|real person)\b",
+        "Frustrated or urgent customer",
+    ),
+    HandoverEscalation.ESCALATE_MEDICAL.value: (
+        r"\b(diagnos\w*|prescri\w*|dosage|symptom\w*|medication|side effects?)\b",
+        "Medical advice request",
+    ),
+    HandoverEscalation.ESCALATE_EMAIL_CHANGE.value: (
+        r"\b(change|update|switch)\b.{0,30}\be-?mail\b",
+        "Email change request",
+    ),
+}
+# Records saved before escalation settings were stored keep the old refund rule
+DEFAULT_ESCALATIONS = (HandoverEscalation.ESCALATE_REFUNDS.value,)
+
+
+class EscalationRules:
+    def __init__(self, choices: tuple[str, ...], custom: Optional[str]):
+        self.patterns = [
+            (re.compile(ESCALATION_RULES[choice][0], re.IGNORECASE), ESCALATION_RULES[choice][1])
+            for choice in choices if choice in ESCALATION_RULES
+        ]
+        self.description = "; ".join(choices) + (f" - {custom}" if custom else "")
+
+    def match(self, message: str) -> Optional[str]:
+        """Return the escalation reason if a local rule matches the message."""
+        for pattern, reason in self.patterns:
+            if pattern.search(message):
+                return reason
+        return None
+
+
+@lru_cache(maxsize=1024)
+def _compile_rules(choices: tuple[str, ...], custom: Optional[str]) -> EscalationRules:
+    return EscalationRules(choices, custom)
+
+def escalation_rules(settings: Optional[dict]) -> EscalationRules:
+    settings = settings or {}
+    choices = tuple(settings.get("handover_escalation") or DEFAULT_ESCALATIONS)
+    return _compile_rules(choices, settings.get("handover_escalation_custom"))
+
+def support_instructions(context_prompt: str, rules: EscalationRules) -> str:
+    """The part of the support prompt that is the same on every turn of a business."""
+    return f"""
+            You are a TurinIQ support agent. Decide whether the customer's message requires escalation to a human, and if it does not, respond to it.
+            Context: {context_prompt}
+            Escalation rules: {rules.description}
+            Return JSON with the keys in this order: {{"escalate": bool, "reason": str, "response": str}}
+            Leave "response" empty when escalating.
+            """
+
+def sales_instructions(context_prompt: str) -> str:
+    return f"""
+            You are a TurinIQ sales agent. Respond to the potential customer's message to answer their queries and encourage engagement.
+            Context: {context_prompt}
+            Return JSON: {{"response": str, "reason": str}}
+            """
+
+def turn_input(knowledge: str, message: str, history: str = "") -> str:
+    """The per-turn part of a support or sales prompt."""
+    return f"""
+            Knowledge Base: {knowledge}
+            Conversation so far: {history or "(none)"}
+            Message: {message}
+            """
+
+def build_turn_prompt(context_prompt: str, rules: EscalationRules, knowledge: str, message: str, history: str = "") -> str:
+    """One prompt that both decides on escalation and writes the reply."""
+    return support_instructions(context_prompt, rules) + turn_input(knowledge, message, history)
+
+
+class TurnStats:
+    """Counts support turns by path and the model calls each path saved.
+
+    The previous pipeline made two calls per turn: an escalation check and a reply.
+    """
+
+    CALLS_BEFORE = 2
+
+    def __init__(self):
+        self.turns = {"prefilter": 0, "cached": 0, "combined": 0}
+        self.llm_calls = 0
+
+    def record(self, path: str, llm_calls: int):
+        self.turns[path] += 1
+        self.llm_calls += llm_calls
+
+    def summary(self) -> dict:
+        total = sum(self.turns.values())
+        saved = total * self.CALLS_BEFORE - self.llm_calls
+        return {
+            "turns": dict(self.turns),
+            "llm_calls": self.llm_calls,
+            "llm_calls_saved": saved,
+            "llm_calls_per_turn": round(self.llm_calls / total, 3) if total else 0.0,
+        }
+
+
+turn_stats = TurnStats()
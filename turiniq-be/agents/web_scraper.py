@@ -1,26 +1,54 @@
+import hashlib
+import logging
+import os
+from typing import Optional
+
 import google.generativeai as genai
-import requests
-from bs4 import BeautifulSoup
 
+from agents.crawler import crawl_site
+from agents.llm import generate
 
-async def scrape_website(domain: str, model: genai.GenerativeModel) -> str:
-    """Scrapes the website using Gemini API to summarize content."""
+logger = logging.getLogger(__name__)
+
+# Page text sent to the summarizer, per page and in total
+SCRAPE_PAGE_CHARS = int(os.getenv("SCRAPE_PAGE_CHARS", "4000"))
+SCRAPE_MAX_CHARS = int(os.getenv("SCRAPE_MAX_CHARS", "60000"))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+async def scrape_site(domain: str, model: genai.GenerativeModel, known: Optional[dict] = None) -> dict:
+    """Crawls the website and uses Gemini API to summarize its content.
+
+    Returns {"summary", "fingerprint", "pages", "llm_calls"}, where `pages` lists
+    each page's URL and content hash. When the fingerprint over all pages
+    matches `known` (an earlier result), its summary is reused without a model call.
+    """
     try:
-        response = requests.get(domain, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # Extract raw content
+        pages, stats = await crawl_site(domain)
+        logger.info("Crawled %s: %d pages, %s", domain, len(pages), stats)
+        page_hashes = [{"url": page.url, "hash": _sha256(f"{page.title}\n{page.text}")} for page in pages]
+        fingerprint = _sha256("\n".join(f"{page['url']} {page['hash']}" for page in page_hashes))
+        if known and known.get("fingerprint") == fingerprint:
+            return {"summary": known["summary"], "fingerprint": fingerprint, "pages": page_hashes, "llm_calls": 0}
+
+        # Extract raw content, shallow pages first, within the size budget
         raw_content = f"Website: {domain}\n"
-        for link in soup.find_all("a", href=True):
-            title = link.get_text().strip() or "No title"
-            href = link["href"]
-            raw_content += f"Page: {title} - URL: {href}\n"
-        
+        for page in pages:
+            entry = f"Page: {page.title or 'No title'} - URL: {page.url}\n{page.text[:SCRAPE_PAGE_CHARS]}\n"
+            if len(raw_content) + len(entry) > SCRAPE_MAX_CHARS:
+                break
+            raw_content += entry
+
         # Use Gemini to summarize
         prompt = """
         You are a web scraping agent for TurinIQ. Summarize the website content to include the sitemap, products, services, and other relevant business details. Return the summary as a plain text string.
         """
-        response = model.generate_content(f"{prompt}\n\nRaw Content:\n{raw_content}")
-        return response.text.strip()
+        response = await generate(f"{prompt}\n\nRaw Content:\n{raw_content}", model=model, call_site="scrape_summary")
+        return {"summary": response.text.strip(), "fingerprint": fingerprint, "pages": page_hashes, "llm_calls": 1}
     except Exception as e:
-        return f"Error scraping {domain}: {str(e)}"
\ No newline at end of file
+        return {"summary": f"Error scraping {domain}: {str(e)}", "fingerprint": None, "pages": [], "llm_calls": 0}
+
+async def scrape_website(domain: str, model: genai.GenerativeModel) -> str:
+    return (await scrape_site(domain, model))["summary"]
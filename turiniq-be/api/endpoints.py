@@ -1,12 +1,15 @@
 # endpoints.py
+import json
+from datetime import datetime
 from enum import Enum
 from typing import List, Optional
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile, WebSocket
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile, WebSocket
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-from db.mongodb import get_mongo_client
+from db.mongodb import find_records_page, iter_records
 
 router = APIRouter()  # Use APIRouter instead of FastAPI
 
@@ -124,17 +127,38 @@ async def configure_agent(
             custom_opening_message=custom_opening_message,
             custom_instructions=custom_instructions
         )
-        # Placeholder for main_agent_process
-        from agents.main_agent import main_agent_process
-        result = await main_agent_process(input_data, [await file.read() for file in files])
-        return {
-            "status": "success",
-            "business_id": result["business_id"],
-            "context_prompt": result["context_prompt"]
-        }
+        # Run the pipeline in the background; clients poll /configure-agent/{job_id}
+        from agents.jobs import configure_jobs
+        from agents.main_agent import business_id_for
+        business_id = business_id_for(input_data)
+        from agents.file_processor import spool_upload
+        # Uploads are copied to disk so the job never holds whole files in memory
+        file_paths = [await spool_upload(file) for file in files]
+        job, coalesced = await configure_jobs.submit(business_id, input_data, file_paths)
+        return JSONResponse(status_code=202, content={
+            "status": "accepted",
+            "job_id": job.job_id,
+            "business_id": business_id,
+            "coalesced": coalesced
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/configure-agent/{job_id}")
+async def get_configure_job(job_id: str):
+    from agents.jobs import configure_jobs
+    job = await configure_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return jsonable_encoder({"status": "success", "job": job})
+
+# Registered before /{business_id}, which would otherwise match it
+@router.get("/metrics")
+async def get_metrics():
+    from agents.metrics import render_metrics
+    from prometheus_client import CONTENT_TYPE_LATEST
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @router.get("/{business_id}")
 async def serve_chatbot(business_id: str):
     return FileResponse("static/chatbot.html")
@@ -143,35 +167,155 @@ async def serve_chatbot(business_id: str):
 async def websocket_endpoint(websocket: WebSocket, business_id: str):
     await websocket.accept()  # Accept connection
     from agents.customer_agent import customer_agent
-    await customer_agent(websocket, business_id)
+    from agents.session_guard import GuardedWebSocket, reject, session_limits
+    refused = session_limits.acquire(business_id)
+    if refused:
+        await reject(websocket, refused)
+        return
+    # ?stream=1 opts in to framed, incrementally streamed replies
+    stream = websocket.query_params.get("stream") == "1"
+    from agents.metrics import active_sessions, sessions_total
+    sessions_total.inc()
+    active_sessions.inc()
+    try:
+        # ?session_id= resumes an earlier conversation on whichever worker takes the reconnect
+        await customer_agent(GuardedWebSocket(websocket, business_id), business_id, stream, websocket.query_params.get("session_id"))
+    finally:
+        active_sessions.dec()
+        session_limits.release(business_id)
 
 @router.get("/")
 async def root():
     return {"message": "Server is running"}
 
+@router.get("/stats/ttfb")
+async def get_ttfb_stats():
+    from agents.streaming import ttfb
+    return {"status": "success", "ttfb": {mode: tracker.summary() for mode, tracker in ttfb.items()}}
+
+@router.get("/stats/turns")
+async def get_turn_stats():
+    from agents.turn_pipeline import turn_stats
+    return {"status": "success", "turns": turn_stats.summary()}
+
+@router.get("/stats/response-cache")
+async def get_response_cache_stats():
+    from agents.response_cache import response_cache
+    return {"status": "success", "response_cache": response_cache.stats()}
+
+@router.get("/stats/business-cache")
+async def get_business_cache_stats():
+    from db.mongodb import business_cache
+    return {"status": "success", "business_cache": business_cache.stats()}
+
+@router.get("/stats/customer-details")
+async def get_customer_detail_stats():
+    from agents.customer_details import detail_stats
+    return {"status": "success", "customer_details": detail_stats.summary()}
+
+@router.get("/stats/identify")
+async def get_identify_stats():
+    from agents.customer_classifier import identify_stats
+    return {"status": "success", "identify": identify_stats.summary()}
+
+@router.get("/stats/prompt-templates")
+async def get_prompt_template_stats():
+    from agents.prompt_templates import template_stats
+    return {"status": "success", "prompt_templates": template_stats.summary()}
+
+@router.get("/stats/sessions")
+async def get_session_stats():
+    from agents.session_guard import session_limits, session_stats
+    return {"status": "success", "sessions": session_stats.summary(session_limits)}
+
+@router.get("/stats/resilience")
+async def get_resilience_stats():
+    from agents.resilience import resilience_stats
+    return {"status": "success", "resilience": resilience_stats.summary()}
+
+@router.get("/stats/write-behind")
+async def get_write_behind_stats():
+    from db.write_behind import write_behind
+    return {"status": "success", "write_behind": write_behind.summary()}
+
 @router.websocket("/ws/test")
 async def websocket_test(websocket: WebSocket):
     await websocket.accept()
     print("WebSocket connection established!")
 
-@router.get("/tickets/{business_id}")
-async def get_tickets_by_business_id(business_id: str):
+async def _records_page(
+    collection_name: str,
+    business_id: str,
+    limit: int,
+    cursor: Optional[str],
+    status: Optional[str],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+    include_conversation: bool
+) -> dict:
     try:
-        client = get_mongo_client()
-        db = client["turiniq"]
-        collection = db["tickets"]
-        tickets = list(collection.find({"business_id": business_id}, {"_id": 0}))  # Exclude MongoDB _id field
-        return {"status": "success", "tickets": tickets}
+        records, next_cursor = await find_records_page(
+            collection_name, business_id, limit, cursor, status, created_after, created_before, include_conversation
+        )
+        return {"status": "success", collection_name: records, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch tickets for business_id {business_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch {collection_name} for business_id {business_id}: {str(e)}")
+
+def _export_records(
+    collection_name: str,
+    business_id: str,
+    status: Optional[str],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+    include_conversation: bool
+) -> StreamingResponse:
+    async def ndjson():
+        async for record in iter_records(collection_name, business_id, status, created_after, created_before, include_conversation):
+            yield json.dumps(jsonable_encoder(record)) + "\n"
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/tickets/{business_id}")
+async def get_tickets_by_business_id(
+    business_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_conversation: bool = False
+):
+    return await _records_page("tickets", business_id, limit, cursor, status, created_after, created_before, include_conversation)
+
+@router.get("/tickets/{business_id}/export")
+async def export_tickets(
+    business_id: str,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_conversation: bool = True
+):
+    return _export_records("tickets", business_id, status, created_after, created_before, include_conversation)
 
 @router.get("/leads/{business_id}")
-async def get_leads_by_business_id(business_id: str):
-    try:
-        client = get_mongo_client()
-        db = client["turiniq"]
-        collection = db["leads"]
-        leads = list(collection.find({"business_id": business_id}, {"_id": 0}))  # Exclude MongoDB _id field
-        return {"status": "success", "leads": leads}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch leads for business_id {business_id}: {str(e)}")
\ No newline at end of file
+async def get_leads_by_business_id(
+    business_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_conversation: bool = False
+):
+    return await _records_page("leads", business_id, limit, cursor, status, created_after, created_before, include_conversation)
+
+@router.get("/leads/{business_id}/export")
+async def export_leads(
+    business_id: str,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_conversation: bool = True
+):
+    return _export_records("leads", business_id, status, created_after, created_before, include_conversation)
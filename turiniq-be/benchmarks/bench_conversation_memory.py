@@ -0,0 +1,122 @@
+"""Per-session conversation memory at 10, 100 and 1000 turns.
+
+Builds many sessions' histories four ways and reports traced memory per
+session and the cost of recording a message:
+
+- dicts: the old list of {"user"/"agent": text, "timestamp": str} dicts,
+  formatting the timestamp on every append.
+- compact: ConversationLog records (__slots__, role enum, epoch
+  milliseconds) with every message kept in memory.
+- memory_store: a sales Session checkpointed every turn into the default
+  InMemorySessionStore, with summaries and lead flushes keeping up. Counts
+  the session and what the store keeps; the store shares the session's
+  records and keeps up to SESSION_MAX_STORED_MESSAGES per session.
+  `store_after_close` is what the store still holds for a disconnected
+  session until SESSION_TTL_SECONDS.
+- mongo_store: the same session with a store that discards what it is
+  given, as Mongo does out of process; only the window stays in memory.
+
+Message text is counted in every mode, since each message holds its own
+string:
+
+    python -m benchmarks.bench_conversation_memory
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from agents.conversation import ConversationLog
+from agents.prompt_builder import HISTORY_SUMMARY_BATCH, HISTORY_WINDOW_MESSAGES
+from agents.session_store import InMemorySessionStore, Session
+
+TURNS = (10, 100, 1000)
+
+
+class DiscardStore:
+    async def create(self, data):
+        pass
+
+    async def append(self, session_id, messages, fields, end):
+        pass
+
+
+def user_text(turn: int) -> str:
+    return f"Question {turn}: where is order {1000 + turn} and when will it arrive?"
+
+def agent_text(turn: int) -> str:
+    return f"Order {1000 + turn} ships within two days and tracking is emailed to you once it leaves our warehouse."
+
+async def build(mode: str, turns: int, store, number: int):
+    if mode == "dicts":
+        conversation = []
+        for turn in range(turns):
+            conversation.append({"user": user_text(turn), "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
+            conversation.append({"agent": agent_text(turn), "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
+        return conversation
+    if mode == "compact":
+        conversation = ConversationLog(window=10 ** 9)
+        for turn in range(turns):
+            conversation.add_user(user_text(turn))
+            conversation.add_agent(agent_text(turn))
+        return conversation
+    data = {"session_id": f"bench-{number}", "business_id": "bench", "agent": "sales", "customer_info": {}, "conversation": []}
+    await store.create(data)
+    session = Session(store, data)
+    for turn in range(turns):
+        session.conversation.add_user(user_text(turn))
+        session.conversation.add_agent(agent_text(turn))
+        session.lead_persisted = len(session.conversation)
+        # What ConversationMemory.maybe_summarize folds away once a batch has left the window
+        overflow = len(session.conversation) - session.summarized_upto - HISTORY_WINDOW_MESSAGES
+        if overflow >= HISTORY_SUMMARY_BATCH:
+            session.summarized_upto += overflow
+        await session.checkpoint()
+    return session
+
+async def per_session_bytes(mode: str, turns: int, sessions: int) -> dict:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = InMemorySessionStore(max_sessions=sessions) if mode == "memory_store" else DiscardStore()
+    kept = [await build(mode, turns, store, number) for number in range(sessions)]
+    result = {"bytes_per_session": (tracemalloc.get_traced_memory()[0] - before) // sessions}
+    if mode == "memory_store":
+        del kept
+        result["store_after_close"] = (tracemalloc.get_traced_memory()[0] - before) // sessions
+    tracemalloc.stop()
+    return result
+
+def append_us(mode: str, messages: int = 100_000) -> float:
+    start = time.perf_counter()
+    if mode == "dicts":
+        conversation = []
+        for i in range(messages):
+            conversation.append({"user": "hi", "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")})
+    else:
+        conversation = ConversationLog(window=10 ** 9)
+        for i in range(messages):
+            conversation.add_user("hi")
+    return round((time.perf_counter() - start) / messages * 1e6, 3)
+
+async def run(args) -> dict:
+    results = {}
+    for turns in TURNS:
+        sessions = max(1, args.messages // (2 * turns))
+        results[f"{turns}_turns"] = {
+            mode: await per_session_bytes(mode, turns, sessions)
+            for mode in ("dicts", "compact", "memory_store", "mongo_store")
+        }
+        results[f"{turns}_turns"]["sessions_measured"] = sessions
+    results["append_us"] = {mode: append_us(mode) for mode in ("dicts", "compact")}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000, help="messages built per measurement, spread over sessions")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
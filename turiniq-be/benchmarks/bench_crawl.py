@@ -0,0 +1,90 @@
+"""Crawler throughput against a local fixture site, cold and with a warm HTTP cache.
+
+The fixture serves a robots.txt (disallowing /private/), a sitemap.xml and
+`--pages` HTML pages linking to each other, each response delayed by
+`--latency` seconds. Pages carry an ETag, so the warm run is all 304s.
+
+    python -m benchmarks.bench_crawl --pages 200 --latency 0.05 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import hashlib
+import http.server
+import tempfile
+import threading
+import time
+
+from agents.crawler import Crawler, HttpCache
+
+
+def serve_site(pages: int, latency: float) -> str:
+    def page(i: int) -> bytes:
+        links = "".join(f"<a href='/page/{(i * 7 + k) % pages}'>Page {k}</a>" for k in range(1, 6))
+        return (
+            f"<html><head><title>Page {i}</title><script>var x = {i};</script></head><body>"
+            f"<nav>{links}<a href='/private/{i}'>Admin</a></nav>"
+            f"<main><h1>Product {i}</h1><p>{'Pricing and shipping details. ' * 40}</p></main>"
+            f"<footer>Copyright</footer></body></html>"
+        ).encode()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path == "/robots.txt":
+                body, content_type = b"User-agent: *\nDisallow: /private/\n", "text/plain"
+            elif self.path == "/sitemap.xml":
+                locs = "".join(f"<url><loc>http://{self.headers['Host']}/page/{i}</loc></url>" for i in range(0, pages, 10))
+                body, content_type = f"<urlset>{locs}</urlset>".encode(), "application/xml"
+            elif self.path == "/" or self.path.startswith("/page/"):
+                number = int(self.path.rsplit("/", 1)[1] or 0)
+                body, content_type = page(number), "text/html"
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+async def run(url: str, pages: int, concurrency: int, cache: HttpCache, label: str):
+    crawler = Crawler(max_pages=pages, max_depth=10, concurrency=concurrency, cache=cache)
+    start = time.perf_counter()
+    crawled = await crawler.crawl(url)
+    elapsed = time.perf_counter() - start
+    print(
+        f"concurrency {concurrency:>3}  {label:<5}  {len(crawled):>4} pages  {elapsed:6.2f}s  "
+        f"{len(crawled) / elapsed:7.1f} pages/s  {crawler.stats}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    url = serve_site(args.pages, args.latency)
+    for concurrency in args.concurrency:
+        with tempfile.TemporaryDirectory() as directory:
+            cache = HttpCache(directory)
+            asyncio.run(run(url, args.pages, concurrency, cache, "cold"))
+            asyncio.run(run(url, args.pages, concurrency, cache, "warm"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Model calls and round trips spent collecting name, email and phone.
+
+Replays typical customer replies through collect_customer_details with a
+FakeModel and compares against the old flow (one prompt and one extraction
+call per missing field):
+
+    python -m benchmarks.bench_customer_details
+"""
+import asyncio
+import json
+
+from agents.conversation import ConversationLog
+from agents.customer_agent import collect_customer_details
+from agents.customer_details import detail_stats
+from benchmarks.fakes import FakeModel
+
+# (details known after identification, earlier user messages, reply to the details prompt)
+SCENARIOS = [
+    ({}, [], "Ada Lovelace, ada@example.com, +1 555 010 0199"),
+    ({}, [], "my name is Grace Hopper and my email is grace@navy.mil, phone 555-0100-222"),
+    ({}, ["Hi, I'm Alan and I want pricing"], "alan@example.org / (020) 7946 0958"),
+    ({"name": "Linus"}, [], "linus@example.com"),
+    ({"email": "ken@example.com"}, [], "Ken Thompson 5550104444"),
+    ({}, ["Hello, my email is barbara@example.com"], "Barbara Liskov, call me on 555 0105 333"),
+    ({}, [], "sure, it's Margaret at margaret@example.com"),
+    ({}, [], "you can reach me at the office, ask for Dennis"),
+    ({"name": "Edsger", "email": "ewd@example.nl", "phone": "+31205550106"}, [], ""),
+    ({}, [], "no thanks"),
+]
+
+
+class ScriptedSocket:
+    def __init__(self, reply: str):
+        self.reply = reply
+        self.sent = []
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+
+    async def receive_text(self) -> str:
+        return self.reply
+
+
+def respond(prompt: str) -> str:
+    # The model finds nothing the local parser missed, like a typical real reply
+    return json.dumps({"name": "Dennis"}) if "Dennis" in prompt else "{}"
+
+async def run() -> dict:
+    model = FakeModel(0.0, respond=respond)
+    filled = total = 0
+    for known, history, reply in SCENARIOS:
+        conversation = ConversationLog.from_dicts({"user": text} for text in history)
+        info = await collect_customer_details(ScriptedSocket(reply), dict(known), conversation, model)
+        filled += sum(1 for field in ("name", "email", "phone") if info.get(field))
+        total += 3
+    summary = detail_stats.summary()
+    missing = summary["llm_calls"] + summary["llm_calls_avoided"]
+    return {
+        "scenarios": len(SCENARIOS),
+        "fields_filled": f"{filled}/{total}",
+        "llm_calls_before": missing,
+        "llm_calls_after": model.calls,
+        "round_trips_before": missing,
+        "round_trips_after": missing - summary["round_trips_avoided"],
+        **summary,
+    }
+
+def main():
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+if __name__ == "__main__":
+    main()
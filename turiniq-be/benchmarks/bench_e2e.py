@@ -0,0 +1,225 @@
+"""Offline end-to-end load test: /configure-agent uploads, then support and sales chats.
+
+Runs the real app in-process under uvicorn with a FakeModel and an in-memory
+Mongo (mongomock-motor), and a local fixture site for the crawler. Reports
+p50/p95/p99 turn latency, throughput and resident memory per open session
+as JSON, so runs can be compared over time. All chats talk to one business,
+so LLM_MAX_CONCURRENCY_PER_BUSINESS bounds how many turns run at once.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_e2e --sessions 200 --turns 5 --latency 0.2 --output e2e.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+# The crawler's HTTP cache must not outlive the benchmark
+os.environ.setdefault("CRAWL_CACHE_DIR", tempfile.mkdtemp(prefix="turiniq-bench-cache-"))
+# Load-test clients type faster and open more chats per business than the limits allow
+for name in ("WS_RATE_PER_SECOND", "WS_RATE_BURST", "WS_MAX_SESSIONS", "WS_MAX_SESSIONS_PER_BUSINESS"):
+    os.environ.setdefault(name, "100000")
+
+import httpx
+import uvicorn
+import websockets
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import llm
+from benchmarks.bench_crawl import serve_site
+from benchmarks.bench_file_ingest import rss_bytes
+from benchmarks.fakes import FakeModel, SlowMongoClient
+from db import mongodb
+
+_USER_MESSAGE_RE = re.compile(r"User Message: (.*)")
+
+
+def respond(prompt: str) -> str:
+    """Replies shaped like the ones each agent prompt asks for."""
+    if "identification agent" in prompt:
+        message = _USER_MESSAGE_RE.search(prompt).group(1)
+        customer_type = "existing" if "order" in message else "new"
+        return json.dumps({"customer_type": customer_type, "customer_info": {
+            "customer_id": "C-1", "name": "Load Test", "email": "load@example.com", "phone": "+10000000000"}})
+    if "support agent. Decide" in prompt:
+        return json.dumps({"escalate": False, "reason": "", "response": "Your order is on its way and should arrive in two days."})
+    if "sales agent" in prompt:
+        return json.dumps({"response": "Our plans start at $10 a month and include support.", "reason": "Pricing question"})
+    if "Extract the" in prompt:
+        return "{}"
+    return "TurinIQ load test business. Sells subscription plans.\nMore details."
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))], 2)
+
+    return {"count": len(samples), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.fmean(samples), 2), "max_ms": round(samples[-1], 2)}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def configure(client: httpx.AsyncClient, site: str, index: int) -> tuple[str, float]:
+    """Upload one configuration and wait for its job; returns (business_id, seconds)."""
+    form = {
+        "business_type": "tech",
+        "domain": f"{site}?tenant={index}",
+        "agent_goal": "Provide Customer Support",
+        "tonality": "friendly",
+        "communication_style": "Keep answers concise",
+        "context_clarity": "Clarify brief messages",
+        "handover_escalation": "Escalate refund requests",
+        "data_to_capture": "name,email",
+        "custom_opening_message": "Hi! How can we help?",
+    }
+    files = [("files", (f"catalog{index}.txt", f"Catalog {index}: plans, pricing and shipping.".encode() * 200))]
+    start = time.perf_counter()
+    response = await client.post("/configure-agent", data=form, files=files)
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/configure-agent/{job_id}")).json()["job"]
+        if job["status"] in ("succeeded", "failed"):
+            break
+        await asyncio.sleep(0.02)
+    if job["status"] != "succeeded":
+        raise RuntimeError(f"configure job failed: {job['error']}")
+    return job["business_id"], time.perf_counter() - start
+
+async def copy_business(source: str, target: str):
+    db = mongodb.get_async_db()
+    record = await db["business_data"].find_one({"business_id": source})
+    chunks = await mongodb.get_knowledge_chunks(source)
+    await mongodb.save_knowledge_chunks(target, [chunk["text"] for chunk in chunks])
+    await mongodb.save_business_data(target, record["knowledge_base"], record["context_prompt"], record["settings"])
+
+async def receive_reply(ws, stream: bool) -> str:
+    """Read one agent reply, assembling framed replies in stream mode."""
+    while True:
+        data = await ws.recv()
+        if not stream or not data.startswith("{"):
+            return data
+        frame = json.loads(data)
+        if frame.get("type") == "end":
+            return frame["text"]
+
+async def chat(url: str, flow: str, client: int, turns: int, stream: bool, opened: asyncio.Event,
+               ready: list, latencies: list[float]):
+    async with websockets.connect(url, max_size=None) as ws:
+        if stream:
+            await ws.recv()  # session frame
+        await ws.recv()  # greeting
+        first = "Hi, where is my order 1234?" if flow == "support" else "Hi, I'm interested in your plans"
+        await ws.send(first)
+        ready.append(client)
+        await opened.wait()
+        for turn in range(turns):
+            # Distinct questions, so the response cache doesn't answer them
+            message = f"Question {client}-{turn}: when does it ship?" if flow == "support" else f"How much is plan {client}-{turn}?"
+            sent = time.perf_counter()
+            await ws.send(message)
+            await receive_reply(ws, stream)
+            latencies.append((time.perf_counter() - sent) * 1000)
+
+async def run(args) -> dict:
+    llm.set_model(FakeModel(args.latency, respond=respond, chunk_size=24))
+    # Zero added latency; the wrapper only fills gaps in mongomock's bulk_write
+    mongodb._async_client = SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0)
+    site = serve_site(5, 0.0)
+
+    from main import app
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    results = {"timestamp": datetime.utcnow().isoformat(), "git_commit": git_commit(), "params": vars(args)}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            start = time.perf_counter()
+            configured = await asyncio.gather(*(configure(client, site, i) for i in range(args.configure)))
+            elapsed = time.perf_counter() - start
+        results["configure"] = {
+            **percentiles([seconds * 1000 for _, seconds in configured]),
+            "throughput_per_s": round(len(configured) / elapsed, 2),
+        }
+        # Configured ids embed the site URL, so chat under a path-safe copy
+        business_id = "loadtest"
+        await copy_business(configured[0][0], business_id)
+
+        query = "?stream=1" if args.stream else ""
+        url = f"ws://127.0.0.1:{port}/ws/customer/{business_id}{query}"
+        latencies = {"support": [], "sales": []}
+        opened, ready = asyncio.Event(), []
+        rss_before = rss_bytes()
+        tasks = [
+            asyncio.create_task(chat(url, "support" if i % 2 == 0 else "sales", i, args.turns, args.stream,
+                                     opened, ready, latencies["support" if i % 2 == 0 else "sales"]))
+            for i in range(args.sessions)
+        ]
+        # Measure memory once every session is open and identified
+        while len(ready) < args.sessions:
+            await asyncio.sleep(0.05)
+            if any(task.done() and task.exception() for task in tasks):
+                break
+        await asyncio.sleep(args.latency * 2)
+        rss_open = rss_bytes()
+        start = time.perf_counter()
+        opened.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+        all_turns = latencies["support"] + latencies["sales"]
+        results["turns"] = {**percentiles(all_turns), "throughput_per_s": round(len(all_turns) / elapsed, 2)}
+        results["support"] = percentiles(latencies["support"])
+        results["sales"] = percentiles(latencies["sales"])
+        results["memory"] = {
+            "rss_mib": round(rss_open / 1024 / 1024, 1),
+            "per_session_kib": round((rss_open - rss_before) / max(1, args.sessions) / 1024, 1),
+        }
+        results["llm_calls"] = llm.get_model().calls
+    finally:
+        server.should_exit = True
+        await serving
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent chats, half support and half sales")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--configure", type=int, default=4, help="concurrent /configure-agent uploads")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--stream", action="store_true", help="use framed streaming replies")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    print(report)
+
+if __name__ == "__main__":
+    main()
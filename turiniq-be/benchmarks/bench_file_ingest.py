@@ -0,0 +1,109 @@
+"""Time and peak memory growth of process_files on generated 1, 50 and 500 page PDFs.
+
+The model is a FakeModel, so the numbers cover extraction, chunking and the
+map-reduce scheduling rather than Gemini itself.
+
+    python -m benchmarks.bench_file_ingest --pages 1 50 500 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import threading
+
+from agents import file_processor, llm
+from agents.file_processor import process_files
+from benchmarks.fakes import FakeModel
+
+LINES_PER_PAGE = 40
+
+
+def write_pdf(path: str, pages: int):
+    """Write a minimal uncompressed PDF with a page of text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(pages):
+        lines = [
+            f"({'Page %d line %d: product pricing, shipping and returns policy.' % (page, line)}) Tj T*"
+            for line in range(LINES_PER_PAGE)
+        ]
+        stream = ("BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+class RssSampler(threading.Thread):
+    """Tracks the highest resident set size seen while it runs (Linux only)."""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.baseline = rss_bytes()
+        self.peak = self.baseline
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak - self.baseline
+
+async def run(path: str, pages: int, model: FakeModel):
+    calls = model.calls
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    summary = await process_files([path], model, "Summarize.")
+    elapsed = time.perf_counter() - start
+    growth = sampler.stop()
+    print(
+        f"{pages:>4} pages  {os.path.getsize(path) / 1024:8.0f} KiB  {elapsed:6.2f}s  "
+        f"peak RSS growth {growth / 1024 / 1024:6.2f} MiB  model calls {model.calls - calls:>3}  summary {len(summary)} chars"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--chunk-tokens", type=int, default=file_processor.INGEST_CHUNK_TOKENS)
+    args = parser.parse_args()
+
+    file_processor.INGEST_CHUNK_TOKENS = args.chunk_tokens
+    model = FakeModel(args.latency, respond=lambda prompt: "Summary of the document section.")
+    llm.set_model(model)
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in args.pages:
+            path = os.path.join(directory, f"{pages}.pdf")
+            write_pdf(path, pages)
+            asyncio.run(run(path, pages, model))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""First-message identification with and without the local classifier.
+
+Generates opening messages from an outdoor-gear shop's customers (existing,
+new, and ones that only the business's own vocabulary tells apart), and
+identifies them three ways: always asking the model, rules only, and rules
+plus a hashed n-gram model trained on a disjoint set of messages. Reports
+the fast-path hit rate, accuracy of the local decisions and the time until
+the first reply can start. The model is a FakeModel that answers correctly:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_identify --messages 400 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import customer_agent, customer_classifier, llm
+from agents.customer_classifier import HashedNgramModel
+from benchmarks.bench_e2e import percentiles
+from benchmarks.fakes import FakeModel
+from db import mongodb
+
+PRODUCTS = ["tent", "sleeping bag", "camping stove", "backpack", "headlamp", "rain jacket", "hiking boots"]
+NAMES = ["Ada", "Grace", "Linus", "Barbara", "Alan", "Margaret"]
+TEMPLATES = {
+    "existing": [
+        "Hi, my order {order} still hasn't arrived",
+        "I want a refund for the {product} I bought last week",
+        "The {product} arrived damaged, order #{order}",
+        "I was charged twice for my subscription",
+        "Can I return the {product}? It's the wrong size",
+        "I can't log in to my account, email {email}",
+        "Customer ID C-{order}: where is my package?",
+        "My {product} stopped working after two days",
+        # No rule signals; only this business's history tells
+        "the zipper on the {product} snapped on the second trip",
+        "{product} pole cracked in light wind, what now",
+        "the {product} from you leaks at the seams",
+        "stitching came loose on the {product} already",
+    ],
+    "new": [
+        "How much is the {product}?",
+        "Do you sell a {product} for winter camping?",
+        "I'm interested in a {product}, can I get a quote?",
+        "Looking for a lightweight {product} for a thru-hike",
+        "Hi, I'm {name}. What plans do you offer for gear rental?",
+        "Tell me more about the {product}",
+        # No rule signals; only this business's history tells
+        "which {product} is warmest for alpine use",
+        "{product} recommendations for a family of four",
+        "is the {product} good for beginners on a budget",
+        "what {product} would suit a week in the rockies",
+    ],
+    "ambiguous": [
+        "hello",
+        "Hi there, quick question",
+        "Can someone help me?",
+        "I have a question about the {product}",
+    ],
+}
+_USER_MESSAGE_RE = re.compile(r"User Message: (.*)")
+
+
+def corpus(count: int, seed: int) -> list[tuple[str, str]]:
+    """(message, truth) pairs; ambiguous messages belong to existing customers half the time."""
+    rng = random.Random(seed)
+    kinds = ["existing"] * 5 + ["new"] * 4 + ["ambiguous"]
+    messages = []
+    for _ in range(count):
+        kind = rng.choice(kinds)
+        message = rng.choice(TEMPLATES[kind]).format(
+            order=rng.randint(1000, 99999),
+            product=rng.choice(PRODUCTS),
+            name=rng.choice(NAMES),
+            email=f"{rng.choice(NAMES).lower()}@example.com",
+        )
+        truth = kind if kind != "ambiguous" else rng.choice(["existing", "new"])
+        messages.append((message, truth))
+    return messages
+
+async def run_mode(mode: str, messages: list, training: list, args) -> dict:
+    truth, asked = dict(messages), set()
+
+    def respond(prompt: str) -> str:
+        message = _USER_MESSAGE_RE.search(prompt).group(1)
+        asked.add(message)
+        return json.dumps({"customer_type": truth[message], "customer_info": {}})
+
+    model = FakeModel(args.latency, respond=respond)
+    llm.set_model(model)
+    mongodb._async_client = AsyncMongoMockClient()
+    customer_classifier._models.clear()
+    customer_classifier.identify_stats = customer_agent.identify_stats = customer_classifier.IdentifyStats()
+    if mode == "rules+model":
+        trained = HashedNgramModel.train([(message, int(kind == "existing")) for message, kind in training])
+        await mongodb.get_async_db()["classifier_models"].insert_one({"business_id": "bench", **trained.to_document()})
+
+    identify = customer_agent._identify_with_llm if mode == "llm" else customer_agent.identify_customer
+    # Stay within the per-business model concurrency, so waits are the model's, not the queue's
+    sessions = asyncio.Semaphore(args.concurrency)
+    latencies, results = [], {}
+
+    async def session(message: str):
+        async with sessions:
+            start = time.perf_counter()
+            customer_type, _ = await identify(model, message, "bench")
+            latencies.append((time.perf_counter() - start) * 1000)
+            results[message] = customer_type.value
+
+    await asyncio.gather(*(session(message) for message in truth))
+    local = [message for message in truth if message not in asked]
+    return {
+        "fast_path_hit_rate": round(len(local) / len(truth), 3),
+        "local_accuracy": round(sum(results[m] == truth[m] for m in local) / len(local), 3) if local else None,
+        "accuracy": round(sum(results[m] == truth[m] for m in truth) / len(truth), 3),
+        "model_calls": model.calls,
+        "first_reply_wait": percentiles(latencies),
+    }
+
+async def run(args) -> dict:
+    # Distinct messages only, so each is identified once per mode
+    messages = list(dict(corpus(args.messages, seed=1)).items())
+    seen = dict(messages)
+    training = [(m, kind) for m, kind in corpus(args.training, seed=2) if m not in seen]
+    return {mode: await run_mode(mode, messages, training, args) for mode in ("llm", "rules", "rules+model")}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--training", type=int, default=2000, help="past conversations the model learns from")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="sessions opening at once")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Server memory and session limits under thousands of idle websockets.
+
+Starts benchmarks.stub_app in its own process with short limits, then:
+
+1. Opens `--sockets` chats that read the greeting and go quiet. Most go to
+   one noisy business and the rest to a quiet one, to show the
+   per-business cap.
+2. Waits out the idle timeout and checks the server closed them.
+3. Repeats the wave, to show memory levels off. Closed sessions stay
+   resumable in the in-memory session store, capped here at
+   --max-sessions.
+4. Floods one chat with messages and sends one oversized message.
+
+The server's resident memory is read from /proc at each step (Linux only):
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_idle_sockets --sockets 3000 --idle 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+from agents.session_guard import (CLOSE_IDLE, CLOSE_TRY_AGAIN_LATER,
+                                  TOO_FAST_REPLY, TOO_LONG_REPLY)
+from benchmarks.bench_workers import free_port
+
+
+def server_rss_mib(pid: int) -> float:
+    with open(f"/proc/{pid}/statm") as f:
+        return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+
+def start_server(port: int, args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "STUB_LATENCY": "0.01",
+        "STUB_CPU_SECONDS": "0",
+        "WS_IDLE_TIMEOUT_SECONDS": str(args.idle),
+        "WS_MAX_SESSIONS": str(args.max_sessions),
+        "WS_MAX_SESSIONS_PER_BUSINESS": str(args.max_per_business),
+        # Closed sessions stay resumable in memory up to this many
+        "SESSION_MAX_IN_MEMORY": str(args.max_sessions),
+        "LOG_LEVEL": "WARNING",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.stub_app:app", "--port", str(port), "--log-level", "warning",
+         "--ws-ping-interval", "20", "--ws-ping-timeout", "20", "--backlog", "4096"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+async def idle_chat(url: str, connecting: asyncio.Semaphore, outcome: dict, connected: list):
+    """Connect, read the greeting and wait; records how the server ended the chat."""
+    try:
+        async with connecting:
+            ws = await websockets.connect(url, open_timeout=60, ping_interval=None)
+        async with ws:
+            await ws.recv()
+            connected.append(ws)
+            await ws.wait_closed()
+            code = ws.close_code
+    except Exception:
+        code = "error"
+    outcome[code] = outcome.get(code, 0) + 1
+
+async def stats(port: int) -> dict:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"http://127.0.0.1:{port}/stats/sessions")).json()["sessions"]
+
+async def wave(port: int, pid: int, args) -> dict:
+    connecting = asyncio.Semaphore(200)
+    outcome, connected = {}, []
+    noisy = int(args.sockets * 0.8)
+    tasks = [
+        asyncio.create_task(idle_chat(
+            f"ws://127.0.0.1:{port}/ws/customer/{'noisy' if i < noisy else 'quiet'}", connecting, outcome, connected
+        ))
+        for i in range(args.sockets)
+    ]
+    while len(connected) + sum(outcome.values()) < args.sockets:
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(0.5)
+    open_stats = await stats(port)
+    rss_open = server_rss_mib(pid)
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return {
+        "open_sessions": open_stats["active"],
+        "open_by_business": open_stats["active_by_business"],
+        "server_rss_open_mib": rss_open,
+        "closed_by": {
+            {CLOSE_IDLE: "idle_timeout", CLOSE_TRY_AGAIN_LATER: "capacity"}.get(code, str(code)): count
+            for code, count in outcome.items()
+        },
+        "all_closed_after_s": round(time.perf_counter() - start, 1),
+        "server_rss_after_mib": server_rss_mib(pid),
+    }
+
+async def flood(port: int, messages: int) -> dict:
+    """One customer sending as fast as possible, then one huge message."""
+    notices = {"sent": messages + 1, "answered": 0, "rate_limited": 0, "too_long": 0}
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/customer/flood", ping_interval=None) as ws:
+        await ws.recv()
+        start = time.perf_counter()
+        for i in range(messages):
+            await ws.send(f"How much is plan {i}?")
+        await asyncio.sleep(2)  # let the bucket refill, so the next message is read
+        await ws.send("x" * 10_000)
+        try:
+            while True:
+                reply = await asyncio.wait_for(ws.recv(), 3)
+                if reply == TOO_FAST_REPLY:
+                    notices["rate_limited"] += 1
+                elif reply == TOO_LONG_REPLY:
+                    notices["too_long"] += 1
+                else:
+                    notices["answered"] += 1
+        except (asyncio.TimeoutError, websockets.ConnectionClosed):
+            pass
+        notices["seconds"] = round(time.perf_counter() - start, 1)
+    return notices
+
+async def run(args) -> dict:
+    port = free_port()
+    server = start_server(port, args)
+    try:
+        results = {"server_rss_start_mib": server_rss_mib(server.pid)}
+        for i in range(args.waves):
+            results[f"wave_{i + 1}"] = await wave(port, server.pid, args)
+        results["flood"] = await flood(port, args.flood)
+        results["server_events"] = (await stats(port))["events"]
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=3000)
+    parser.add_argument("--idle", type=float, default=30, help="server idle timeout in seconds")
+    parser.add_argument("--max-sessions", type=int, default=2500)
+    parser.add_argument("--max-per-business", type=int, default=2000)
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--flood", type=int, default=30, help="messages the flooding customer sends at once")
+    args = parser.parse_args()
+    # Each socket is a file descriptor on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
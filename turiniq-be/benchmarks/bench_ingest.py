@@ -0,0 +1,98 @@
+"""End-to-end /configure-agent pipeline wall time with a stub model.
+
+Compares the old strictly sequential pipeline (one file at a time, then the
+scrape, then the context) with main_agent_process. Uses an in-memory Mongo
+(mongomock-motor) and a local HTTP server for the website.
+
+    python -m benchmarks.bench_ingest --files 20 --latency 0.3 --concurrency 4
+"""
+import argparse
+import asyncio
+import http.server
+import os
+import tempfile
+import threading
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import file_processor, llm
+from agents.context_builder import BusinessInput, build_context
+from agents.file_processor import process_files
+from agents.main_agent import main_agent_process
+from agents.web_scraper import scrape_website
+from benchmarks.fakes import FakeModel
+from db import mongodb
+
+
+def serve_site() -> str:
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = b"<html><body><a href='/products'>Products</a><a href='/pricing'>Pricing</a></body></html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def business_input(domain: str) -> BusinessInput:
+    return BusinessInput(
+        business_type="tech",
+        domain=domain,
+        agent_goal="Provide Customer Support",
+        tonality="friendly",
+        communication_style=["Keep answers concise"],
+        context_clarity=["Clarify brief messages"],
+        handover_escalation=["Escalate refund requests"],
+        data_to_capture=["name", "email"],
+        custom_opening_message="Hi!",
+    )
+
+async def sequential(input_data: BusinessInput, files: list[str]) -> float:
+    model = llm.get_model()
+    start = time.perf_counter()
+    knowledge_base = await process_files(files, model, "Summarize.", concurrency=1)
+    knowledge_base += await scrape_website(str(input_data.domain), model)
+    await build_context(input_data, knowledge_base, model)
+    return time.perf_counter() - start
+
+async def concurrent(input_data: BusinessInput, files: list[str]) -> tuple[float, dict]:
+    start = time.perf_counter()
+    result = await main_agent_process(input_data, files)
+    return time.perf_counter() - start, result["timings"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    file_processor.INGEST_CONCURRENCY = args.concurrency
+
+    llm.set_model(FakeModel(args.latency, respond=lambda prompt: "Summary of the business."))
+    mongodb._async_client = AsyncMongoMockClient()
+    input_data = business_input(serve_site())
+    with tempfile.TemporaryDirectory() as directory:
+        files = []
+        for i in range(args.files):
+            path = os.path.join(directory, f"doc{i}.txt")
+            with open(path, "w") as f:
+                f.write(f"Document {i}: product details and pricing.")
+            files.append(path)
+
+        before = asyncio.run(sequential(input_data, files))
+        after, timings = asyncio.run(concurrent(input_data, files))
+    print(f"{args.files} files, model latency {args.latency}s, concurrency {args.concurrency}")
+    print(f"sequential pipeline: {before:6.2f}s")
+    print(f"main_agent_process:  {after:6.2f}s  {timings}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Write amplification of per-turn lead inserts vs. per-session upserts.
+
+Encodes the exact documents each strategy sends to MongoDB, so it runs offline:
+
+    python -m benchmarks.bench_lead_writes --turns 10 50 200
+"""
+import argparse
+from datetime import datetime
+
+import bson
+
+
+def message(role: str, turn: int) -> dict:
+    text = f"{role} message for turn {turn}. " + "lorem ipsum dolor sit amet " * 6
+    return {role: text, "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")}
+
+def lead_fields() -> dict:
+    return {
+        "business_id": "BusinessType.TECH_https://example.com",
+        "customer_name": "Ada Lovelace",
+        "customer_email": "ada@example.com",
+        "customer_phone": "+15550100",
+        "reason": "General inquiry",
+        "status": "open",
+        "created_at": datetime.utcnow(),
+    }
+
+def per_turn_inserts(turns: int) -> tuple[int, int]:
+    """Old behaviour: insert a full copy of the conversation after every turn."""
+    conversation, written = [], 0
+    for turn in range(turns):
+        conversation += [message("user", turn), message("agent", turn)]
+        written += len(bson.encode({**lead_fields(), "conversation": conversation}))
+    return written, turns
+
+def session_upserts(turns: int, flush_every: int) -> tuple[int, int]:
+    """New behaviour: upsert one document and $push only the new messages."""
+    pending, written, documents = [], 0, 1
+    for turn in range(turns):
+        pending += [message("user", turn), message("agent", turn)]
+        if (turn + 1) % flush_every == 0 or turn == turns - 1:
+            fields = lead_fields()
+            created_at = fields.pop("created_at")
+            update = {
+                "$set": {**fields, "session_id": "s", "updated_at": datetime.utcnow()},
+                "$setOnInsert": {"created_at": created_at},
+                "$push": {"conversation": {"$each": pending}},
+            }
+            written += len(bson.encode(update))
+            pending = []
+    return written, documents
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--flush-every", type=int, default=1)
+    args = parser.parse_args()
+    print(f"{'turns':>6} {'insert bytes':>14} {'docs':>6} {'upsert bytes':>14} {'docs':>6} {'ratio':>8}")
+    for turns in args.turns:
+        old_bytes, old_docs = per_turn_inserts(turns)
+        new_bytes, new_docs = session_upserts(turns, args.flush_every)
+        print(f"{turns:>6} {old_bytes:>14,} {old_docs:>6} {new_bytes:>14,} {new_docs:>6} {old_bytes / new_bytes:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
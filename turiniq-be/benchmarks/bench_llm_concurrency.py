@@ -0,0 +1,55 @@
+"""Show that concurrent chat sessions no longer serialize on model calls.
+
+Each simulated session runs `identify_customer` against a stub model with a
+fixed latency. With the blocking call every session waits for the previous
+one (~N x latency); through agents.llm they overlap (~1 x latency).
+
+    python -m benchmarks.bench_llm_concurrency --sessions 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import llm
+from agents.customer_agent import identify_customer
+from benchmarks.fakes import FakeModel
+from db import mongodb
+
+
+async def blocking_sessions(sessions: int, latency: float) -> float:
+    model = FakeModel(latency)
+
+    async def session(i: int):
+        model.generate_content(f"message {i}")  # what the agents used to do
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    return time.perf_counter() - start
+
+async def async_sessions(sessions: int, latency: float) -> float:
+    llm.set_model(FakeModel(latency))
+    # The messages are ambiguous, so each looks up a (missing) classifier model first
+    mongodb._async_client = AsyncMongoMockClient()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        identify_customer(llm.get_model(), f"message {i}", f"business_{i}")
+        for i in range(sessions)
+    ))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    blocking = asyncio.run(blocking_sessions(args.sessions, args.latency))
+    concurrent = asyncio.run(async_sessions(args.sessions, args.latency))
+    print(f"{args.sessions} sessions, model latency {args.latency:.2f}s")
+    print(f"blocking generate_content: {blocking:6.2f}s ({blocking / args.latency:.1f} latency periods)")
+    print(f"agents.llm.generate:       {concurrent:6.2f}s ({concurrent / args.latency:.1f} latency periods)")
+
+if __name__ == "__main__":
+    main()
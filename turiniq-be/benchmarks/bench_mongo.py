@@ -0,0 +1,68 @@
+"""Compare MongoDB throughput for per-call clients vs. the shared pooled clients.
+
+Runs against a local mongod (or whatever MONGODB_URI points to):
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_mongo --ops 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from pymongo import MongoClient
+
+from db import mongodb
+
+BUSINESS_ID = "bench_business"
+
+
+def per_call_client(ops: int) -> float:
+    """Old behaviour: build a fresh MongoClient for every lookup."""
+    uri = mongodb._mongo_uri()
+    start = time.perf_counter()
+    for _ in range(ops):
+        client = MongoClient(uri)
+        client[mongodb.DB_NAME]["business_data"].find_one({"business_id": BUSINESS_ID})
+        client.close()
+    return ops / (time.perf_counter() - start)
+
+def shared_sync_client(ops: int) -> float:
+    collection = mongodb.get_mongo_client()[mongodb.DB_NAME]["business_data"]
+    start = time.perf_counter()
+    for _ in range(ops):
+        collection.find_one({"business_id": BUSINESS_ID})
+    return ops / (time.perf_counter() - start)
+
+async def shared_async_client(ops: int, concurrency: int) -> float:
+    await mongodb.connect_mongo()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await mongodb.get_business_data(BUSINESS_ID)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(ops)))
+    return ops / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    mongodb.get_mongo_client()[mongodb.DB_NAME]["business_data"].update_one(
+        {"business_id": BUSINESS_ID},
+        {"$set": {"knowledge_base": "x" * 10_000, "context_prompt": "bench"}},
+        upsert=True,
+    )
+
+    print(f"per-call MongoClient:   {per_call_client(args.ops):10.1f} ops/sec")
+    print(f"shared MongoClient:     {shared_sync_client(args.ops):10.1f} ops/sec")
+    rate = asyncio.run(shared_async_client(args.ops, args.concurrency))
+    print(f"shared Motor (c={args.concurrency:<3}):  {rate:10.1f} ops/sec")
+    mongodb.close_mongo()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Prompt size and assembly time as a support session grows.
+
+Plays one long session through the support prompt: the budgeted builder
+(rolling window + running summary) against sending the whole history.
+Summaries come from a FakeModel, so it runs offline:
+
+    python -m benchmarks.bench_prompt_budget --turns 500
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from agents import llm
+from agents.prompt_builder import (ConversationMemory, estimate_tokens,
+                                   fit_sections, format_message)
+from agents.session_store import InMemorySessionStore, open_session, set_session_store
+from agents.turn_pipeline import build_turn_prompt, escalation_rules
+from benchmarks.fakes import FakeModel
+
+CONTEXT = "Acme Outdoor sells tents, sleeping bags and stoves. Tone: friendly. " * 40
+SNIPPETS = [f"Snippet {i}: shipping takes 3-5 days, returns are free within 30 days. " * 10 for i in range(4)]
+REPLY = "Thanks for asking! Your order ships within two days and tracking is emailed to you. " * 3
+CHECKPOINTS = (10, 50, 100, 250, 500, 1000)
+
+
+def summarize(prompt: str) -> str:
+    return "Customer asked about several orders and shipping times; all answered. " * 8
+
+async def run(turns: int, latency: float) -> list[dict]:
+    model = FakeModel(latency, respond=summarize)
+    llm.set_model(model)
+    set_session_store(InMemorySessionStore())
+    session = await open_session("bench")
+    memory = ConversationMemory(session, model)
+    rules = escalation_rules(None)
+    frame_tokens = estimate_tokens(build_turn_prompt("", rules, "", ""))
+
+    results, build_ms = [], []
+    for turn in range(1, turns + 1):
+        message = f"Question {turn}: where is order {1000 + turn} and when will it arrive?"
+        session.conversation.add_user(message)
+
+        start = time.perf_counter()
+        context, knowledge, history = fit_sections(frame_tokens, CONTEXT, SNIPPETS, memory, message)
+        prompt = build_turn_prompt(context, rules, knowledge, message, history)
+        build_ms.append((time.perf_counter() - start) * 1000)
+
+        if turn in CHECKPOINTS:
+            full_history = "\n".join(format_message(entry) for entry in session.conversation.since(0, -1))
+            naive = build_turn_prompt(CONTEXT, rules, "\n---\n".join(SNIPPETS), message, full_history)
+            results.append({
+                "turn": turn,
+                "budgeted_tokens": estimate_tokens(prompt),
+                "full_history_tokens": estimate_tokens(naive),
+                "summarized_messages": session.summarized_upto,
+                "build_p50_ms": round(statistics.median(build_ms), 3),
+                "build_max_ms": round(max(build_ms), 3),
+                "summary_calls": model.calls,
+            })
+            build_ms = []
+
+        session.conversation.add_agent(REPLY)
+        memory.maybe_summarize()
+        # The customer reads and types; background summaries finish meanwhile
+        await asyncio.sleep(latency * 2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.002, help="fake summary latency in seconds")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.turns, args.latency)), indent=2))
+
+if __name__ == "__main__":
+    main()
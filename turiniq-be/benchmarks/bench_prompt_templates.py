@@ -0,0 +1,102 @@
+"""Support turn prompts before and after precompiled per-business instructions.
+
+Plays support turns three ways and reports prompt characters the agent
+assembles and sends per turn, assembly time and model-call latency:
+
+- inline: the whole prompt (instructions, context, rules, knowledge,
+  history, message) rebuilt every turn, as before.
+- system_instruction: the instructions compiled once and bound to the model;
+  each call sends only the per-turn input. Gemini still reads the
+  instructions on every call, so its input size does not change.
+- context_cache: the instructions held in a Gemini context cache (large
+  contexts only), so the model reads only the per-turn input.
+
+The model is a FakeModel whose latency grows with the input it reads
+(`--prefill-ms-per-kb`), standing in for prompt processing time:
+
+    python -m benchmarks.bench_prompt_templates --turns 200 --context-chars 8000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from agents import llm
+from agents.llm import generate, model_with_instructions
+from agents.prompt_builder import estimate_tokens, fit_sections
+from agents.prompt_templates import compile_templates, instructions_for
+from agents.turn_pipeline import build_turn_prompt, escalation_rules, turn_input
+from benchmarks.fakes import FakeModel, FakeResponse
+
+SETTINGS = {"handover_escalation": ["Escalate refund requests", "Escalate frustrated or urgent cases"]}
+SNIPPETS = [f"Snippet {i}: shipping takes 3-5 days, returns are free within 30 days. " * 6 for i in range(3)]
+REPLY = json.dumps({"escalate": False, "reason": "", "response": "It ships tomorrow."})
+
+
+class PrefillModel(FakeModel):
+    """FakeModel that also charges time per kilobyte of input it reads."""
+
+    def __init__(self, latency: float, prefill_ms_per_kb: float):
+        super().__init__(latency, respond=lambda prompt: REPLY)
+        self.prefill_ms_per_kb = prefill_ms_per_kb
+        self.input_chars = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        self.input_chars += len(prompt)
+        await asyncio.sleep(self.latency + len(prompt) / 1024 * self.prefill_ms_per_kb / 1000)
+        return FakeResponse(self.respond(prompt))
+
+
+async def run_mode(mode: str, business: dict, args) -> dict:
+    model = PrefillModel(args.latency, args.prefill_ms_per_kb)
+    llm.set_model(model)
+    rules = escalation_rules(business["settings"])
+    instructions = instructions_for(business, "support", "")
+    inline_frame = estimate_tokens(build_turn_prompt("", rules, "", ""))
+    frame = estimate_tokens(instructions + turn_input("", ""))
+    sent, build_us, call_ms = [], [], []
+    for turn in range(args.turns):
+        message = f"Question {turn}: where is order {1000 + turn}?"
+        start = time.perf_counter()
+        if mode == "inline":
+            context, knowledge, history = fit_sections(inline_frame, business["context_prompt"], SNIPPETS, None, message)
+            prompt, turn_model = build_turn_prompt(context, rules, knowledge, message, history), model
+        else:
+            _, knowledge, history = fit_sections(frame, "", SNIPPETS, None, message)
+            prompt = turn_input(knowledge, message, history)
+            # Offline, only the cached mode can be shown as "the model reads the delta only"
+            turn_model = model if mode == "context_cache" else await model_with_instructions(instructions, model)
+        build_us.append((time.perf_counter() - start) * 1e6)
+        sent.append(len(prompt))
+        start = time.perf_counter()
+        await generate(prompt, model=turn_model, call_site="support")
+        call_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "prompt_chars_sent_per_turn": round(statistics.mean(sent)),
+        "model_input_chars_per_turn": round(model.input_chars / args.turns),
+        "build_p50_us": round(statistics.median(build_us), 1),
+        "call_p50_ms": round(statistics.median(call_ms), 2),
+    }
+
+async def run(args) -> dict:
+    context_prompt = "Acme Outdoor sells tents, sleeping bags and stoves. Tone: friendly, concise. " * (args.context_chars // 78)
+    business = {"context_prompt": context_prompt, "settings": SETTINGS}
+    start = time.perf_counter()
+    business["prompt_templates"] = compile_templates(context_prompt, SETTINGS)
+    compile_ms = (time.perf_counter() - start) * 1000
+    results = {mode: await run_mode(mode, business, args) for mode in ("inline", "system_instruction", "context_cache")}
+    return {"compile_once_ms": round(compile_ms, 3), **results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--context-chars", type=int, default=8000, help="size of the business context prompt")
+    parser.add_argument("--latency", type=float, default=0.01, help="fixed fake model latency in seconds")
+    parser.add_argument("--prefill-ms-per-kb", type=float, default=2.0, help="fake model time per KB of input")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Reconfiguration cost when little or nothing changed.
+
+Runs main_agent_process four times for one business against a local
+fixture site, with a stub model and in-memory Mongo: the first
+configuration, an identical one, a tonality change, and one changed file.
+
+    python -m benchmarks.bench_refresh --files 10 --latency 0.2
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+# The crawler's HTTP cache must not outlive the benchmark
+os.environ.setdefault("CRAWL_CACHE_DIR", tempfile.mkdtemp(prefix="turiniq-bench-cache-"))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import llm
+from agents.context_builder import BusinessInput
+from agents.main_agent import main_agent_process
+from benchmarks.bench_crawl import serve_site
+from benchmarks.bench_ingest import business_input
+from benchmarks.fakes import FakeModel
+from db import mongodb
+
+
+def write_files(directory: str, count: int, revision: int = 0) -> list[str]:
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"doc{i}.txt")
+        with open(path, "w") as f:
+            # Only the first document changes between revisions
+            f.write(f"Document {i} revision {revision if i == 0 else 0}: product details and pricing.")
+        paths.append(path)
+    return paths
+
+async def run(label: str, input_data, paths: list[str], model: FakeModel):
+    calls = model.calls
+    start = time.perf_counter()
+    result = await main_agent_process(input_data, paths)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {elapsed:6.2f}s  model calls {model.calls - calls:>3}  {result['refresh']}")
+
+async def main_async(args):
+    # Summaries differ whenever their input does, like a real model's would
+    model = FakeModel(args.latency, respond=lambda prompt: f"Summary {hashlib.sha256(prompt.encode()).hexdigest()[:12]}")
+    llm.set_model(model)
+    mongodb._async_client = AsyncMongoMockClient()
+    input_data = business_input(serve_site(args.pages, 0.01))
+    with tempfile.TemporaryDirectory() as directory:
+        await run("first", input_data, write_files(directory, args.files), model)
+        await run("no change", input_data, write_files(directory, args.files), model)
+        input_data = BusinessInput(**{**input_data.model_dump(), "tonality": "formal"})
+        await run("tonality change", input_data, write_files(directory, args.files), model)
+        await run("one file change", input_data, write_files(directory, args.files, revision=1), model)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
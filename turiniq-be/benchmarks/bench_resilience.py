@@ -0,0 +1,81 @@
+"""Turn success rate, latency and provider load under injected model faults.
+
+Runs support-style turns through agents.llm against a FaultyModel:
+
+- flaky: a share of calls fail; retries with jittered backoff recover them
+- tail: a share of calls are 10x slow; hedging trims the tail
+- outage: every call fails; the circuit breaker stops retry storms
+
+    python -m benchmarks.bench_resilience --turns 400 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from agents import llm, resilience
+from benchmarks.bench_e2e import percentiles
+from benchmarks.fakes import FaultyModel
+
+
+def reset(breaker_failures: int = resilience.BREAKER_FAILURES, hedge_after: float = 0.0):
+    resilience.breaker = resilience.CircuitBreaker(breaker_failures, resilience.BREAKER_RESET_SECONDS)
+    resilience.resilience_stats = resilience.ResilienceStats()
+    resilience.HEDGE_AFTER_SECONDS = hedge_after
+
+async def run_turns(model: FaultyModel, turns: int, concurrency: int) -> dict:
+    llm.set_model(model)
+    latencies, answered, degraded = [], 0, 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def turn(i: int):
+        nonlocal answered, degraded
+        async with gate:
+            resilience.start_turn()
+            start = time.perf_counter()
+            try:
+                await llm.generate(f"turn {i}", call_site="support")
+                answered += 1
+            except resilience.ProviderUnavailable:
+                degraded += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(turn(i) for i in range(turns)))
+    return {
+        "answered": answered,
+        "degraded": degraded,
+        "provider_calls": model.calls,
+        "calls_per_turn": round(model.calls / turns, 2),
+        **percentiles(latencies),
+        **resilience.resilience_stats.summary(),
+    }
+
+async def run(args) -> dict:
+    results = {}
+
+    reset()
+    results["flaky"] = await run_turns(FaultyModel(args.latency, error_rate=0.1), args.turns, args.concurrency)
+
+    reset()
+    results["tail"] = await run_turns(FaultyModel(args.latency, slow_rate=0.05), args.turns, args.concurrency)
+    reset(hedge_after=args.latency * 3)
+    results["tail_hedged"] = await run_turns(FaultyModel(args.latency, slow_rate=0.05), args.turns, args.concurrency)
+
+    # Without a breaker every turn makes all its attempts against the dead provider
+    for name, failures in (("outage_no_breaker", 10 ** 9), ("outage", resilience.BREAKER_FAILURES)):
+        reset(breaker_failures=failures)
+        model = FaultyModel(args.latency)
+        model.outage = True
+        results[name] = await run_turns(model, args.turns, args.concurrency)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency in seconds")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
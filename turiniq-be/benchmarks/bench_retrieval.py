@@ -0,0 +1,49 @@
+"""Retrieval latency over synthetic knowledge bases of 1k, 10k and 100k chunks.
+
+    python -m benchmarks.bench_retrieval --queries 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from agents.retrieval import BM25Index
+
+VOCABULARY = [f"term{i}" for i in range(20_000)]
+
+
+def synthetic_chunks(count: int, words: int = 120) -> list[str]:
+    rng = random.Random(count)
+    # Zipf-like skew so some terms are common and most are rare, as in real text
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    return [" ".join(rng.choices(VOCABULARY, weights, k=words)) for _ in range(count)]
+
+def run(count: int, queries: int):
+    chunks = synthetic_chunks(count)
+    start = time.perf_counter()
+    index = BM25Index(chunks)
+    build_s = time.perf_counter() - start
+
+    rng = random.Random(0)
+    timings = []
+    for _ in range(queries):
+        query = " ".join(rng.choices(VOCABULARY[:5000], k=8))
+        start = time.perf_counter()
+        index.search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(
+        f"{count:>7} chunks  build {build_s:7.2f}s  "
+        f"search p50 {statistics.median(timings):7.2f}ms  p95 {timings[int(0.95 * len(timings)) - 1]:7.2f}ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+    for count in args.sizes:
+        run(count, args.queries)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Websocket turn throughput of the API with 1..N uvicorn worker processes.
+
+Starts benchmarks.stub_app under `uvicorn --workers N` for each N and drives
+it with concurrent sales conversations. Each model call burns
+STUB_CPU_SECONDS of CPU, so throughput is bound by worker CPU and should
+scale with the worker count up to the number of cores.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --clients 64 --turns 10
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import websockets
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.stub_app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        # Clients send each turn as soon as the reply arrives, faster than the message rate limit
+        env={**os.environ, "WS_RATE_PER_SECOND": "100000", "WS_RATE_BURST": "100000"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+async def conversation(url: str, client: int, turns: int) -> int:
+    async with websockets.connect(url) as ws:
+        await ws.recv()  # greeting
+        await ws.send("Hi, I'm interested in your plans")
+        for turn in range(turns):
+            # Distinct questions, so the response cache doesn't skip the model
+            await ws.send(f"How much does plan {client}-{turn} cost?")
+            await ws.recv()
+    return turns
+
+async def drive(port: int, clients: int, turns: int) -> float:
+    url = f"ws://127.0.0.1:{port}/ws/customer/loadtest"
+    start = time.perf_counter()
+    completed = await asyncio.gather(*(conversation(url, client, turns) for client in range(clients)))
+    return sum(completed) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients x {args.turns} turns")
+    baseline = None
+    for workers in args.workers:
+        port = free_port()
+        server = start_server(workers, port)
+        try:
+            throughput = asyncio.run(drive(port, args.clients, args.turns))
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or throughput
+        print(f"{workers:>2} workers  {throughput:8.1f} turns/s  {throughput / baseline:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Lead writes with and without the write-behind queue.
+
+Sessions call save_lead after every turn against an in-memory Mongo with a
+simulated round trip per command. Reports per-turn save latency and writes
+per second (until everything is persisted), then takes the database down
+for a run to show spilling and replay:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_write_behind --sessions 200 --turns 20 --latency 0.002
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from datetime import datetime
+
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import customer_agent
+from benchmarks.bench_e2e import percentiles
+from benchmarks.fakes import SlowMongoClient
+from db import mongodb
+from db import write_behind as write_behind_module
+from db.write_behind import WriteBehindQueue
+
+
+def lead(session: int, turn: int) -> customer_agent.Lead:
+    return customer_agent.Lead(
+        business_id="bench",
+        session_id=f"session-{session:06d}",
+        customer_name="Ada Lovelace",
+        customer_email="ada@example.com",
+        customer_phone="+15550100",
+        conversation=[{"user": f"question {turn}", "seq": 2 * turn}, {"agent": f"answer {turn}", "seq": 2 * turn + 1}],
+        reason="General inquiry",
+        created_at=datetime.utcnow(),
+    )
+
+async def run_sessions(queue: WriteBehindQueue, sessions: int, turns: int, think: float) -> tuple[list[float], int]:
+    customer_agent.write_behind = queue
+    latencies, failed = [], 0
+
+    async def session(i: int):
+        nonlocal failed
+        for turn in range(turns):
+            start = time.perf_counter()
+            try:
+                await customer_agent.save_lead(lead(i, turn))
+            except Exception:
+                failed += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(think)
+
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    return latencies, failed
+
+async def persisted_messages() -> int:
+    total = 0
+    async for doc in mongodb.get_async_db()["leads"].find({}, {"conversation": 1}):
+        total += len(doc["conversation"])
+    return total
+
+async def run_mode(batched: bool, args) -> dict:
+    client = mongodb._async_client = SlowMongoClient(AsyncMongoMockClient(), args.latency)
+    queue = WriteBehindQueue(enabled=batched, spill_dir=tempfile.mkdtemp(prefix="turiniq-bench-spill-"))
+    await queue.start()
+    start = time.perf_counter()
+    latencies, failed = await run_sessions(queue, args.sessions, args.turns, args.think)
+    await queue.stop()
+    elapsed = time.perf_counter() - start
+    writes = args.sessions * args.turns
+    return {
+        "save_latency": percentiles(latencies),
+        "writes_per_s": round(writes / elapsed, 1),
+        "mongo_commands": client.commands,
+        "failed_saves": failed,
+        "messages_persisted": f"{await persisted_messages()}/{writes * 2}",
+        **({"write_behind": queue.summary()} if batched else {}),
+    }
+
+async def run_outage(args) -> dict:
+    """Database unreachable for the whole run and back before the next start."""
+    write_behind_module.WRITE_BEHIND_RETRY_ATTEMPTS = 2
+    client = mongodb._async_client = SlowMongoClient(AsyncMongoMockClient(), args.latency)
+    spill_dir = tempfile.mkdtemp(prefix="turiniq-bench-spill-")
+    queue = WriteBehindQueue(enabled=True, spill_dir=spill_dir)
+    await queue.start()
+    client.down = True
+    latencies, failed = await run_sessions(queue, args.sessions, args.turns, args.think)
+    await queue.stop()
+    client.down = False
+    before_replay = await persisted_messages()
+
+    # The next process start replays what was spilled
+    restarted = WriteBehindQueue(enabled=True, spill_dir=spill_dir)
+    await restarted.start()
+    await restarted.stop()
+    writes = args.sessions * args.turns
+    return {
+        "save_latency": percentiles(latencies),
+        "failed_saves": failed,
+        "spilled": queue.stats.spilled,
+        "messages_before_replay": f"{before_replay}/{writes * 2}",
+        "replayed": restarted.stats.replayed,
+        "messages_after_replay": f"{await persisted_messages()}/{writes * 2}",
+    }
+
+async def run(args) -> dict:
+    return {
+        "inline": await run_mode(False, args),
+        "write_behind": await run_mode(True, args),
+        "outage": await run_outage(args),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated Mongo round trip in seconds")
+    parser.add_argument("--think", type=float, default=0.01, help="pause between a session's turns in seconds")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
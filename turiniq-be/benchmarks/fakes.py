@@ -0,0 +1,201 @@
+"""Local stand-ins used by the benchmarks so they run without network access."""
+import asyncio
+import random
+import time
+from typing import Callable, Optional
+
+import bson
+from google.api_core import exceptions as google_exceptions
+from pymongo import InsertOne
+from pymongo.errors import AutoReconnect
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStream:
+    """Async iterator over reply chunks, spreading the latency across them."""
+
+    def __init__(self, text: str, latency: float, chunk_size: int):
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        self._delay = latency / len(self._chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> FakeResponse:
+        if not self._chunks:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._delay)
+        return FakeResponse(self._chunks.pop(0))
+
+
+class FakeModel:
+    """Deterministic GenerativeModel stub with a fixed latency per call.
+
+    `respond` maps a prompt to the reply text; by default every call returns
+    a small JSON document that the agents can parse.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        respond: Optional[Callable[[str], str]] = None,
+        chunk_size: int = 16,
+        cpu_seconds: float = 0.0
+    ):
+        self.latency = latency
+        self.respond = respond or (lambda prompt: '{"customer_type": "new", "customer_info": {}}')
+        self.chunk_size = chunk_size
+        # Busy work per call, standing in for the CPU a real turn costs the worker
+        self.cpu_seconds = cpu_seconds
+        self.calls = 0
+
+    def _burn(self):
+        deadline = time.perf_counter() + self.cpu_seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    def generate_content(self, prompt: str) -> FakeResponse:
+        self.calls += 1
+        self._burn()
+        time.sleep(self.latency)
+        return FakeResponse(self.respond(prompt))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        self._burn()
+        if stream:
+            return FakeStream(self.respond(prompt), self.latency, self.chunk_size)
+        await asyncio.sleep(self.latency)
+        return FakeResponse(self.respond(prompt))
+
+
+class FaultyModel(FakeModel):
+    """FakeModel that injects provider faults.
+
+    A share of calls (`error_rate`) fail with ServiceUnavailable, a share
+    (`slow_rate`) take `slow_factor` times the normal latency, and every call
+    fails while `outage` is set. Faults are drawn from a seeded RNG so runs
+    are repeatable.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+        seed: int = 0,
+        **kwargs
+    ):
+        super().__init__(latency, **kwargs)
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.outage = False
+        self.failures = 0
+        self._random = random.Random(seed)
+
+    def _draw(self) -> tuple[bool, float]:
+        """Decide this call's fate: (fails, latency)."""
+        if self.outage or self._random.random() < self.error_rate:
+            self.failures += 1
+            # Outages answer quickly with an error
+            return True, self.latency / 10
+        if self._random.random() < self.slow_rate:
+            return False, self.latency * self.slow_factor
+        return False, self.latency
+
+    def generate_content(self, prompt: str) -> FakeResponse:
+        self.calls += 1
+        fails, latency = self._draw()
+        time.sleep(latency)
+        if fails:
+            raise google_exceptions.ServiceUnavailable("injected fault")
+        return FakeResponse(self.respond(prompt))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        fails, latency = self._draw()
+        if fails:
+            await asyncio.sleep(latency)
+            raise google_exceptions.ServiceUnavailable("injected fault")
+        if stream:
+            return FakeStream(self.respond(prompt), latency, self.chunk_size)
+        await asyncio.sleep(latency)
+        return FakeResponse(self.respond(prompt))
+
+
+class SlowCollection:
+    """Motor-like collection adding a network round trip to every write command.
+
+    `latency` is paid per command plus `per_op` per write in a bulk; while
+    `client.down` is set every command fails like an unreachable server.
+    """
+
+    def __init__(self, client: "SlowMongoClient", collection):
+        self._client = client
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def _round_trip(self, ops: int = 1):
+        await asyncio.sleep(self._client.latency + self._client.per_op * ops)
+        if self._client.down:
+            raise AutoReconnect("injected outage")
+        self._client.commands += 1
+
+    async def insert_one(self, document, **kwargs):
+        await self._round_trip()
+        return await self._collection.insert_one(document, **kwargs)
+
+    async def update_one(self, filter, update, **kwargs):
+        await self._round_trip()
+        return await self._collection.update_one(filter, update, **kwargs)
+
+    async def bulk_write(self, requests, **kwargs):
+        # Like the driver, reject a batch holding a document BSON can't encode before sending any of it
+        for request in requests:
+            bson.encode(request._doc)
+            bson.encode(getattr(request, "_filter", {}))
+        await self._round_trip(len(requests))
+        # mongomock's bulk_write lags behind pymongo's request classes, so
+        # apply the requests one at a time as the server would, in order
+        for request in requests:
+            if isinstance(request, InsertOne):
+                await self._collection.insert_one(request._doc)
+            else:
+                await self._collection.update_one(request._filter, request._doc, upsert=request._upsert)
+
+
+class SlowDatabase:
+    def __init__(self, client: "SlowMongoClient", database):
+        self._client = client
+        self._database = database
+
+    def __getitem__(self, name):
+        return SlowCollection(self._client, self._database[name])
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+
+class SlowMongoClient:
+    """Wraps an AsyncMongoMockClient so writes cost a simulated round trip."""
+
+    def __init__(self, client, latency: float = 0.002, per_op: float = 0.00002):
+        self._client = client
+        self.latency = latency
+        self.per_op = per_op
+        self.down = False
+        self.commands = 0
+
+    def __getitem__(self, name):
+        return SlowDatabase(self, self._client[name])
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,29 @@
+"""The API with a stub model and an in-memory Mongo, for multi-worker load tests.
+
+    STUB_LATENCY=0.05 STUB_CPU_SECONDS=0.005 uvicorn benchmarks.stub_app:app --workers 4
+
+Each worker process gets its own FakeModel and mongomock database.
+"""
+import os
+
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import llm
+from benchmarks.fakes import FakeModel, SlowMongoClient
+from db import mongodb
+
+
+def respond(prompt: str) -> str:
+    if "identification agent" in prompt:
+        return '{"customer_type": "new", "customer_info": {"name": "Load Test", "email": "load@example.com", "phone": "+10000000000"}}'
+    return '{"response": "Thanks for asking! Our plans start at $10 a month.", "reason": "Pricing question"}'
+
+llm.set_model(FakeModel(
+    latency=float(os.getenv("STUB_LATENCY", "0.05")),
+    respond=respond,
+    cpu_seconds=float(os.getenv("STUB_CPU_SECONDS", "0.005")),
+))
+# mongomock's bulk_write can't take the write-behind queue's requests; the wrapper applies them
+mongodb._async_client = SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0)
+
+from main import app  # noqa: E402  (the stubs must be in place first)
@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+def estimate_size(value: Any) -> int:
+    """Rough in-memory footprint of a Mongo document, dominated by its strings."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return 16
+
+
+class BusinessCache:
+    """LRU cache of business records bounded by total size and entry age."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[dict, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    def get(self, business_id: str) -> Optional[dict]:
+        entry = self._entries.get(business_id)
+        if entry is None or time.monotonic() - entry[2] > self.ttl_seconds:
+            if entry is not None:
+                self.invalidate(business_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(business_id)
+        self.hits += 1
+        return entry[0]
+
+    def age(self, business_id: str) -> Optional[float]:
+        entry = self._entries.get(business_id)
+        return time.monotonic() - entry[2] if entry else None
+
+    def touch(self, business_id: str):
+        """Mark an entry as freshly validated without refetching it."""
+        entry = self._entries.get(business_id)
+        if entry:
+            self._entries[business_id] = (entry[0], entry[1], time.monotonic())
+
+    def put(self, business_id: str, doc: dict):
+        self.invalidate(business_id)
+        size = estimate_size(doc)
+        if size > self.max_bytes:
+            return
+        self._entries[business_id] = (doc, size, time.monotonic())
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, business_id: str):
+        entry = self._entries.pop(business_id, None)
+        if entry:
+            self._bytes -= entry[1]
+
+    def invalidate_matching(self, predicate):
+        for business_id in [key for key, entry in self._entries.items() if predicate(entry[0])]:
+            self.invalidate(business_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,29 +1,296 @@
+import asyncio
+import base64
+import json
+import logging
 import os
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
 
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient
 
+from agents.metrics import MongoCommandMetrics
+from db.cache import BusinessCache
 
-def get_mongo_client():
-    load_dotenv()
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DB_NAME = "turiniq"
+
+# One client per process; both drivers keep their own connection pool.
+_client: Optional[MongoClient] = None
+_async_client: Optional[AsyncIOMotorClient] = None
+
+business_cache = BusinessCache(
+    max_bytes=int(os.getenv("BUSINESS_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("BUSINESS_CACHE_TTL_SECONDS", "300")),
+)
+# Entries older than this re-check the record's version field before being served
+BUSINESS_CACHE_REVALIDATE_SECONDS = float(os.getenv("BUSINESS_CACHE_REVALIDATE_SECONDS", "30"))
+
+
+def _mongo_uri() -> str:
     uri = os.getenv("MONGODB_URI")
     if not uri:
         raise ValueError("MONGODB_URI not found in .env")
-    return MongoClient(uri)
+    return uri
+
+def _pool_options() -> dict:
+    """Connection pool settings, overridable through the environment."""
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "10000")),
+        # Feeds turiniq_mongo_command_seconds on /metrics
+        "event_listeners": [MongoCommandMetrics()],
+    }
+
+def get_mongo_client() -> MongoClient:
+    """Return the shared synchronous client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = MongoClient(_mongo_uri(), **_pool_options())
+    return _client
+
+def get_async_mongo_client() -> AsyncIOMotorClient:
+    """Return the shared async (Motor) client, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncIOMotorClient(_mongo_uri(), **_pool_options())
+    return _async_client
 
-def save_business_data(business_id: str, knowledge_base: str, context_prompt: str):
-    client = get_mongo_client()
-    db = client["turiniq"]
-    collection = db["business_data"]
-    collection.update_one(
+def get_async_db() -> AsyncIOMotorDatabase:
+    return get_async_mongo_client()[DB_NAME]
+
+async def connect_mongo():
+    """Create the shared client at startup and verify the deployment is reachable."""
+    await get_async_mongo_client().admin.command("ping")
+    await ensure_indexes()
+
+async def ensure_indexes():
+    db = get_async_db()
+    await db["knowledge_chunks"].create_index([("business_id", ASCENDING), ("index", ASCENDING)])
+    # Leads written before per-session upserts have no session_id
+    await db["leads"].create_index("session_id", unique=True, sparse=True)
+    await db["classifier_models"].create_index("business_id", unique=True)
+    await db["agent_jobs"].create_index("job_id", unique=True)
+    # One queued and one running configure job per business, across worker processes
+    await db["agent_jobs"].create_index(
+        [("business_id", ASCENDING), ("status", ASCENDING)], unique=True, partialFilterExpression={"active": True}
+    )
+    await db["agent_jobs"].create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    # Back the paginated /tickets and /leads queries (newest first, optional status filter)
+    for name in ("tickets", "leads"):
+        await db[name].create_index([("business_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+        await db[name].create_index([("business_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+
+def close_mongo():
+    """Close the shared clients at shutdown."""
+    global _client, _async_client
+    if _async_client is not None:
+        _async_client.close()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
+
+async def save_business_data(
+    business_id: str,
+    knowledge_base: str,
+    context_prompt: str,
+    settings: Optional[dict] = None,
+    sources: Optional[dict] = None,
+    context_inputs_hash: Optional[str] = None,
+    prompt_templates: Optional[dict] = None
+):
+    collection = get_async_db()["business_data"]
+    fields = {"knowledge_base": knowledge_base, "context_prompt": context_prompt}
+    if settings is not None:
+        fields["settings"] = settings
+    if prompt_templates is not None:
+        # Compiled support/sales instructions, versioned by their digest
+        fields["prompt_templates"] = prompt_templates
+    if sources is not None:
+        # Per-source fingerprints and summaries, reused by the next /configure-agent
+        fields["sources"] = sources
+        fields["context_inputs_hash"] = context_inputs_hash
+    await collection.update_one(
         {"business_id": business_id},
-        {"$set": {"knowledge_base": knowledge_base, "context_prompt": context_prompt}},
+        {
+            "$set": fields,
+            "$inc": {"version": 1},  # lets other processes detect stale cache entries
+        },
         upsert=True
     )
-    
-def get_business_data(business_id: str) -> dict:
-    client = get_mongo_client()
-    db = client["turiniq"]
-    collection = db["business_data"]
-    doc = collection.find_one({"business_id": business_id})
-    return doc if doc else {"knowledge_base": "", "context_prompt": ""}
\ No newline at end of file
+    business_cache.invalidate(business_id)
+
+async def get_business_sources(business_id: str) -> dict:
+    """Return the source fingerprints, context inputs hash and context of the last configuration."""
+    collection = get_async_db()["business_data"]
+    doc = await collection.find_one(
+        {"business_id": business_id},
+        {"_id": 0, "sources": 1, "context_inputs_hash": 1, "context_prompt": 1}
+    )
+    return doc or {}
+
+async def get_business_data(business_id: str) -> dict:
+    """Return the business record, served from the in-process cache when fresh.
+
+    The returned dict is shared with the cache and must not be mutated.
+    """
+    collection = get_async_db()["business_data"]
+    # Turns retrieve knowledge base chunks instead, so skip the large blobs
+    projection = {"knowledge_base": 0, "sources": 0}
+    doc = business_cache.get(business_id)
+    if doc is not None and business_cache.age(business_id) > BUSINESS_CACHE_REVALIDATE_SECONDS:
+        current = await collection.find_one({"business_id": business_id}, {"version": 1})
+        if (current or {}).get("version") == doc.get("version"):
+            business_cache.touch(business_id)
+        else:
+            business_cache.invalidate(business_id)
+            business_cache.stale += 1
+            doc = None
+    if doc is None:
+        doc = await collection.find_one({"business_id": business_id}, projection)
+        if not doc:
+            return {"knowledge_base": "", "context_prompt": ""}
+        business_cache.put(business_id, doc)
+    return doc
+
+async def watch_business_changes():
+    """Invalidate cached records as soon as any process writes them.
+
+    Requires a replica set (change streams); start it with
+    BUSINESS_CACHE_CHANGE_STREAM=1. Without it, version revalidation applies.
+    """
+    collection = get_async_db()["business_data"]
+    try:
+        async with collection.watch() as stream:
+            async for change in stream:
+                document_id = change.get("documentKey", {}).get("_id")
+                business_cache.invalidate_matching(lambda doc: doc.get("_id") == document_id)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Business change stream stopped: %s", e)
+
+async def save_knowledge_chunks(business_id: str, chunks: List[str], embeddings: Optional[List[List[float]]] = None):
+    """Replace the business's indexed knowledge base chunks."""
+    collection = get_async_db()["knowledge_chunks"]
+    await collection.delete_many({"business_id": business_id})
+    docs = [
+        {"business_id": business_id, "index": i, "text": chunk, **({"embedding": embeddings[i]} if embeddings else {})}
+        for i, chunk in enumerate(chunks)
+    ]
+    if docs:
+        await collection.insert_many(docs)
+
+async def backfill_knowledge_chunks(business_id: str, chunks: List[str]):
+    """Store chunks for a business configured before knowledge bases were chunked.
+
+    Upserts keyed on the chunk index, so workers backfilling the same
+    business at once write each chunk once instead of stacking copies.
+    """
+    collection = get_async_db()["knowledge_chunks"]
+    for i, chunk in enumerate(chunks):
+        await collection.update_one(
+            {"business_id": business_id, "index": i},
+            {"$setOnInsert": {"text": chunk}},
+            upsert=True
+        )
+
+async def get_knowledge_base(business_id: str) -> str:
+    """Return the business's whole stored knowledge base text."""
+    doc = await get_async_db()["business_data"].find_one({"business_id": business_id}, {"_id": 0, "knowledge_base": 1})
+    return (doc or {}).get("knowledge_base") or ""
+
+async def get_knowledge_chunks(business_id: str) -> List[dict]:
+    collection = get_async_db()["knowledge_chunks"]
+    return await collection.find({"business_id": business_id}, {"_id": 0, "text": 1, "embedding": 1}).sort("index", ASCENDING).to_list(length=None)
+
+async def get_classifier_model(business_id: str) -> Optional[dict]:
+    """Return the business's customer classifier weights from scripts.train_classifier, if any."""
+    collection = get_async_db()["classifier_models"]
+    return await collection.find_one({"business_id": business_id}, {"_id": 0, "buckets": 1, "weights": 1, "bias": 1, "version": 1})
+
+def encode_cursor(doc: dict) -> str:
+    created_at = doc.get("created_at")
+    payload = {"c": created_at.isoformat() if created_at else None, "i": str(doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], ObjectId]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.fromisoformat(payload["c"]) if payload["c"] else None
+        return created_at, ObjectId(payload["i"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _records_query(
+    business_id: str,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+) -> dict:
+    query = {"business_id": business_id}
+    if status:
+        query["status"] = status
+    if created_after or created_before:
+        query["created_at"] = {}
+        if created_after:
+            query["created_at"]["$gte"] = created_after
+        if created_before:
+            query["created_at"]["$lt"] = created_before
+    return query
+
+def _records_projection(include_conversation: bool) -> Optional[dict]:
+    return None if include_conversation else {"conversation": 0}
+
+async def find_records_page(
+    collection_name: str,
+    business_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_conversation: bool = False
+) -> tuple[List[dict], Optional[str]]:
+    """One page of tickets or leads, newest first, plus the cursor for the next page."""
+    query = _records_query(business_id, status, created_after, created_before)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        after_cursor = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]}
+        query = {"$and": [query, after_cursor]}
+    docs = await get_async_db()[collection_name].find(query, _records_projection(include_conversation)) \
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    docs = docs[:limit]
+    for doc in docs:
+        doc.pop("_id", None)
+    return docs, next_cursor
+
+async def iter_records(
+    collection_name: str,
+    business_id: str,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_conversation: bool = False
+) -> AsyncIterator[dict]:
+    """Stream every matching ticket or lead without loading them all at once."""
+    query = _records_query(business_id, status, created_after, created_before)
+    projection = {"_id": 0, **(_records_projection(include_conversation) or {})}
+    cursor = get_async_db()[collection_name].find(query, projection, batch_size=500) \
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+    async for doc in cursor:
+        yield doc
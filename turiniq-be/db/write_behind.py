@@ -0,0 +1,327 @@
+import asyncio
+import fcntl
+import glob
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+import bson
+from bson import ObjectId, json_util
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, ExecutionTimeout
+
+logger = logging.getLogger(__name__)
+
+# Set WRITE_BEHIND=0 to write tickets and leads inline, as before
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+# Writers wait (backpressure) once this many writes are buffered
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+# A batch is flushed when it reaches this size or has waited this long
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "0.5"))
+WRITE_BEHIND_RETRY_ATTEMPTS = int(os.getenv("WRITE_BEHIND_RETRY_ATTEMPTS", "5"))
+WRITE_BEHIND_RETRY_MAX_SECONDS = float(os.getenv("WRITE_BEHIND_RETRY_MAX_SECONDS", "10"))
+WRITE_BEHIND_SHUTDOWN_SECONDS = float(os.getenv("WRITE_BEHIND_SHUTDOWN_SECONDS", "10"))
+# Batches that still fail after the retries are appended here and replayed on
+# startup; empty disables spilling (the writes are dropped and logged)
+WRITE_BEHIND_SPILL_DIR = os.getenv("WRITE_BEHIND_SPILL_DIR", os.path.join(tempfile.gettempdir(), "turiniq-write-behind"))
+
+RETRYABLE_ERRORS = (ConnectionFailure, ExecutionTimeout)
+DUPLICATE_KEY = 11000
+
+
+def insert_record(collection: str, document: dict) -> dict:
+    # A fixed _id makes a retried insert detectable as a duplicate
+    return {"collection": collection, "op": "insert", "document": {"_id": ObjectId(), **document}}
+
+def update_record(collection: str, filter: dict, update: dict, upsert: bool = False) -> dict:
+    return {"collection": collection, "op": "update", "filter": filter, "update": update, "upsert": upsert}
+
+def _encodes(record: dict) -> bool:
+    """Whether the driver can BSON-encode the record (e.g. no lone surrogates in its strings)."""
+    try:
+        if record["op"] == "insert":
+            bson.encode(record["document"])
+        else:
+            bson.encode(record["filter"])
+            bson.encode(record["update"])
+    except Exception:
+        return False
+    return True
+
+def _to_request(record: dict):
+    if record["op"] == "insert":
+        return InsertOne(record["document"])
+    return UpdateOne(record["filter"], record["update"], upsert=record["upsert"])
+
+
+class SpillFile:
+    """Append-only JSONL file of writes that could not reach MongoDB.
+
+    Each process writes its own file and holds an exclusive lock on it while
+    alive, so replay only picks up files of processes that have exited.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"spill-{os.getpid()}-{time.time_ns()}.jsonl")
+        self._file = None
+
+    def append(self, records: List[dict]):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._file.write("".join(json_util.dumps(record) + "\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def orphans(self) -> List[str]:
+        """Spill files not locked by a live process, oldest first."""
+        paths = sorted(glob.glob(os.path.join(self.directory, "spill-*.jsonl")), key=os.path.getmtime)
+        return [path for path in paths if not (self._file is not None and path == self.path)]
+
+
+class WriteBehindStats:
+    def __init__(self):
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.blocked_enqueues = 0
+        self.blocked_seconds = 0.0
+
+    def summary(self, queue_depth: int) -> dict:
+        return {
+            "queue_depth": queue_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "writes_per_batch": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "retries": self.retries,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "blocked_enqueues": self.blocked_enqueues,
+            "blocked_seconds": round(self.blocked_seconds, 3),
+        }
+
+
+class WriteBehindQueue:
+    """Buffers ticket and lead writes from all sessions and flushes them in bulk.
+
+    One flusher task groups buffered writes by collection and applies them
+    with an ordered bulk_write, so a session's lead updates land in order.
+    Failed batches are retried with backoff; while the flusher retries the
+    buffer fills and writers wait. Until start() is called (scripts, tests)
+    or with WRITE_BEHIND=0, writes go straight to the database.
+    """
+
+    def __init__(self, enabled: bool = WRITE_BEHIND, spill_dir: Optional[str] = WRITE_BEHIND_SPILL_DIR):
+        self.enabled = enabled
+        self.spill = SpillFile(spill_dir) if spill_dir else None
+        self.stats = WriteBehindStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def _collection(self, name: str):
+        from db.mongodb import get_async_db
+        return get_async_db()[name]
+
+    async def start(self):
+        await self.replay()
+        if not self.enabled:
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=WRITE_BEHIND_MAX_QUEUE)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything buffered; whatever can't be written in time is spilled."""
+        if self._task is None:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._queue.join(), WRITE_BEHIND_SHUTDOWN_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error("Write-behind flush timed out with %d writes buffered", self._queue.qsize())
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        leftover = []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        if leftover:
+            await self._spill(leftover)
+        if self.spill:
+            self.spill.close()
+
+    async def insert(self, collection: str, document: dict):
+        await self._enqueue(insert_record(collection, document))
+
+    async def update(self, collection: str, filter: dict, update: dict, upsert: bool = False):
+        await self._enqueue(update_record(collection, filter, update, upsert))
+
+    async def _enqueue(self, record: dict):
+        if self._task is None:
+            await self._collection(record["collection"]).bulk_write([_to_request(record)])
+            return
+        self.stats.enqueued += 1
+        if self._queue.full():
+            self.stats.blocked_enqueues += 1
+            started = time.perf_counter()
+            await self._queue.put(record)
+            self.stats.blocked_seconds += time.perf_counter() - started
+        else:
+            self._queue.put_nowait(record)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            flush_at = loop.time() + WRITE_BEHIND_FLUSH_SECONDS
+            while len(batch) < WRITE_BEHIND_BATCH_SIZE:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = flush_at - loop.time()
+                if remaining <= 0 or self._stopping:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logger.error("Write-behind flush failed: %s", e)
+                await self._spill(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[dict]):
+        self.stats.batches += 1
+        by_collection = {}
+        for record in batch:
+            by_collection.setdefault(record["collection"], []).append(record)
+        for collection, records in by_collection.items():
+            unwritten = await self._write(collection, records, retry=True)
+            if unwritten:
+                await self._spill(unwritten)
+
+    async def _write(self, collection: str, records: List[dict], retry: bool) -> List[dict]:
+        """Apply the records in order; returns those left unwritten when MongoDB stays unreachable.
+
+        A write rejected by the server (other than a retried insert that had
+        already landed) or by the driver before sending is logged and dropped
+        so it can't block the ones behind it.
+        """
+        attempt = 0
+        while records:
+            try:
+                await self._collection(collection).bulk_write([_to_request(record) for record in records], ordered=True)
+                self.stats.written += len(records)
+                return []
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors") or []
+                if not errors:
+                    # Only the write concern failed; the writes were applied
+                    self.stats.written += len(records)
+                    return []
+                index, error = errors[0]["index"], errors[0]
+                duplicate = error.get("code") == DUPLICATE_KEY and records[index]["op"] == "insert"
+                if not duplicate:
+                    logger.error("Dropping %s write rejected by MongoDB: %s", collection, error.get("errmsg"))
+                    self.stats.dropped += 1
+                self.stats.written += index + duplicate
+                records = records[index + 1:]
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                if not retry or self._stopping or attempt >= WRITE_BEHIND_RETRY_ATTEMPTS:
+                    logger.error("Giving up on %d %s writes after %d attempts: %s", len(records), collection, attempt, e)
+                    return records
+                self.stats.retries += 1
+                await asyncio.sleep(random.uniform(0, min(WRITE_BEHIND_RETRY_MAX_SECONDS, 0.25 * 2 ** attempt)))
+            except Exception as e:
+                # The driver encodes the whole batch before sending it, so nothing was written
+                encodable = [record for record in records if _encodes(record)]
+                if len(encodable) == len(records):
+                    raise
+                logger.error("Dropping %d %s writes the driver can't encode: %s", len(records) - len(encodable), collection, e)
+                self.stats.dropped += len(records) - len(encodable)
+                records = encodable
+        return []
+
+    async def _spill(self, records: List[dict]):
+        if not self.spill:
+            logger.error("Dropping %d writes: MongoDB unavailable and spilling is disabled", len(records))
+            self.stats.dropped += len(records)
+            return
+        await asyncio.to_thread(self.spill.append, records)
+        self.stats.spilled += len(records)
+        logger.warning("Spilled %d writes to %s", len(records), self.spill.path)
+
+    async def replay(self):
+        """Write back the spill files left by processes that have exited."""
+        if not self.spill:
+            return
+        for path in self.spill.orphans():
+            try:
+                await self._replay_file(path)
+            except Exception as e:
+                # Leave the file for a later start rather than blocking this one
+                logger.error("Failed to replay spilled writes from %s: %s", path, e)
+
+    async def _replay_file(self, path: str):
+        try:
+            f = open(path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return  # another worker starting up replayed it first
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # a live worker's file, or another worker replaying it
+            try:
+                unlinked = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                unlinked = True
+            if unlinked:
+                return  # replayed and removed while we waited for the lock
+            records = [json_util.loads(line) for line in f if line.strip()]
+            # Keep per-collection order, as when the writes were first batched
+            by_collection = {}
+            for record in records:
+                by_collection.setdefault(record["collection"], []).append(record)
+            unwritten = []
+            for collection, group in by_collection.items():
+                unwritten += await self._write(collection, group, retry=False)
+            if unwritten:
+                # Keep only what is still missing, so nothing is applied twice
+                logger.error("Could not replay %d writes from %s; keeping them for the next start", len(unwritten), path)
+                f.seek(0)
+                f.truncate()
+                f.write("".join(json_util.dumps(record) + "\n" for record in unwritten))
+            else:
+                os.unlink(path)
+        self.stats.replayed += len(records) - len(unwritten)
+        logger.info("Replayed %d spilled writes from %s", len(records) - len(unwritten), path)
+
+    def summary(self) -> dict:
+        return self.stats.summary(self._queue.qsize() if self._queue else 0)
+
+
+write_behind = WriteBehindQueue()
@@ -0,0 +1,37 @@
+"""Gunicorn settings and hooks, loaded by the Procfile.
+
+Several workers need SESSION_STORE=mongo: with the in-memory store a
+reconnecting websocket can land on a worker that never saw its session.
+So the default is one worker unless sessions are in Mongo, and startup
+fails when more are asked for with the memory store. With several
+workers, metrics go through Prometheus multiprocess mode so /metrics
+adds up every worker's counters, not whichever worker answered.
+"""
+import glob
+import os
+import tempfile
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+
+workers = int(os.getenv("WEB_CONCURRENCY", "2" if SESSION_STORE == "mongo" else "1"))
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+
+def on_starting(server):
+    if server.cfg.workers <= 1:
+        return
+    if SESSION_STORE != "mongo":
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need SESSION_STORE=mongo; the memory store only resumes sessions on the worker that holds them"
+        )
+    # Set before the workers import prometheus_client, and emptied of a previous run's files
+    directory = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "turiniq-prometheus"))
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
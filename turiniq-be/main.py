@@ -1,3 +1,7 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,8 +9,32 @@ from fastapi.staticfiles import StaticFiles
 
 from api.endpoints import \
     router as endpoints_router  # Import from api/endpoints.py
+from agents.jobs import configure_jobs
+from agents.session_store import get_session_store
+from db.mongodb import close_mongo, connect_mongo, watch_business_changes
+from db.write_behind import write_behind
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Share one pooled MongoDB client across all requests in this process
+    await connect_mongo()
+    await get_session_store().ensure_indexes()
+    # Replays writes spilled while MongoDB was unreachable
+    await write_behind.start()
+    watcher = None
+    if os.getenv("BUSINESS_CACHE_CHANGE_STREAM") == "1":
+        watcher = asyncio.create_task(watch_business_changes())
+    await configure_jobs.start()
+    yield
+    await configure_jobs.stop()
+    # Flush buffered tickets and leads before the client goes away
+    await write_behind.stop()
+    if watcher:
+        watcher.cancel()
+    close_mongo()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -33,4 +61,15 @@ app.add_middleware(
 app.include_router(endpoints_router)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    from agents.session_guard import (WS_MAX_FRAME_BYTES,
+                                      WS_PING_INTERVAL_SECONDS,
+                                      WS_PING_TIMEOUT_SECONDS)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        # Drops connections whose client stopped answering pings (closed laptops, dead networks)
+        ws_ping_interval=WS_PING_INTERVAL_SECONDS,
+        ws_ping_timeout=WS_PING_TIMEOUT_SECONDS,
+        ws_max_size=WS_MAX_FRAME_BYTES,
+    )
\ No newline at end of file
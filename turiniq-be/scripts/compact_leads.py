@@ -0,0 +1,82 @@
+"""Collapse the near-duplicate leads written before per-session upserts.
+
+The sales agent used to insert a new lead after every turn, each holding the
+whole conversation so far. Those documents form chains per customer whose
+conversations share a first message and only grow. This keeps the longest
+document of each chain, gives it a session_id, and deletes the rest.
+
+    python -m scripts.compact_leads --dry-run
+    python -m scripts.compact_leads [--business-id ID]
+"""
+import argparse
+from typing import Optional
+
+from pymongo import ASCENDING, DeleteMany, UpdateOne
+
+from db.mongodb import DB_NAME, get_mongo_client
+
+
+def _chains(collection, business_id: Optional[str]):
+    """Yield lists of legacy leads that belong to one conversation, oldest first."""
+    match = {"session_id": {"$exists": False}}
+    if business_id:
+        match["business_id"] = business_id
+    key_fields = ["business_id", "customer_email", "customer_name", "customer_phone"]
+    pipeline = [
+        {"$match": match},
+        {"$project": {
+            **{field: 1 for field in key_fields},
+            "created_at": 1,
+            "first_message": {"$first": "$conversation"},
+            "length": {"$size": {"$ifNull": ["$conversation", []]}},
+        }},
+        {"$sort": {**{field: ASCENDING for field in key_fields}, "created_at": ASCENDING}},
+    ]
+    chain, chain_key = [], None
+    for doc in collection.aggregate(pipeline, allowDiskUse=True):
+        key = tuple(doc.get(field) for field in key_fields) + (doc.get("first_message"),)
+        if chain and (key != chain_key or doc["length"] < chain[-1]["length"]):
+            yield chain
+            chain = []
+        chain.append(doc)
+        chain_key = key
+    if chain:
+        yield chain
+
+def compact(business_id: Optional[str] = None, dry_run: bool = False, batch_size: int = 500) -> dict:
+    collection = get_mongo_client()[DB_NAME]["leads"]
+    stats = {"chains": 0, "kept": 0, "deleted": 0}
+    operations = []
+    for chain in _chains(collection, business_id):
+        stats["chains"] += 1
+        stats["kept"] += 1
+        keep, duplicates = chain[-1], chain[:-1]
+        stats["deleted"] += len(duplicates)
+        operations.append(UpdateOne(
+            {"_id": keep["_id"]},
+            {"$set": {
+                "session_id": f"legacy-{chain[0]['_id']}",
+                "created_at": chain[0].get("created_at"),
+                "updated_at": keep.get("created_at"),
+            }},
+        ))
+        if duplicates:
+            operations.append(DeleteMany({"_id": {"$in": [doc["_id"] for doc in duplicates]}}))
+        if len(operations) >= batch_size and not dry_run:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations and not dry_run:
+        collection.bulk_write(operations, ordered=False)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--business-id")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+    stats = compact(args.business_id, args.dry_run)
+    prefix = "Would keep" if args.dry_run else "Kept"
+    print(f"{prefix} {stats['kept']} leads across {stats['chains']} conversations, removing {stats['deleted']} duplicates")
+
+if __name__ == "__main__":
+    main()
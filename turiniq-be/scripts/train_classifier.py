@@ -0,0 +1,97 @@
+"""Train the per-business customer classifier from past conversations.
+
+The opening message of every ticket is an example of an existing customer,
+that of every lead an example of a new one. A hashed n-gram logistic
+regression is fitted per business, checked on a held-out fifth of the
+examples, and stored in `classifier_models`, where identify_customer picks
+it up (within IDENTIFY_MODEL_CACHE_SECONDS).
+
+    python -m scripts.train_classifier --dry-run
+    python -m scripts.train_classifier [--business-id ID] [--min-examples 50]
+"""
+import argparse
+import random
+from datetime import datetime
+from typing import Optional
+
+from agents.customer_classifier import MODEL_CONFIDENCE, HashedNgramModel
+from db.mongodb import DB_NAME, get_mongo_client
+
+
+def _first_messages(collection, business_id: Optional[str]):
+    """Yield (business_id, opening user message) for each record."""
+    match = {"business_id": business_id} if business_id else {}
+    for doc in collection.find(match, {"business_id": 1, "conversation": {"$slice": 1}}):
+        conversation = doc.get("conversation") or []
+        message = conversation[0].get("user") if conversation else None
+        if message:
+            yield doc["business_id"], message
+
+def _examples(db, business_id: Optional[str]) -> dict:
+    examples = {}
+    for collection, label in (("tickets", 1), ("leads", 0)):
+        for business, message in _first_messages(db[collection], business_id):
+            examples.setdefault(business, []).append((message, label))
+    return examples
+
+def evaluate(model: HashedNgramModel, holdout: list) -> dict:
+    """Accuracy overall, and coverage/accuracy of the confident predictions the agent acts on."""
+    correct = confident = confident_correct = 0
+    for message, label in holdout:
+        probability = model.predict(message)
+        correct += (probability >= 0.5) == bool(label)
+        if probability >= MODEL_CONFIDENCE or probability <= 1 - MODEL_CONFIDENCE:
+            confident += 1
+            confident_correct += (probability >= 0.5) == bool(label)
+    return {
+        "accuracy": round(correct / len(holdout), 3) if holdout else None,
+        "confident_share": round(confident / len(holdout), 3) if holdout else None,
+        "confident_accuracy": round(confident_correct / confident, 3) if confident else None,
+    }
+
+def train(business_id: Optional[str] = None, min_examples: int = 50, dry_run: bool = False, seed: int = 0) -> dict:
+    db = get_mongo_client()[DB_NAME]
+    results = {}
+    for business, examples in _examples(db, business_id).items():
+        labels = {label for _, label in examples}
+        if len(examples) < min_examples or len(labels) < 2:
+            results[business] = {"examples": len(examples), "skipped": "not enough examples of both kinds"}
+            continue
+        random.Random(seed).shuffle(examples)
+        split = len(examples) // 5
+        holdout, training = examples[:split], examples[split:]
+        report = {"examples": len(examples), **evaluate(HashedNgramModel.train(training, seed=seed), holdout)}
+        results[business] = report
+        if dry_run:
+            continue
+        # The stored model learns from every example
+        model = HashedNgramModel.train(examples, seed=seed)
+        db["classifier_models"].update_one(
+            {"business_id": business},
+            {
+                "$set": {**model.to_document(), **report, "trained_at": datetime.utcnow()},
+                "$inc": {"version": 1},
+            },
+            upsert=True
+        )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--business-id")
+    parser.add_argument("--min-examples", type=int, default=50)
+    parser.add_argument("--dry-run", action="store_true", help="report holdout accuracy without saving models")
+    args = parser.parse_args()
+    results = train(args.business_id, args.min_examples, args.dry_run)
+    prefix = "Would save" if args.dry_run else "Saved"
+    for business, report in results.items():
+        if "skipped" in report:
+            print(f"{business}: skipped, {report['examples']} examples")
+        else:
+            print(
+                f"{business}: {prefix} model from {report['examples']} examples, holdout accuracy {report['accuracy']}, "
+                f"confident on {report['confident_share']} with accuracy {report['confident_accuracy']}"
+            )
+
+if __name__ == "__main__":
+    main()
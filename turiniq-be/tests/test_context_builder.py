@@ -0,0 +1,30 @@
+import asyncio
+
+from agents.context_builder import build_context
+from api.endpoints import BusinessInput
+from benchmarks.fakes import FakeModel
+
+
+def business_input(domain: str) -> BusinessInput:
+    return BusinessInput(
+        business_type="retail",
+        domain=domain,
+        agent_goal="Provide Customer Support",
+        tonality="friendly",
+        communication_style=["Keep answers concise"],
+        context_clarity=[],
+        handover_escalation=["Escalate refund requests"],
+        data_to_capture=["name", "email"],
+        custom_opening_message="Hi there!",
+    )
+
+def test_builds_context_for_a_domain_without_scheme():
+    prompts = []
+    model = FakeModel(0.0, respond=lambda prompt: prompts.append(prompt) or "Context for Acme")
+
+    context = asyncio.run(build_context(business_input("acme.com"), "Acme sells tents.", model))
+
+    assert context == "Context for Acme"
+    assert "Domain: acme.com" in prompts[0]
+    assert "Communication Style: Keep answers concise" in prompts[0]
+    assert "Data to Capture: name, email" in prompts[0]
@@ -0,0 +1,66 @@
+import asyncio
+import http.server
+import threading
+
+from agents.crawler import Crawler, HttpCache
+
+PAGES = {
+    "/": "<html><head><title>Home</title></head><body><a href='docs/'>Docs</a>"
+         "<a href='http://{alias}/pricing'>Pricing</a></body></html>",
+    "/docs/": "<html><head><title>Docs</title></head><body><a href='intro'>Intro</a></body></html>",
+    "/docs/intro": "<html><head><title>Intro</title></head><body>Getting started</body></html>",
+    "/pricing": "<html><head><title>Pricing</title></head><body>Plans</body></html>",
+}
+
+
+def serve_redirecting_site() -> tuple[str, str]:
+    """Serve PAGES on localhost; requests to 127.0.0.1 redirect there, like example.com to www."""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            host, port = self.headers["Host"].split(":")
+            if host == "127.0.0.1":
+                self.send_response(301)
+                self.send_header("Location", f"http://localhost:{port}/docs/" if self.path == "/start" else f"http://localhost:{port}{self.path}")
+                self.end_headers()
+                return
+            body = PAGES.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = body.format(alias=f"127.0.0.1:{port}").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"127.0.0.1:{server.server_port}", f"localhost:{server.server_port}"
+
+
+def test_crawl_follows_the_redirected_host(tmp_path):
+    alias, canonical = serve_redirecting_site()
+    crawler = Crawler(max_pages=10, max_depth=3, concurrency=2, cache=HttpCache(str(tmp_path)))
+    pages = asyncio.run(crawler.crawl(f"http://{alias}/"))
+
+    assert [page.url for page in pages] == [
+        f"http://{canonical}/",
+        f"http://{canonical}/docs/",
+        f"http://{canonical}/pricing",
+        f"http://{canonical}/docs/intro",
+    ]
+
+
+def test_relative_links_resolve_against_the_final_url(tmp_path):
+    alias, canonical = serve_redirecting_site()
+    crawler = Crawler(max_pages=10, max_depth=1, concurrency=2, cache=HttpCache(str(tmp_path)))
+    pages = asyncio.run(crawler.crawl(f"http://{alias}/start"))
+
+    # /start lands on /docs/, so 'intro' is /docs/intro rather than /intro
+    assert [page.url for page in pages] == [f"http://{canonical}/docs/", f"http://{canonical}/docs/intro"]
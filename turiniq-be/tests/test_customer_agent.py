@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from fastapi import WebSocketDisconnect
+
+from agents import customer_agent
+from agents.response_cache import response_cache
+from agents.session_store import InMemorySessionStore, Session
+from benchmarks.fakes import FakeModel
+
+
+class FakeWebSocket:
+    def __init__(self, *messages: str):
+        self.incoming = list(messages)
+        self.sent = []
+
+    async def receive_text(self) -> str:
+        if not self.incoming:
+            raise WebSocketDisconnect()
+        return self.incoming.pop(0)
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+
+
+def support_turn(monkeypatch, raw: str, stream: bool) -> tuple[list, Session]:
+    """Run one support turn whose model output is `raw`; returns (sent messages, session)."""
+    async def business_data(business_id):
+        return {"version": 1, "settings": {}, "context_prompt": "Acme sells tents."}
+
+    async def no_snippets(*args):
+        return []
+
+    async def same_model(instructions, model):
+        return model
+
+    async def model_output(*args, **kwargs):
+        for i in range(0, len(raw), 4):
+            yield raw[i:i + 4]
+
+    monkeypatch.setattr(customer_agent, "get_business_data", business_data)
+    monkeypatch.setattr(customer_agent, "retrieve_snippets", no_snippets)
+    monkeypatch.setattr(customer_agent, "model_with_instructions", same_model)
+    monkeypatch.setattr(customer_agent, "generate_stream", model_output)
+    model = FakeModel(0.0, respond=lambda prompt: raw)
+    monkeypatch.setattr(customer_agent, "generate", lambda prompt, *args, **kwargs: model.generate_content_async(prompt))
+    monkeypatch.setattr(response_cache, "enabled", False)
+
+    async def scenario():
+        store = InMemorySessionStore()
+        data = {"session_id": "s1", "business_id": "acme", "agent": "support", "customer_info": {}, "conversation": []}
+        await store.create(data)
+        session = Session(store, data)
+        websocket = FakeWebSocket("Where is my order?")
+        await customer_agent.handle_support_agent(websocket, session, model, stream=stream)
+        return websocket.sent, session
+
+    return asyncio.run(scenario())
+
+def agent_messages(session: Session) -> list:
+    return [message.text for message in session.conversation if message.role == customer_agent.Role.AGENT]
+
+
+def test_streamed_reply_without_text_sends_the_fallback(monkeypatch):
+    for raw in ('{"escalate": false, "reason": "", "response": ""}', '{"escalate": false}', "I can't answer that"):
+        sent, session = support_turn(monkeypatch, raw, stream=True)
+
+        frames = [json.loads(frame) for frame in sent]
+        assert [frame["type"] for frame in frames] == ["start", "chunk", "end"]
+        assert frames[1]["text"] == frames[2]["text"] == customer_agent.SUPPORT_FALLBACK_REPLY
+        assert agent_messages(session) == [customer_agent.SUPPORT_FALLBACK_REPLY]
+
+def test_streamed_reply_is_forwarded_and_stored(monkeypatch):
+    sent, session = support_turn(monkeypatch, '{"escalate": false, "reason": "", "response": "It ships today."}', stream=True)
+
+    assert json.loads(sent[-1])["text"] == "It ships today."
+    assert agent_messages(session) == ["It ships today."]
+
+def test_malformed_reply_without_streaming_sends_the_fallback(monkeypatch):
+    sent, session = support_turn(monkeypatch, "I can't answer that", stream=False)
+
+    assert sent == [customer_agent.SUPPORT_FALLBACK_REPLY]
+    assert agent_messages(session) == [customer_agent.SUPPORT_FALLBACK_REPLY]
@@ -0,0 +1,46 @@
+import pytest
+
+from agents.customer_details import extract_details
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("My name is Grace Hopper and my email is grace@navy.mil", {"name": "Grace Hopper", "email": "grace@navy.mil"}),
+    ("name: Linus", {"name": "Linus"}),
+    ("call me Dennis, 555-0100-222", {"name": "Dennis", "phone": "5550100222"}),
+    ("+1 555 010 0199", {"phone": "+15550100199"}),
+    ("reach me at (020) 7946 0958", {"phone": "02079460958"}),
+    ("+44 (20) 7946-0958", {"phone": "+442079460958"}),
+    ("my number is 5550104444", {"phone": "5550104444"}),
+])
+def test_extracts_explicit_details(message, expected):
+    assert extract_details(message) == expected
+
+@pytest.mark.parametrize("message", [
+    "I'm having trouble with checkout",
+    "Its too expensive",
+    "it's not working",
+    "this is taking forever",
+    "I am looking for a tent",
+    "Order 12345 arrived 2024-01-15",
+    "ordered on 2024-01-15 10:30",
+    "delivered 15.01.2024",
+    "due 01-15-2024",
+    "1/15/2024",
+    "invoice 20240115",
+    "order 12345",
+])
+def test_ordinary_sentences_give_no_details(message):
+    assert extract_details(message) == {}
+
+@pytest.mark.parametrize("reply, expected", [
+    ("Ada Lovelace, ada@example.com, +1 555 010 0199", {"name": "Ada Lovelace", "email": "ada@example.com", "phone": "+15550100199"}),
+    ("sure, it's Margaret at margaret@example.com", {"name": "Margaret", "email": "margaret@example.com"}),
+    ("I'm Alan", {"name": "Alan"}),
+    ("Ken Thompson 5550104444", {"name": "Ken Thompson", "phone": "5550104444"}),
+])
+def test_reply_to_the_name_prompt(reply, expected):
+    assert extract_details(reply, expect_name=True) == expected
+
+def test_bare_words_are_only_a_name_after_the_prompt():
+    assert extract_details("Ada Lovelace") == {}
+    assert extract_details("no thanks", expect_name=True) == {}
@@ -0,0 +1,76 @@
+import asyncio
+import io
+
+import PyPDF2
+import pytest
+
+from agents import file_processor
+from benchmarks.bench_file_ingest import write_pdf
+from benchmarks.fakes import FakeModel
+
+
+def collect(path: str, max_chars: int) -> list[str]:
+    async def scenario():
+        return [chunk async for chunk in file_processor.iter_file_chunks(path, max_chars)]
+    return asyncio.run(scenario())
+
+
+def test_pdf_is_extracted_in_batches_from_a_file_handle(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.pdf")
+    write_pdf(path, 25)
+    opened = []
+    open_pdf = file_processor._open_pdf
+    monkeypatch.setattr(file_processor, "_open_pdf", lambda path: opened.append(open_pdf(path)) or opened[-1])
+
+    text = "".join(collect(path, 10_000))
+
+    assert all(f"Page {page} line 0:" in text for page in range(25))
+    assert len(opened) == 1
+    assert not isinstance(opened[0].stream, io.BytesIO)
+    assert opened[0].stream.closed
+
+
+def test_worker_keeps_one_reader_per_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_processor, "_pdf_readers", file_processor.OrderedDict())
+    path = str(tmp_path / "catalog.pdf")
+    write_pdf(path, 25)
+
+    assert file_processor._pdf_page_count(path) == 25
+    first = file_processor._pooled_pdf_reader(path)
+    assert "Page 10 line 0:" in file_processor._extract_pdf_pages(path, 10, 20)
+    assert file_processor._pooled_pdf_reader(path) is first
+
+    # A new upload at the same path gets a fresh reader
+    (tmp_path / "catalog.pdf").unlink()
+    write_pdf(path, 3)
+    assert file_processor._pdf_page_count(path) == 3
+    assert first.stream.closed
+
+
+def encrypted_pdf(path: str):
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(100, 100)
+    writer.encrypt("secret")
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def test_unreadable_pdfs_are_skipped_and_the_other_files_summarized(tmp_path):
+    corrupt, encrypted, text = tmp_path / "corrupt.pdf", str(tmp_path / "encrypted.pdf"), tmp_path / "faq.txt"
+    corrupt.write_bytes(b"%PDF-1.4\nnot really a pdf")
+    encrypted_pdf(encrypted)
+    text.write_text("Returns are free within 30 days.")
+    model = FakeModel(0.0, respond=lambda prompt: "Summary: " + prompt.rsplit("File Content:\n", 1)[1])
+
+    summary = asyncio.run(file_processor.process_files([str(corrupt), encrypted, str(text)], model, "Summarize."))
+
+    assert summary == "Summary: Returns are free within 30 days."
+
+def test_failed_pdf_open_closes_its_file(tmp_path, monkeypatch):
+    path = tmp_path / "corrupt.pdf"
+    path.write_bytes(b"%PDF-1.4\nnot really a pdf")
+    handles = []
+    monkeypatch.setattr(file_processor, "open", lambda *args: handles.append(open(*args)) or handles[-1], raising=False)
+
+    with pytest.raises(PyPDF2.errors.PdfReadError):
+        file_processor._open_pdf(str(path))
+    assert handles and handles[0].closed
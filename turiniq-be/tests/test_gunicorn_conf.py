@@ -0,0 +1,42 @@
+import importlib.util
+import os
+import types
+
+import pytest
+
+CONF_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py")
+
+
+def load_conf(monkeypatch, **env):
+    for name in ("SESSION_STORE", "WEB_CONCURRENCY", "PROMETHEUS_MULTIPROC_DIR"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", CONF_PATH)
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+    return conf
+
+def server(workers: int):
+    return types.SimpleNamespace(cfg=types.SimpleNamespace(workers=workers))
+
+
+def test_memory_store_defaults_to_one_worker(monkeypatch):
+    conf = load_conf(monkeypatch)
+    assert conf.workers == 1
+    conf.on_starting(server(1))
+    assert "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+
+def test_several_workers_with_the_memory_store_refuse_to_start(monkeypatch):
+    conf = load_conf(monkeypatch, WEB_CONCURRENCY="4")
+    with pytest.raises(RuntimeError):
+        conf.on_starting(server(conf.workers))
+
+def test_several_workers_share_a_clean_metrics_directory(monkeypatch, tmp_path):
+    (tmp_path / "counter_123.db").write_bytes(b"stale")
+    conf = load_conf(monkeypatch, SESSION_STORE="mongo", PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    assert conf.workers == 2
+
+    conf.on_starting(server(conf.workers))
+
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+import agents.main_agent
+from agents import jobs
+from agents.jobs import ConfigureJobQueue
+from api.endpoints import BusinessInput
+from benchmarks.fakes import SlowMongoClient
+from db import mongodb
+
+
+def business_input(message: str) -> BusinessInput:
+    return BusinessInput(
+        business_type="retail",
+        domain="acme.com",
+        agent_goal="Provide Customer Support",
+        tonality="friendly",
+        communication_style=["Keep answers concise"],
+        context_clarity=[],
+        handover_escalation=["Escalate refund requests"],
+        data_to_capture=["name", "email"],
+        custom_opening_message=message,
+    )
+
+def use_fake_pipeline(monkeypatch, tmp_path):
+    """Stand-in main_agent_process; each run waits for its own release event."""
+    monkeypatch.setattr(mongodb, "_async_client", SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0))
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.01)
+    runs = []
+
+    async def main_agent_process(input_data, file_paths, progress=None):
+        run = {"message": input_data.custom_opening_message, "files": list(file_paths), "release": asyncio.Event()}
+        runs.append(run)
+        await run["release"].wait()
+        return {"business_id": "retail_acme.com"}
+
+    monkeypatch.setattr(agents.main_agent, "main_agent_process", main_agent_process)
+    return runs
+
+def upload(tmp_path, name: str) -> str:
+    path = tmp_path / name
+    path.write_text(name)
+    return str(path)
+
+async def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+
+def test_jobs_for_one_business_coalesce_and_run_one_at_a_time_across_processes(monkeypatch, tmp_path):
+    runs = use_fake_pipeline(monkeypatch, tmp_path)
+
+    async def scenario():
+        await mongodb.ensure_indexes()
+        # Two worker processes sharing the agent_jobs collection
+        first, second = ConfigureJobQueue(workers=2), ConfigureJobQueue(workers=2)
+        await first.start()
+        await second.start()
+        running, _ = await first.submit("retail_acme.com", business_input("v1"), [upload(tmp_path, "v1.txt")])
+        await wait_for(lambda: len(runs) == 1)
+
+        queued, coalesced_first = await second.submit("retail_acme.com", business_input("v2"), [upload(tmp_path, "v2.txt")])
+        latest, coalesced_second = await first.submit("retail_acme.com", business_input("v3"), [upload(tmp_path, "v3.txt")])
+        await asyncio.sleep(0.1)
+        # Four idle workers, but the queued job waits for the running one
+        assert len(runs) == 1
+
+        runs[0]["release"].set()
+        await wait_for(lambda: len(runs) == 2)
+        runs[1]["release"].set()
+        for _ in range(500):
+            if (await first.get(latest.job_id))["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.01)
+        await first.stop()
+        await second.stop()
+        return running, queued, latest, coalesced_first, coalesced_second, await second.get(latest.job_id)
+
+    running, queued, latest, coalesced_first, coalesced_second, job = asyncio.run(scenario())
+
+    assert (coalesced_first, coalesced_second) == (False, True)
+    assert latest.job_id == queued.job_id != running.job_id
+    assert [run["message"] for run in runs] == ["v1", "v3"]
+    assert runs[1]["files"] == [str(tmp_path / "v3.txt")]
+    # Replaced and finished uploads are removed
+    assert not any(tmp_path.iterdir())
+    assert job["status"] == "succeeded"
+    assert job["submissions"] == 2
+    assert "input" not in job
+
+
+def test_running_job_of_a_stopped_worker_expires(monkeypatch, tmp_path):
+    runs = use_fake_pipeline(monkeypatch, tmp_path)
+
+    async def scenario():
+        await mongodb.ensure_indexes()
+        queue = ConfigureJobQueue(workers=1)
+        await queue.start()
+        stale, _ = await queue.submit("retail_acme.com", business_input("v1"), [])
+        await wait_for(lambda: len(runs) == 1)
+        # The process running it dies without a word, leaving its upload on disk
+        left_behind = upload(tmp_path, "v1.txt")
+        await queue.stop()
+        await mongodb.get_async_db()["agent_jobs"].update_one(
+            {"job_id": stale.job_id},
+            {"$set": {"status": "running", "active": True, "error": None, "file_paths": [left_behind],
+                      "updated_at": datetime.utcnow() - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 1)}},
+        )
+        queue = ConfigureJobQueue(workers=1)
+        await queue.start()
+        await queue.submit("retail_acme.com", business_input("v2"), [])
+        await wait_for(lambda: len(runs) == 2)
+        await queue.stop()
+        return await queue.get(stale.job_id)
+
+    stale = asyncio.run(scenario())
+
+    assert [run["message"] for run in runs] == ["v1", "v2"]
+    assert stale["status"] == "failed"
+    assert stale["error"] == jobs.JOB_STOPPED_ERROR
+    assert not (tmp_path / "v1.txt").exists()
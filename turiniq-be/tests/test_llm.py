@@ -0,0 +1,28 @@
+import asyncio
+
+from agents import llm
+
+
+def test_business_limit_holds_while_in_use_and_is_dropped_when_idle(monkeypatch):
+    monkeypatch.setattr(llm, "MAX_CONCURRENCY_PER_BUSINESS", 2)
+    monkeypatch.setattr(llm, "_semaphore", None)
+    monkeypatch.setattr(llm, "_business_limits", {})
+    running, peak = [], []
+
+    async def call(business_id: str):
+        async with llm._slots(business_id):
+            running.append(business_id)
+            peak.append(running.count(business_id))
+            await asyncio.sleep(0.01)
+            running.remove(business_id)
+
+    async def scenario():
+        calls = [asyncio.create_task(call(f"business-{i % 3}")) for i in range(12)]
+        await asyncio.sleep(0)
+        tracked = set(llm._business_limits)
+        await asyncio.gather(*calls)
+        return tracked
+
+    assert asyncio.run(scenario()) == {"business-0", "business-1", "business-2"}
+    assert max(peak) == 2
+    assert llm._business_limits == {}
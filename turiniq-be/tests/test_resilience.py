@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from agents import resilience
+from agents.resilience import CircuitBreaker, ProviderUnavailable, start_turn, stream_with_policy
+
+
+def test_breaker_opens_then_lets_one_trial_through_after_the_reset():
+    breaker = CircuitBreaker(failures=3, reset_seconds=0.05, window=4, ratio=0.5)
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Only one trial at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.times_opened == 1
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failures=2, reset_seconds=0.05, window=4, ratio=0.5)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+def test_cancelled_trial_frees_the_half_open_slot():
+    breaker = CircuitBreaker(failures=1, reset_seconds=0.0, window=1, ratio=1.0)
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.allow()
+
+    breaker.release()
+    assert breaker.allow()
+
+
+def collect(open_stream) -> list[str]:
+    async def scenario():
+        start_turn(0.2)
+        return [text async for text in stream_with_policy(open_stream)]
+    return asyncio.run(scenario())
+
+def test_stream_stalling_after_the_first_chunk_hits_the_turn_deadline(monkeypatch):
+    breaker = CircuitBreaker(failures=1, reset_seconds=30, window=1, ratio=1.0)
+    monkeypatch.setattr(resilience, "breaker", breaker)
+
+    async def stalls():
+        yield "Hello"
+        await asyncio.sleep(60)
+        yield "never"
+
+    started = time.monotonic()
+    with pytest.raises(ProviderUnavailable):
+        collect(stalls)
+
+    assert time.monotonic() - started < 1
+    # The stall counts against the provider
+    assert breaker.state == "open"
+
+def test_stream_finishing_in_time_is_a_success(monkeypatch):
+    breaker = CircuitBreaker(failures=1, reset_seconds=30, window=1, ratio=1.0)
+    monkeypatch.setattr(resilience, "breaker", breaker)
+
+    async def steady():
+        for text in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield text
+
+    assert collect(steady) == ["a", "b", "c"]
+    assert breaker.state == "closed"
@@ -0,0 +1,55 @@
+from agents.prompt_builder import ConversationMemory
+from agents.response_cache import ResponseCache
+from agents.session_store import InMemorySessionStore, Session
+
+
+def session_with(*exchanges: tuple[str, str]) -> Session:
+    session = Session(InMemorySessionStore(), {"session_id": "s", "business_id": "acme"})
+    for user, agent in exchanges:
+        session.conversation.add_user(user)
+        session.conversation.add_agent(agent)
+    return session
+
+def ask(session: Session, message: str) -> str:
+    """Record `message` as the one being answered; returns its history key."""
+    session.conversation.add_user(message)
+    return ConversationMemory(session).digest()
+
+
+def test_same_message_with_different_histories_is_not_shared():
+    cache = ResponseCache(max_entries=16, similarity_threshold=0)
+    tent = ask(session_with(("Do you sell tents?", "Yes, the Ridge 2 is $199.")), "how much is it?")
+    stove = ask(session_with(("Do you sell stoves?", "Yes, the Flame is $49.")), "how much is it?")
+    assert tent != stove
+
+    cache.put("acme", 1, "sales", "how much is it?", {"response": "The Ridge 2 is $199."}, 100, tent)
+    assert cache.get("acme", 1, "sales", "how much is it?", stove) is None
+    assert cache.get("acme", 1, "sales", "How much is it", tent) == {"response": "The Ridge 2 is $199."}
+
+def test_personal_details_in_history_stay_with_their_session():
+    cache = ResponseCache(max_entries=16, similarity_threshold=0.5)
+    ada = ask(session_with(("I'm Ada, ada@example.com", "Thanks Ada!")), "what's my email?")
+    grace = ask(session_with(("I'm Grace, grace@navy.mil", "Thanks Grace!")), "what's my email?")
+
+    cache.put("acme", 1, "support", "what's my email?", {"response": "It's ada@example.com."}, 100, ada)
+    assert cache.get("acme", 1, "support", "what is my email", grace) is None
+
+def test_messages_without_history_share_replies():
+    cache = ResponseCache(max_entries=16, similarity_threshold=0)
+    first, second = ask(session_with(), "Do you ship abroad?"), ask(session_with(), "do you ship abroad")
+    assert first == second == ""
+
+    cache.put("acme", 1, "sales", "Do you ship abroad?", {"response": "Yes, to the EU."}, 100, first)
+    assert cache.get("acme", 1, "sales", "do you ship abroad", second) == {"response": "Yes, to the EU."}
+
+def test_least_recently_used_business_is_evicted():
+    cache = ResponseCache(max_entries=16, similarity_threshold=0, max_businesses=2)
+    for business_id in ("acme", "globex"):
+        cache.put(business_id, 1, "sales", "Do you ship abroad?", {"response": business_id}, 100)
+    cache.get("acme", 1, "sales", "Do you ship abroad?")
+    cache.put("initech", 1, "sales", "Do you ship abroad?", {"response": "initech"}, 100)
+
+    assert cache.stats()["businesses"] == 2
+    assert cache.get("globex", 1, "sales", "Do you ship abroad?") is None
+    assert cache.get("acme", 1, "sales", "Do you ship abroad?") == {"response": "acme"}
+    assert cache.get("initech", 1, "sales", "Do you ship abroad?") == {"response": "initech"}
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import retrieval
+from db import mongodb
+
+LEGACY_KNOWLEDGE_BASE = (
+    "Acme Outdoor sells tents and sleeping bags.\n\n"
+    "Shipping takes 3-5 business days within the EU.\n\n"
+    "Returns are free within 30 days of delivery."
+)
+
+
+def test_business_without_chunks_is_backfilled_from_its_knowledge_base(monkeypatch):
+    client = AsyncMongoMockClient()
+    monkeypatch.setattr(mongodb, "_async_client", client)
+    monkeypatch.setattr(retrieval, "_indexes", retrieval.OrderedDict())
+
+    async def scenario():
+        db = client[mongodb.DB_NAME]
+        # Stored before /configure-agent chunked knowledge bases
+        await db["business_data"].insert_one({
+            "business_id": "retail_acme.com",
+            "knowledge_base": LEGACY_KNOWLEDGE_BASE,
+            "context_prompt": "Welcome to Acme!",
+            "version": 3,
+        })
+        snippets = await retrieval.retrieve_snippets("retail_acme.com", 3, "how long does shipping take?", k=1)
+        stored = await db["knowledge_chunks"].count_documents({"business_id": "retail_acme.com"})
+        # A second worker with a cold index finds the chunks instead of writing them again
+        retrieval._indexes.clear()
+        again = await retrieval.retrieve_snippets("retail_acme.com", 3, "how long does shipping take?", k=1)
+        return snippets, stored, again, await db["knowledge_chunks"].count_documents({})
+
+    snippets, stored, again, total = asyncio.run(scenario())
+    assert "Shipping takes 3-5 business days" in snippets[0]
+    assert stored == total == len(retrieval.chunk_text(LEGACY_KNOWLEDGE_BASE))
+    assert again == snippets
+
+def test_business_without_any_knowledge_gets_no_snippets(monkeypatch):
+    monkeypatch.setattr(mongodb, "_async_client", AsyncMongoMockClient())
+    monkeypatch.setattr(retrieval, "_indexes", retrieval.OrderedDict())
+    assert asyncio.run(retrieval.retrieve_snippets("unknown", None, "shipping?")) == []
+
+def test_overlap_must_be_smaller_than_the_chunk():
+    for overlap in (-1, 100, 150):
+        with pytest.raises(ValueError):
+            retrieval.chunk_text("word " * 100, max_chars=100, overlap=overlap)
+    assert retrieval.chunk_text("word " * 100, max_chars=100, overlap=99)
+
+def test_large_index_is_searched_off_the_event_loop(monkeypatch):
+    chunks = [f"Product {i} ships in {i % 7} days." for i in range(50)] + ["Returns are free within 30 days."]
+    index = retrieval.BM25Index(chunks)
+    searched_in = []
+    search = index.search
+    monkeypatch.setattr(index, "search", lambda *args: searched_in.append(threading.current_thread()) or search(*args))
+
+    monkeypatch.setattr(retrieval, "INLINE_SEARCH_MAX_CHUNKS", 10)
+    offloaded = asyncio.run(retrieval.search_index(index, "free returns", k=1))
+    monkeypatch.setattr(retrieval, "INLINE_SEARCH_MAX_CHUNKS", 1000)
+    inline = asyncio.run(retrieval.search_index(index, "free returns", k=1))
+
+    assert offloaded == inline == ["Returns are free within 30 days."]
+    assert searched_in[0] is not threading.main_thread() and searched_in[1] is threading.main_thread()
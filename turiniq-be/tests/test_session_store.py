@@ -0,0 +1,75 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from agents.session_store import InMemorySessionStore, MongoSessionStore, open_session, set_session_store
+from benchmarks.fakes import SlowMongoClient
+from db import mongodb
+
+
+def test_memory_store_shares_and_caps_a_long_sales_conversation():
+    store = InMemorySessionStore(max_messages=20)
+    set_session_store(store)
+
+    async def scenario():
+        session = await open_session("acme")
+        session.agent = "sales"
+        session.conversation.window = 10
+        for turn in range(50):
+            session.conversation.add_user(f"question {turn}")
+            session.conversation.add_agent(f"answer {turn}")
+            session.lead_persisted = session.summarized_upto = len(session.conversation)
+            await session.checkpoint()
+        stored = (await store.load(session.session_id))["conversation"]
+        resumed = await open_session("acme", session.session_id)
+        return session, stored, await session.transcript(), resumed
+
+    session, stored, transcript, resumed = asyncio.run(scenario())
+    assert len(session.conversation) == 100 and session.conversation.offset == 90
+    # The store keeps the session's own records, 20 of them
+    assert len(stored) == 20 and stored[-1] is list(session.conversation)[-1]
+    assert [entry.get("user") or entry.get("agent") for entry in transcript[:2]] == ["question 40", "answer 40"]
+    assert len(transcript) == 20 and transcript[-1]["agent"] == "answer 49" and "timestamp" in transcript[-1]
+    # A resumed session starts from what the store kept
+    assert resumed.resumed and len(resumed.conversation) == 100 and resumed.conversation.offset == 80
+
+def test_messages_the_session_still_needs_are_kept():
+    store = InMemorySessionStore(max_messages=4)
+    set_session_store(store)
+
+    async def scenario():
+        session = await open_session("acme")
+        session.agent = "sales"
+        for turn in range(10):
+            session.conversation.add_user(f"question {turn}")
+            await session.checkpoint()
+        # Nothing is summarized or on the lead yet
+        return (await store.load(session.session_id))["conversation"]
+
+    assert len(asyncio.run(scenario())) == 10
+
+def test_mongo_store_caps_the_stored_conversation(monkeypatch):
+    monkeypatch.setattr(mongodb, "_async_client", SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0))
+    store = MongoSessionStore(max_messages=20)
+    set_session_store(store)
+
+    async def scenario():
+        session = await open_session("acme")
+        session.agent = "sales"
+        session.conversation.window = 10
+        for turn in range(50):
+            session.conversation.add_user(f"question {turn}")
+            session.conversation.add_agent(f"answer {turn}")
+            # Nothing is on the lead until the last turns
+            session.summarized_upto = len(session.conversation)
+            session.lead_persisted = len(session.conversation) if turn >= 45 else 0
+            await session.checkpoint()
+        stored = await store.load(session.session_id)
+        resumed = await open_session("acme", session.session_id)
+        return session, stored, await session.transcript(), resumed
+
+    session, stored, transcript, resumed = asyncio.run(scenario())
+    assert len(stored["conversation"]) == 20 and stored["conversation_offset"] == 80
+    assert stored["conversation"][-1].text == "answer 49"
+    assert transcript[0]["user"] == "question 40" and len(transcript) == 20
+    assert len(resumed.conversation) == 100 and resumed.conversation.offset == 80
@@ -0,0 +1,42 @@
+import json
+
+from agents.streaming import JsonFieldStream
+
+
+def stream(raw: str, size: int) -> tuple[JsonFieldStream, list[str]]:
+    extractor = JsonFieldStream("response")
+    pieces = [extractor.feed(raw[i:i + size]) for i in range(0, len(raw), size)]
+    return extractor, pieces
+
+
+def test_decodes_the_field_at_every_chunk_boundary():
+    reply = 'Line one\nSays "hi" \\ tab\there é and emoji \U0001F600 then \U0001F44D\U0001F3FD done'
+    raw = json.dumps({"reason": "x", "response": reply, "next": "y"})
+
+    for size in range(1, 15):
+        extractor, pieces = stream(raw, size)
+        assert extractor.done
+        assert extractor.value == "".join(pieces) == reply
+        # Every piece can go out over the websocket on its own
+        for piece in pieces:
+            piece.encode("utf-8")
+
+def test_surrogate_pair_split_between_its_halves():
+    extractor = JsonFieldStream("response")
+
+    assert extractor.feed('{"response": "smile \\ud83d') == "smile "
+    assert extractor.feed("\\ude0") == ""
+    assert extractor.feed('0!"}') == "\U0001F600!"
+    assert extractor.done
+
+def test_unpaired_surrogate_escape_becomes_a_replacement_character():
+    extractor, _ = stream('{"response": "a\\ud83d b \\ude00c"}', 3)
+    assert extractor.value == "a\ufffd b \ufffdc"
+
+def test_waits_for_the_field_and_ignores_what_follows():
+    extractor = JsonFieldStream("response")
+
+    assert extractor.feed('{"reason": "Pricing", "respo') == ""
+    assert extractor.feed('nse": "Hello') == "Hello"
+    assert extractor.feed('", "other": "ignored"}') == ""
+    assert extractor.value == "Hello"
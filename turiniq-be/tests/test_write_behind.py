@@ -0,0 +1,93 @@
+import asyncio
+import os
+
+from bson import json_util
+from mongomock_motor import AsyncMongoMockClient
+
+from agents import customer_agent
+from benchmarks.fakes import SlowMongoClient
+from db import mongodb
+from db.write_behind import WriteBehindQueue, update_record
+
+
+def lead(first: int, reason: str, name: str = None) -> customer_agent.Lead:
+    return customer_agent.Lead(
+        business_id="acme",
+        session_id="session-1",
+        customer_name=name,
+        conversation=[{"user": f"question {first // 2}", "seq": first}, {"agent": f"answer {first // 2}", "seq": first + 1}],
+        reason=reason,
+    )
+
+def stored_lead(monkeypatch, *leads: customer_agent.Lead) -> dict:
+    monkeypatch.setattr(mongodb, "_async_client", SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0))
+    monkeypatch.setattr(customer_agent, "write_behind", WriteBehindQueue(enabled=False, spill_dir=None))
+
+    async def scenario():
+        for item in leads:
+            await customer_agent.save_lead(item)
+        return await mongodb.get_async_db()["leads"].find_one({"session_id": "session-1"})
+
+    return asyncio.run(scenario())
+
+
+def test_retried_lead_write_does_not_duplicate_messages(monkeypatch):
+    doc = stored_lead(monkeypatch, lead(0, "Pricing"), lead(0, "Pricing"), lead(2, "Demo"), lead(2, "Demo"))
+    assert [entry["seq"] for entry in doc["conversation"]] == [0, 1, 2, 3]
+    assert doc["message_count"] == 4 and doc["reason"] == "Demo"
+
+def test_late_replayed_lead_write_keeps_order_and_newer_fields(monkeypatch):
+    # The first batch was spilled and is replayed after the second landed
+    doc = stored_lead(monkeypatch, lead(2, "Demo", name="Ada"), lead(0, "Pricing"))
+    assert [entry["seq"] for entry in doc["conversation"]] == [0, 1, 2, 3]
+    assert doc["reason"] == "Demo" and doc["customer_name"] == "Ada"
+
+def test_replay_skips_spill_files_another_worker_removed(monkeypatch, tmp_path):
+    monkeypatch.setattr(mongodb, "_async_client", SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0))
+    queue = WriteBehindQueue(enabled=False, spill_dir=str(tmp_path))
+    kept = tmp_path / "spill-1-1.jsonl"
+    kept.write_text(json_util.dumps(update_record("leads", {"session_id": "s"}, {"$set": {"reason": "x"}}, upsert=True)) + "\n")
+    gone = str(tmp_path / "spill-2-2.jsonl")
+    monkeypatch.setattr(queue.spill, "orphans", lambda: [gone, str(kept)])
+
+    asyncio.run(queue.replay())
+
+    assert queue.stats.replayed == 1 and not os.path.exists(kept)
+
+# A lone surrogate, as a split emoji escape used to produce, can't be BSON-encoded
+POISON = {"session_id": "poison", "reason": "\ud83d"}
+
+def test_unencodable_write_is_dropped_without_the_rest_of_its_batch(monkeypatch, tmp_path):
+    monkeypatch.setattr(mongodb, "_async_client", SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0))
+    queue = WriteBehindQueue(enabled=True, spill_dir=str(tmp_path))
+
+    async def scenario():
+        await queue.start()
+        await queue.insert("tickets", {"session_id": "before"})
+        await queue.insert("tickets", POISON)
+        await queue.insert("tickets", {"session_id": "after"})
+        await queue.stop()
+        return await mongodb.get_async_db()["tickets"].distinct("session_id")
+
+    assert sorted(asyncio.run(scenario())) == ["after", "before"]
+    assert queue.stats.dropped == 1 and queue.stats.spilled == 0
+    assert not list(tmp_path.iterdir())
+
+def test_replay_drops_an_unencodable_spilled_write_and_keeps_starting(monkeypatch, tmp_path):
+    monkeypatch.setattr(mongodb, "_async_client", SlowMongoClient(AsyncMongoMockClient(), latency=0.0, per_op=0.0))
+    queue = WriteBehindQueue(enabled=False, spill_dir=str(tmp_path))
+    spilled = tmp_path / "spill-1-1.jsonl"
+    spilled.write_text("".join(
+        json_util.dumps(update_record("leads", {"session_id": session_id}, {"$set": fields}, upsert=True)) + "\n"
+        for session_id, fields in (("s1", {"reason": "x"}), ("poison", {"reason": "\ud83d"}), ("s2", {"reason": "y"}))
+    ))
+    unreadable = tmp_path / "spill-2-2.jsonl"
+    unreadable.write_text("not json\n")
+
+    async def scenario():
+        await queue.start()
+        return await mongodb.get_async_db()["leads"].distinct("session_id")
+
+    assert sorted(asyncio.run(scenario())) == ["s1", "s2"]
+    assert queue.stats.dropped == 1
+    assert not spilled.exists() and unreadable.exists()
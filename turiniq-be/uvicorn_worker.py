@@ -0,0 +1,17 @@
+"""Gunicorn worker class with the websocket settings uvicorn only takes as config.
+
+    gunicorn main:app -k uvicorn_worker.UvicornWorker
+"""
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+from agents.session_guard import (WS_MAX_FRAME_BYTES, WS_PING_INTERVAL_SECONDS,
+                                  WS_PING_TIMEOUT_SECONDS)
+
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {
+        **BaseUvicornWorker.CONFIG_KWARGS,
+        "ws_ping_interval": WS_PING_INTERVAL_SECONDS,
+        "ws_ping_timeout": WS_PING_TIMEOUT_SECONDS,
+        "ws_max_size": WS_MAX_FRAME_BYTES,
+    }